@@ -0,0 +1,76 @@
+import base64
+import os
+
+import pytest
+
+from xmlreader_core import Attachment, ExtractionCache, extract_text_elements_streaming, file_digest
+
+PAYLOAD = b'%PDF-1.7\n' + bytes(range(256)) * 20
+
+def _document(encoding):
+    text = base64.b64encode(PAYLOAD).decode('ascii')
+    return (f'<?xml version="1.0" encoding="{encoding}"?>'
+            f'<r><Zalacznik nazwaPliku="a.pdf">{text}</Zalacznik></r>').encode(encoding)
+
+@pytest.mark.parametrize("encoding", ["utf-8", "windows-1250"])
+def test_cache_round_trip(tmp_path, encoding):
+    path = tmp_path / "dokument.xml"
+    path.write_bytes(_document(encoding))
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    digest = file_digest(str(path))
+    assert cache.store(str(path), digest, False, *extract_text_elements_streaming(str(path)))
+    records, attachments = cache.load(str(path), digest, False)
+    assert [a.data for a in attachments] == [PAYLOAD]
+
+@pytest.mark.parametrize("encoding", ["utf-16", "utf-16-le"])
+def test_cache_skips_non_ascii_compatible_documents(tmp_path, encoding):
+    # offsety bajtowe w UTF-16 nie wskazują tekstu base64 - takiego wpisu nie zapisujemy
+    path = tmp_path / "dokument.xml"
+    data = _document(encoding)
+    if encoding == "utf-16-le":
+        data = data.replace('encoding="utf-16-le"'.encode(encoding), 'encoding="utf-16"'.encode(encoding))
+    path.write_bytes(data)
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    records, attachments = extract_text_elements_streaming(str(path))
+    assert [a.data for a in attachments] == [PAYLOAD]
+    assert not cache.store(str(path), file_digest(str(path)), False, records, attachments)
+    assert not (tmp_path / "cache").exists() or not os.listdir(tmp_path / "cache")
+
+def test_lookup_by_file_stat(tmp_path):
+    import hashlib
+    path = tmp_path / "dokument.xml"
+    path.write_bytes(_document("utf-8"))
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    key, digest = cache.lookup(str(path))
+    assert digest is None
+    hasher = hashlib.sha256()
+    result = extract_text_elements_streaming(str(path), hasher=hasher)
+    assert hasher.hexdigest() == file_digest(str(path))
+    assert cache.store(str(path), hasher.hexdigest(), False, *result, stat_key=key)
+    assert cache.lookup(str(path)) == (key, hasher.hexdigest())
+    path.write_bytes(_document("utf-8") + b"\n")
+    assert cache.lookup(str(path))[1] is None
+
+def test_cache_skips_entities_in_base64(tmp_path):
+    path = tmp_path / "dokument.xml"
+    path.write_bytes(_document("utf-8").replace(b"nazwaPliku=\"a.pdf\">", b"nazwaPliku=\"a.pdf\">&#65;&#65;&#65;&#65;"))
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    records, attachments = extract_text_elements_streaming(str(path))
+    assert len(attachments) == 1
+    assert not cache.store(str(path), file_digest(str(path)), False, records, attachments)
+
+def test_cached_attachment_size_and_type_without_reading_payload(tmp_path, monkeypatch):
+    payload = PAYLOAD * 200
+    text = base64.b64encode(payload).decode('ascii')
+    path = tmp_path / "dokument.xml"
+    path.write_bytes(f'<r><Zalacznik nazwaPliku="a.pdf">{text}</Zalacznik></r>'.encode('ascii'))
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    digest = file_digest(str(path))
+    assert cache.store(str(path), digest, False, *extract_text_elements_streaming(str(path)))
+    (cached,) = cache.load(str(path), digest, False)[1]
+    bare = Attachment("a.pdf", start=cached.start, end=cached.end, xml_path=str(path))
+
+    def no_full_read(self):
+        raise AssertionError("odczyt całego ładunku")
+    monkeypatch.setattr(Attachment, "_read_xml", no_full_read)
+    assert (bare.size, bare.ext) == (len(payload), ".pdf")
@@ -0,0 +1,46 @@
+import os
+
+import xmlreader_catalog
+from xmlreader_catalog import DocumentCatalog, catalog_entry, index_documents
+
+def _document(text):
+    return f"<Dokument><Pole>{text}</Pole></Dokument>"
+
+def _crash_on_zly(path, known_sha256=None):
+    if "zly" in os.path.basename(path):
+        os._exit(1)
+    return catalog_entry(path, known_sha256)
+
+def test_crashed_worker_fails_only_its_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(xmlreader_catalog, "catalog_entry", _crash_on_zly)
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    for i in range(5):
+        (inbox / f"d{i}.xml").write_text(_document(f"dokument {i}"), encoding="utf-8")
+    (inbox / "zly.xml").write_text(_document("wywraca proces"), encoding="utf-8")
+    lines = []
+    with DocumentCatalog(str(tmp_path / "katalog.sqlite")) as catalog:
+        result = index_documents(catalog, [str(inbox)], jobs=3, report=lines.append)
+        known = catalog.known()
+    assert result["indexed"] == 5 and result["failed"] == 1
+    assert sorted(os.path.basename(path) for path in known) == [f"d{i}.xml" for i in range(5)]
+    errors = [line for line in lines if line.startswith("BŁĄD")]
+    assert len(errors) == 1 and errors[0].startswith(f"BŁĄD {inbox / 'zly.xml'}: BrokenProcessPool")
+
+def test_unchanged_files_are_committed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(xmlreader_catalog, "CATALOG_COMMIT_EVERY", 4)
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    for i in range(10):
+        (inbox / f"d{i}.xml").write_text(_document(f"dokument {i}"), encoding="utf-8")
+    database = str(tmp_path / "katalog.sqlite")
+    with DocumentCatalog(database) as catalog:
+        index_documents(catalog, [str(inbox)], jobs=1, report=lambda line: None)
+    for i in range(10):
+        os.utime(inbox / f"d{i}.xml", ns=(0, 10 ** 9 * (i + 1)))
+    commits = []
+    with DocumentCatalog(database) as catalog:
+        catalog.db.set_trace_callback(lambda sql: sql == "COMMIT" and commits.append(sql))
+        result = index_documents(catalog, [str(inbox)], jobs=1, prune=False, report=lambda line: None)
+    assert result["unchanged"] == 10
+    assert len(commits) == 10 // 4 + 1  # co 4 zapisy i na końcu indeksowania
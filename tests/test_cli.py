@@ -0,0 +1,38 @@
+import os
+import time
+
+from concurrent.futures.process import BrokenProcessPool
+
+import xmlreader_cli
+from xmlreader_cli import build_parser, pool_results, processing_options, run_batch
+
+_process_document = xmlreader_cli.process_document
+
+def _square(n):
+    if n == 3:
+        os._exit(9)  # jak proces zabity przez OOM
+    time.sleep(0.05)
+    return n * n
+
+def _crashing_process_document(path, out_dir, options):
+    if os.path.basename(path) == "d3.xml":
+        os._exit(9)
+    return _process_document(path, out_dir, options)
+
+def test_pool_results_isolates_crashed_task():
+    results = {task[0]: (result, error) for task, result, error in pool_results(_square, [(n,) for n in range(8)], 3)}
+    assert sorted(results) == list(range(8))
+    assert isinstance(results[3][1], BrokenProcessPool)
+    assert {n: result for n, (result, error) in results.items() if n != 3} == {n: n * n for n in range(8) if n != 3}
+
+def test_run_batch_survives_worker_crash(tmp_path, monkeypatch):
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    for i in range(1, 7):
+        (inbox / f"d{i}.xml").write_text(f"<Dokument><Pole>wartość {i}</Pole></Dokument>", encoding="utf-8")
+    monkeypatch.setattr(xmlreader_cli, "process_document", _crashing_process_document)
+    args = build_parser().parse_args([str(inbox), "-o", str(tmp_path / "out"), "--no-html"])
+    results = run_batch(args.inputs, args.output, processing_options(args), jobs=3, report=lambda line: None)
+    failed = sorted(os.path.basename(r["path"]) for r in results if r["error"])
+    assert failed == ["d3.xml"]
+    assert len(results) == 6
@@ -0,0 +1,40 @@
+import base64
+import io
+import zipfile
+
+from xmlreader_core import extract_text_elements_streaming
+
+XADES = (b'<?xml version="1.0" encoding="UTF-8"?>'
+         b'<ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#" xmlns:xades="http://uri.etsi.org/01903/v1.3.2#">'
+         b'<ds:SignedInfo><ds:Reference URI="faktura.pdf"/></ds:SignedInfo>'
+         b'<ds:SignatureValue>' + base64.b64encode(bytes(256)) + b'</ds:SignatureValue>'
+         b'<ds:Object><xades:QualifyingProperties><xades:SignedProperties>'
+         b'<xades:SigningTime>2024-01-01T12:00:00Z</xades:SigningTime>'
+         b'</xades:SignedProperties></xades:QualifyingProperties></ds:Object></ds:Signature>')
+PDF = b'%PDF-1.7\n' + bytes(range(256)) * 4
+
+def _asice():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr(zipfile.ZipInfo('mimetype'), 'application/vnd.etsi.asic-e+zip')
+        z.writestr('faktura.pdf', PDF)
+        z.writestr('META-INF/signatures0.xml', XADES)
+    return buf.getvalue()
+
+def test_nested_asice_with_xades():
+    document = ('<Dokument><Zalacznik nazwaPliku="podpisany">'
+                + base64.b64encode(_asice()).decode('ascii') + '</Zalacznik></Dokument>').encode('ascii')
+    _, attachments = extract_text_elements_streaming(io.BytesIO(document))
+    container = attachments[0]
+    assert container.ext == '.asice'
+    assert container.expandable
+
+    _, members, _ = container.expand()
+    by_name = {member.filename: member for member in members}
+    assert by_name['faktura.pdf'].data == PDF
+    signature = by_name['signatures0.xml']
+    assert signature.ext == '.xades'
+    assert signature.expandable
+
+    records, _, _ = signature.expand()
+    assert any("2024-01-01T12:00:00Z" in line for line in records)
@@ -0,0 +1,36 @@
+import base64
+import threading
+
+import pytest
+
+pytest.importorskip("customtkinter")
+
+from xmlreader_core import ExtractionCache
+from xmlreader_final import _ExtractionJob
+
+class _SlowCache(ExtractionCache):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.storing = threading.Event()
+        self.release = threading.Event()
+
+    def store(self, *args, **kwargs):
+        self.storing.set()
+        self.release.wait()
+        return super().store(*args, **kwargs)
+
+def test_cancel_while_storing_drops_the_result(tmp_path):
+    payload = base64.b64encode(b"%PDF-1.4" + b"x" * 300000).decode()
+    path = tmp_path / "a.xml"
+    path.write_text(f"<D><Zal><Nazwa>x.pdf</Nazwa><Tresc>{payload}</Tresc></Zal></D>", encoding="utf-8")
+    cache = _SlowCache(str(tmp_path / "cache"))
+    job = _ExtractionJob(str(path), True, cache=cache)
+    job.thread.start()
+    assert cache.storing.wait(10)
+    job.cancel()
+    cache.release.set()
+    job.thread.join()
+    messages = []
+    while not job.queue.empty():
+        messages.append(job.queue.get()[0])
+    assert messages == ["cancelled"]
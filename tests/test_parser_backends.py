@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from xmlreader_bench import CONFORMANCE_DOCUMENT, SUITE_PROFILES, _base64_text, generate_file, make_payload
+from xmlreader_core import (available_parser_backends, extract_all_text_elements, extract_text_elements_streaming,
+                            parse_xml_tree)
+
+# Każdy backend musi dawać dokładnie to samo co expat: rekordy, załączniki (nazwa
+# i zawartość) i liczbę pominiętych poddrzew - z drzewa i strumieniowo. Część dla
+# expat (strumień kontra drzewo) działa zawsze, porównania z lxml - gdy jest zainstalowany.
+
+BACKENDS = ["expat", pytest.param("lxml", marks=pytest.mark.skipif(
+    "lxml" not in available_parser_backends(), reason="lxml nie jest zainstalowany"))]
+DOCUMENTS = ["encje_cdata", "utf16", "podpis_w_tekscie", "maly", "dlugi_tekst"]
+
+SKIP_OPTIONS = [
+    {},
+    {"skip_signature_blocks": True},
+    {"skip_rules": ["Pusty", "{http://example.com/a}", "Zalacznik/Dane", "{http://www.w3.org/2000/09/xmldsig#}"]},
+]
+
+def _conformance_text():
+    payload = _base64_text(make_payload('pdf', 3000, random.Random(0)))
+    return CONFORMANCE_DOCUMENT.format(payload=payload)
+
+@pytest.fixture(scope="module")
+def documents(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("zgodnosc")
+    paths = {}
+    text = _conformance_text()
+    paths["encje_cdata"] = workdir / "zgodnosc.xml"
+    paths["encje_cdata"].write_text(text, encoding="utf-8")
+    paths["utf16"] = workdir / "zgodnosc_utf16.xml"
+    paths["utf16"].write_bytes(text.replace('encoding="UTF-8"', 'encoding="UTF-16"').encode("utf-16"))
+    paths["podpis_w_tekscie"] = workdir / "podpis.xml"
+    paths["podpis_w_tekscie"].write_text(
+        '<r xmlns:ds="http://www.w3.org/2000/09/xmldsig#"><p>przed<ds:SignatureValue>QUJD</ds:SignatureValue>'
+        'po</p><Pusty>x</Pusty><q>a<![CDATA[b]]>c</q></r>', encoding="utf-8")
+    paths["maly"] = generate_file(str(workdir / "maly.xml"), seed=0, **SUITE_PROFILES["maly"])
+    # węzeł tekstowy ponad 10 MB - bez huge_tree lxml by go odrzucił
+    paths["dlugi_tekst"] = generate_file(str(workdir / "dlugi.xml"), seed=0, depth=2, elements=200,
+                                         attachments=[("docx", 200_000)], signatures=1, long_text=11_000_000)
+    return {name: str(path) for name, path in paths.items()}
+
+def _extracted(records, attachments):
+    result = (list(records), [(a.filename, a.data) for a in attachments])
+    for attachment in attachments:
+        attachment.discard()
+    return result
+
+def _streamed(path, backend, options):
+    report = {}
+    result = _extracted(*extract_text_elements_streaming(path, backend=backend, skip_report=report, **options))
+    # bajty pominięte liczy tylko backend z offsetami
+    return result, {rule: stats[0] for rule, stats in report.items()}
+
+def _tree(path, backend, options):
+    return _extracted(*extract_all_text_elements(parse_xml_tree(path, backend), **options))
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name", DOCUMENTS)
+@pytest.mark.parametrize("options", SKIP_OPTIONS)
+def test_streaming_matches_expat_tree(documents, backend, name, options):
+    path = documents[name]
+    assert _streamed(path, backend, options)[0] == _tree(path, "expat", options)
+
+@pytest.mark.parametrize("backend", BACKENDS[1:])
+@pytest.mark.parametrize("name", DOCUMENTS)
+@pytest.mark.parametrize("options", SKIP_OPTIONS)
+def test_streaming_matches_expat(documents, backend, name, options):
+    path = documents[name]
+    assert _streamed(path, backend, options) == _streamed(path, "expat", options)
+
+@pytest.mark.parametrize("backend", BACKENDS[1:])
+@pytest.mark.parametrize("name", DOCUMENTS)
+@pytest.mark.parametrize("options", SKIP_OPTIONS)
+def test_tree_matches_expat(documents, backend, name, options):
+    path = documents[name]
+    assert _tree(path, backend, options) == _tree(path, "expat", options)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_conformance_document_content(documents, backend):
+    # dokument naprawdę zawiera przypadki, które backendy mogłyby potraktować różnie
+    records, attachments = _extracted(*extract_text_elements_streaming(documents["encje_cdata"], backend=backend))
+    assert "  Nadawca: Przedsiębiorstwo & Syn" in records
+    assert any("<surowy> & tekst po ił" in line for line in records)
+    assert [name for name, _ in attachments] == ["a.txt", "b.pdf"]
@@ -0,0 +1,17 @@
+from xmlreader_core import SEARCH_MERGE_LISTS, SearchIndex
+
+def _matches(index, query):
+    matches = index.search(query)
+    matches.collect(10 ** 6)
+    return list(matches.found)
+
+def test_short_prefix_is_merged_once():
+    lines = [f"pozycja slowo{i} koniec" for i in range(3 * SEARCH_MERGE_LISTS)] + ["inna linia"]
+    index = SearchIndex(lines)
+    assert index.needs_merge("slowo")
+    assert index.needs_merge("koniec slowo")
+    assert not index.needs_merge("slowo1")  # slowo1 i slowo10..19
+    assert not index.needs_merge("inna")
+    assert _matches(index, "slowo") == list(range(3 * SEARCH_MERGE_LISTS))
+    assert not index.needs_merge("slowo")
+    assert _matches(index, "slowo4") == [4] + list(range(40, 50))
@@ -0,0 +1,48 @@
+import base64
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from xmlreader_core import extract_all_text_elements, extract_text_elements_streaming
+
+# Wersja strumieniowa musi dawać to samo co wersja drzewiasta: te same linie
+# i te same załączniki, także przy pomijaniu poddrzew.
+
+PAYLOAD = base64.b64encode(b'%PDF-1.7\n' + bytes(range(256)) * 8).decode('ascii')
+
+DOCUMENTS = {
+    "pomijany_w_tekscie_mieszanym": (
+        '<r xmlns:ds="http://www.w3.org/2000/09/xmldsig#">'
+        '<p>hello<ds:SignatureValue>QUJD</ds:SignatureValue>world</p>'
+        '<q>przed<ds:Signature><ds:X509Certificate>QUJD</ds:X509Certificate></ds:Signature>po<b>x</b>ogon</q>'
+        '</r>'),
+    "pomijany_po_dziecku": (
+        '<r><p>a<b>b</b>c<Pomijany>d</Pomijany>e</p><Pomijany>f</Pomijany>g</r>'),
+    "cdata_i_encje": (
+        '<!DOCTYPE r [<!ENTITY firma "Firma &amp; Syn">]>'
+        '<r><a>&firma; <![CDATA[<surowy>]]> &#x142;</a><Pomijany><a>x</a></Pomijany></r>'),
+    "zalaczniki": (
+        f'<r><Zalacznik nazwaPliku="a.pdf">{PAYLOAD}</Zalacznik>'
+        f'<Zalacznik Nazwa="b"><Pomijany/>{PAYLOAD}</Zalacznik></r>'),
+}
+
+def _extracted(records, attachments):
+    return list(records), [(a.filename, a.data) for a in attachments]
+
+@pytest.mark.parametrize("name", sorted(DOCUMENTS))
+@pytest.mark.parametrize("options", [
+    {},
+    {"skip_signature_blocks": True},
+    {"skip_rules": ["Pomijany", "{http://www.w3.org/2000/09/xmldsig#}"]},
+])
+def test_streaming_matches_tree(name, options):
+    document = DOCUMENTS[name].encode('utf-8')
+    expected = _extracted(*extract_all_text_elements(ET.fromstring(document), **options))
+    got = _extracted(*extract_text_elements_streaming(io.BytesIO(document), chunk_size=7, **options))
+    assert got == expected
+
+def test_skipped_child_ends_parent_text():
+    document = b'<r xmlns:ds="http://www.w3.org/2000/09/xmldsig#"><p>hello<ds:SignatureValue>QUJD</ds:SignatureValue>world</p></r>'
+    records, _ = extract_text_elements_streaming(io.BytesIO(document), skip_signature_blocks=True)
+    assert list(records) == ["  p: hello"]
@@ -0,0 +1,64 @@
+import os
+
+import xmlreader_cli
+import xmlreader_watch
+from xmlreader_cli import build_parser, processing_options
+from xmlreader_watch import FolderWatcher, WatchJournal
+
+def _document(text):
+    return f"<Dokument><Pole>{text}</Pole></Dokument>"
+
+def _crash_on_zly(path, out_dir, options):
+    if "zly" in os.path.basename(path):
+        os._exit(1)
+    return xmlreader_cli.process_document(path, out_dir, options)
+
+def _watch(inputs, output, jobs=2):
+    args = build_parser().parse_args(inputs + ["-o", output, "--no-html"])
+    journal = WatchJournal(os.path.join(output, ".dziennik.jsonl"))
+    lines = []
+    watcher = FolderWatcher(inputs, output, processing_options(args), journal, jobs=jobs, settle=0,
+                            report=lines.append)
+    try:
+        watcher.run(interval=0.05, once=True)
+    finally:
+        journal.close()
+    return journal, lines
+
+def test_same_relative_name_from_two_inputs(tmp_path):
+    for name, text in (("a", "pierwszy"), ("b", "drugi")):
+        (tmp_path / name / "in").mkdir(parents=True)
+        (tmp_path / name / "in" / "x.xml").write_text(_document(text), encoding="utf-8")
+    output = str(tmp_path / "out")
+    journal, _ = _watch([str(tmp_path / "a" / "in"), str(tmp_path / "b" / "in")], output)
+    outputs = sorted(entry["output"] for entry in journal.entries.values())
+    assert len(set(outputs)) == 2
+    texts = [open(os.path.join(out, os.path.basename(out) + ".txt"), encoding="utf-8").read() for out in outputs]
+    assert sorted(text.split(": ")[-1] for text in texts) == ["drugi", "pierwszy"]
+
+def test_identical_files_in_one_burst_are_duplicates(tmp_path):
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    for i in range(6):
+        (inbox / f"kopia{i}.xml").write_text(_document("ta sama treść"), encoding="utf-8")
+    journal, _ = _watch([str(inbox)], str(tmp_path / "out"), jobs=4)
+    statuses = sorted(entry["status"] for entry in journal.entries.values())
+    assert statuses == ["duplicate"] * 5 + ["ok"]
+
+def test_crashed_worker_fails_only_its_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(xmlreader_watch, "process_document", _crash_on_zly)
+    inbox = tmp_path / "in"
+    inbox.mkdir()
+    for i in range(5):
+        (inbox / f"d{i}.xml").write_text(_document(f"dokument {i}"), encoding="utf-8")
+    (inbox / "zly.xml").write_text(_document("wywraca proces"), encoding="utf-8")
+    output = str(tmp_path / "out")
+    journal, _ = _watch([str(inbox)], output, jobs=3)
+    statuses = {os.path.basename(path): entry["status"] for path, entry in journal.entries.items()}
+    assert statuses == {**{f"d{i}.xml": "ok" for i in range(5)}, "zly.xml": "crashed"}
+    st = os.stat(inbox / "zly.xml")
+    reloaded = WatchJournal(os.path.join(output, ".dziennik.jsonl"))
+    try:
+        assert not reloaded.known(str(inbox / "zly.xml"), st.st_size, st.st_mtime_ns)
+    finally:
+        reloaded.close()
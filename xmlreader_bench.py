@@ -0,0 +1,527 @@
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+from xmlreader_core import (available_parser_backends, extract_all_text_elements, extract_text_elements_streaming,
+                            generate_html_from_text_lines, guess_extension_from_base64, guess_extension_from_bytes,
+                            is_base64_string, parse_xml_tree)
+
+# === Implementacje referencyjne (stan sprzed optymalizacji) ===
+
+def legacy_is_base64_string(s):
+    try:
+        return len(s) > 100 and base64.b64encode(base64.b64decode(s)).decode()[:100] in s[:110]
+    except Exception:
+        return False
+
+def legacy_guess_office_extension(file_bytes):
+    try:
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as z:
+            namelist = z.namelist()
+            if any(name.startswith('word/') for name in namelist): return '.docx'
+            elif any(name.startswith('xl/') for name in namelist): return '.xlsx'
+            elif any(name.startswith('ppt/') for name in namelist): return '.pptx'
+            else: return '.zip'
+    except: pass
+
+    ole_magic = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
+    if file_bytes.startswith(ole_magic):
+        header_sample = file_bytes[512:2048].decode('latin1', errors='ignore').lower()
+        if 'worddocument' in header_sample: return '.doc'
+        elif 'workbook' in header_sample: return '.xls'
+        elif 'powerpoint document' in header_sample: return '.ppt'
+        else: return '.ole'
+    try:
+        text_sample = file_bytes[:2048].decode('utf-8')
+        if not text_sample.lstrip().startswith('<?xml'): return '.txt'
+    except: pass
+    return 'nieznany'
+
+def legacy_guess_extension_from_bytes(data_bytes):
+    header = data_bytes[:100].lstrip()
+    if header.startswith(b'%PDF-'): return '.pdf'
+    elif header.startswith(b'\xFF\xD8\xFF'): return '.jpg'
+    elif header.startswith(b'\x89PNG\r\n\x1a\n'): return '.png'
+    elif header.startswith(b'PK\x03\x04'): return legacy_guess_office_extension(data_bytes)
+    elif header.startswith(b'<?xml') or header.startswith(b'<'): return '.xml'
+    elif header.startswith(b'From:') or b'\r\nFrom:' in data_bytes[:200] or b'\nFrom:' in data_bytes[:200]: return '.eml'
+    elif data_bytes.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
+        sample = data_bytes[:2048].lower()
+        if b'outlook message' in sample or b'microsoft outlook' in sample: return '.msg'
+        return legacy_guess_office_extension(data_bytes)
+    else: return '.nieznany'
+
+# === Pomocnicze ===
+
+def iter_xml_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                for name in sorted(filenames):
+                    if name.lower().endswith('.xml'):
+                        yield os.path.join(dirpath, name)
+        else:
+            yield path
+
+def best_time(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# === base64 ===
+
+def bench_base64(sizes):
+    print(f"{'rozmiar':>12} {'stara [ms]':>12} {'nowa [ms]':>12}")
+    for size in sizes:
+        payload = base64.b64encode(os.urandom(size)).decode()
+        old = best_time(legacy_is_base64_string, payload)
+        new = best_time(is_base64_string, payload)
+        print(f"{size:>12} {old * 1000:>12.3f} {new * 1000:>12.3f}")
+
+def check_base64_agreement(paths):
+    checked = 0
+    mismatches = []
+    for path in iter_xml_files(paths):
+        for _, elem in ET.iterparse(path):
+            text = (elem.text or "").strip()
+            if text:
+                checked += 1
+                expected = legacy_is_base64_string(text)
+                if is_base64_string(text) != expected:
+                    mismatches.append((path, elem.tag, expected))
+            elem.clear()
+    print(f"Sprawdzono {checked} węzłów tekstowych, rozbieżności: {len(mismatches)}")
+    for path, tag, expected in mismatches:
+        print(f"  {path}: {tag} (stara: {expected})")
+    return not mismatches
+
+# === Rozpoznawanie typu ===
+
+OLE_SAMPLE = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1' + b'\x00' * 600 + b'WordDocument' + b'\x00' * 1500
+
+def random_bytes(n, rng=None):
+    return rng.randbytes(n) if rng is not None else os.urandom(n)
+
+def make_zip(prefix, payload_size, entries=3, rng=None):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED) as z:
+        z.writestr('[Content_Types].xml', '<Types/>')
+        for i in range(entries):
+            z.writestr(f'{prefix}part{i}.bin', random_bytes(payload_size // entries, rng))
+    return buf.getvalue()
+
+PAYLOAD_KINDS = ('pdf', 'jpg', 'png', 'docx', 'xlsx', 'pptx', 'zip', 'xml', 'eml', 'doc')
+
+def make_payload(kind, size, rng=None):
+    # Typowy załącznik danego rodzaju o zadanym rozmiarze (w przybliżeniu)
+    if kind == 'pdf': return b'%PDF-1.7\n' + random_bytes(size, rng)
+    if kind == 'jpg': return b'\xFF\xD8\xFF\xE0' + random_bytes(size, rng)
+    if kind == 'png': return b'\x89PNG\r\n\x1a\n' + random_bytes(size, rng)
+    if kind == 'docx': return make_zip('word/', size, rng=rng)
+    if kind == 'xlsx': return make_zip('xl/', size, rng=rng)
+    if kind == 'pptx': return make_zip('ppt/', size, rng=rng)
+    if kind == 'zip': return make_zip('dane/', size, rng=rng)
+    if kind == 'xml': return b'<?xml version="1.0"?><a>' + b'x' * size + b'</a>'
+    if kind == 'eml': return b'Received: x\r\nFrom: a@b.pl\r\n\r\n' + b'tresc ' * (size // 6)
+    if kind == 'doc': return OLE_SAMPLE + random_bytes(size, rng)
+    raise ValueError(f"nieznany rodzaj załącznika: {kind}")
+
+def sample_payloads(size):
+    return {kind: make_payload(kind, size) for kind in PAYLOAD_KINDS}
+
+def legacy_guess_extension_from_base64(text):
+    return legacy_guess_extension_from_bytes(base64.b64decode(text))
+
+def bench_sniff(sizes):
+    # "b64" to rozpoznanie wprost z tekstu base64 łamanego w wiersze (jak w XML)
+    print(f"{'typ':>6} {'rozmiar':>12} {'stara [ms]':>12} {'nowa [ms]':>12} "
+          f"{'b64 stara':>12} {'b64 nowa':>12} {'stara':>10} {'nowa':>10}")
+    for size in sizes:
+        for kind, data in sample_payloads(size).items():
+            text = base64.encodebytes(data).decode()
+            old = best_time(legacy_guess_extension_from_bytes, data, repeat=3)
+            new = best_time(guess_extension_from_bytes, data, repeat=3)
+            old_b64 = best_time(legacy_guess_extension_from_base64, text, repeat=3)
+            new_b64 = best_time(guess_extension_from_base64, text, repeat=3)
+            print(f"{kind:>6} {len(data):>12} {old * 1000:>12.3f} {new * 1000:>12.3f} "
+                  f"{old_b64 * 1000:>12.3f} {new_b64 * 1000:>12.3f} "
+                  f"{legacy_guess_extension_from_bytes(data):>10} {guess_extension_from_base64(text):>10}")
+
+def check_sniff_agreement(paths):
+    checked = 0
+    mismatches = []
+    for path in iter_xml_files(paths):
+        _, attachments = extract_text_elements_streaming(path, spill_threshold=None)
+        for attachment in attachments:
+            try:
+                data = attachment.data
+            except Exception:
+                continue
+            checked += 1
+            expected = legacy_guess_extension_from_bytes(data)
+            if attachment.spilled:
+                got = guess_extension_from_bytes(data)
+            else:
+                got = guess_extension_from_base64(attachment.source, attachment.start, attachment.end)
+            if got != expected:
+                mismatches.append((path, attachment.filename, expected, got))
+    print(f"Sprawdzono {checked} załączników, rozbieżności: {len(mismatches)}")
+    for path, name, expected, got in mismatches:
+        print(f"  {path}: {name} (stara: {expected}, nowa: {got})")
+    return not mismatches
+
+# === Generator dokumentów ===
+# Syntetyczny e-dokument o strukturze jak w prawdziwych wnioskach: opis z polem
+# Informacja, zagnieżdżona treść, załączniki z nazwaPliku/Nazwa i opcjonalnie
+# podpisy XAdES z SignatureValue i X509Certificate.
+
+DOC_NAMESPACES = ('xmlns:wnio="http://crd.gov.pl/xml/schematy/wnio/" '
+                  'xmlns:str="http://crd.gov.pl/xml/schematy/struktura/" '
+                  'xmlns:ds="http://www.w3.org/2000/09/xmldsig#"')
+FIELD_NAMES = ('Imie', 'Nazwisko', 'Miejscowosc', 'Ulica', 'KodPocztowy', 'Data', 'Kwota', 'Uwagi', 'Opis')
+
+def parse_size(size):
+    # "1000000", "100K" albo "5M" -> bajty
+    units = {'K': 1024, 'M': 1024 * 1024}
+    if size[-1].upper() in units:
+        return int(float(size[:-1]) * units[size[-1].upper()])
+    return int(size)
+
+def parse_attachment_spec(spec):
+    # "pdf:1000000" albo "docx:5M" -> ('pdf', 1000000)
+    kind, _, size = spec.partition(':')
+    return kind, parse_size(size or '100K')
+
+def _base64_text(data):
+    # bez łamania wierszy - tak zapisują typowe e-dokumenty, a detekcja wymaga 100 znaków w ciągu
+    return base64.b64encode(data).decode('ascii')
+
+def generate_document(out, depth=6, elements=10_000, attachments=(), signatures=0, seed=0, long_text=0):
+    rng = random.Random(seed)
+    write = out.write
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write(f'<wnio:Dokument {DOC_NAMESPACES}>')
+    write('<wnio:OpisDokumentu><wnio:Informacja>Wniosek testowy</wnio:Informacja>'
+          '<wnio:Data>2024-01-01</wnio:Data></wnio:OpisDokumentu>')
+
+    # Treść: pola rozdzielone na gałęzie o zadanej głębokości
+    write('<wnio:TrescDokumentu>')
+    written = 0
+    branch = 0
+    while written < elements:
+        branch += 1
+        levels = rng.randint(1, max(1, depth))
+        for level in range(levels):
+            write(f'<wnio:Sekcja{level} numer="{branch}">')
+        for _ in range(min(rng.randint(5, 40), elements - written)):
+            name = rng.choice(FIELD_NAMES)
+            if rng.random() < 0.3:
+                value = f"{name}: wartość {rng.randint(0, 10 ** 6)}"
+            else:
+                value = f"wartość {rng.randint(0, 10 ** 6)} &<>\"'"
+            write(f'<wnio:{name}>{escape(value)}</wnio:{name}>')
+            written += 1
+        for level in reversed(range(levels)):
+            write(f'</wnio:Sekcja{level}>')
+
+    if long_text:
+        # jeden węzeł tekstowy (nie base64) o długości long_text znaków, pisany kawałkami
+        write('<wnio:Uwagi>')
+        words = [f"uwaga{rng.randint(0, 999)} zażółć" for _ in range(1000)]
+        block = ' '.join(words) + ' '
+        for _ in range(long_text // len(block)):
+            write(block)
+        write(block[:long_text % len(block)])
+        write('</wnio:Uwagi>')
+
+    if attachments:
+        write('<str:Zalaczniki>')
+        for i, (kind, size) in enumerate(attachments, start=1):
+            # co drugi załącznik z atrybutem Nazwa, jak w starszych schematach
+            attr = 'nazwaPliku' if i % 2 else 'Nazwa'
+            write(f'<str:Zalacznik {attr}={quoteattr(f"zalacznik_{i}.{kind}")} kodowanie="base64">'
+                  f'<str:DaneZalacznika>{_base64_text(make_payload(kind, size, rng))}</str:DaneZalacznika></str:Zalacznik>')
+        write('</str:Zalaczniki>')
+    write('</wnio:TrescDokumentu>')
+
+    for i in range(signatures):
+        write(f'<ds:Signature Id="podpis-{i}"><ds:SignedInfo><ds:SignatureMethod '
+              f'Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"/></ds:SignedInfo>'
+              f'<ds:SignatureValue>{_base64_text(rng.randbytes(256))}</ds:SignatureValue>'
+              f'<ds:KeyInfo><ds:X509Data><ds:X509Certificate>{_base64_text(rng.randbytes(1500))}'
+              f'</ds:X509Certificate></ds:X509Data></ds:KeyInfo></ds:Signature>')
+    write('</wnio:Dokument>\n')
+
+def generate_file(path, **params):
+    with open(path, 'w', encoding='utf-8') as f:
+        generate_document(f, **params)
+    return path
+
+# === Zestaw pomiarów ===
+# Każdy etap mierzymy dwa razy: najlepszy czas z kilku powtórzeń bez śledzenia
+# pamięci i jeden przebieg pod tracemalloc dla szczytowego zużycia. Wyniki idą do
+# JSON; porównanie z bazą ma sens tylko na tej samej maszynie.
+
+SUITE_PROFILES = {
+    'maly': dict(depth=4, elements=2_000, attachments=[('pdf', 100_000), ('docx', 100_000)], signatures=1),
+    'sredni': dict(depth=8, elements=50_000,
+                   attachments=[(kind, 1_000_000) for kind in ('pdf', 'docx', 'xlsx', 'jpg', 'xml')], signatures=2),
+    'duzy': dict(depth=12, elements=300_000, attachments=[('pdf', 20_000_000), ('docx', 20_000_000)], signatures=2),
+    # węzły tekstowe ponad 10 MB - powyżej domyślnego limitu libxml2 (lxml tylko z huge_tree)
+    'dlugi_tekst': dict(depth=2, elements=1_000, attachments=[('pdf', 30_000_000)], signatures=0,
+                        long_text=20_000_000),
+}
+DEFAULT_TOLERANCE = 0.15
+# poniżej tych wartości różnice to szum pomiaru
+MIN_COMPARED = {"seconds": 0.001, "peak_bytes": 64 * 1024}
+
+def measure(func, repeat=3):
+    seconds = best_time(func, repeat=repeat)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+def run_stages(path, repeat=3):
+    tree = ET.parse(path)
+    root = tree.getroot()
+    records, attachments = extract_all_text_elements(root)
+    texts = [elem.text.strip() for elem in root.iter() if elem.text and elem.text.strip()]
+    payloads = [a.data for a in attachments]
+    lines = list(records)
+
+    stages = {
+        "ET.parse": lambda: ET.parse(path),
+        "extract_all_text_elements": lambda: extract_all_text_elements(root),
+        "extract_text_elements_streaming": lambda: extract_text_elements_streaming(path, spill_threshold=None,
+                                                                                   backend="expat"),
+        "extract_text_elements_mapped": lambda: extract_text_elements_streaming(path, mapped=True),
+        "is_base64_string": lambda: [is_base64_string(t) for t in texts],
+        "guess_extension_from_bytes": lambda: [guess_extension_from_bytes(d) for d in payloads],
+        "guess_extension_from_base64": lambda: [guess_extension_from_base64(a.source, a.start, a.end)
+                                               for a in attachments],
+        "generate_html_from_text_lines": lambda: generate_html_from_text_lines(lines),
+    }
+    # pozostałe backendy parsera obok expat (ET.parse i wersja strumieniowa wyżej)
+    others = [name for name in available_parser_backends() if name != "expat"]
+    for backend in others:
+        other_root = parse_xml_tree(path, backend)
+        stages[f"parse_xml_tree[{backend}]"] = lambda backend=backend: parse_xml_tree(path, backend)
+        stages[f"extract_all_text_elements[{backend}]"] = lambda root=other_root: extract_all_text_elements(root)
+        stages[f"extract_text_elements_streaming[{backend}]"] = (
+            lambda backend=backend: extract_text_elements_streaming(path, spill_threshold=None, backend=backend))
+    results = {}
+    for name, func in stages.items():
+        results[name] = measure(func, repeat)
+        print(f"  {name:<38} {results[name]['seconds'] * 1000:>10.1f} ms "
+              f"{results[name]['peak_bytes'] / 1048576:>10.1f} MB")
+    # tracemalloc nie widzi pamięci libxml2, więc dla lxml porównujemy tylko czasy
+    for backend in others:
+        tree_ratio = ((results["ET.parse"]["seconds"] + results["extract_all_text_elements"]["seconds"])
+                      / (results[f"parse_xml_tree[{backend}]"]["seconds"]
+                         + results[f"extract_all_text_elements[{backend}]"]["seconds"]))
+        stream_ratio = (results["extract_text_elements_streaming"]["seconds"]
+                        / results[f"extract_text_elements_streaming[{backend}]"]["seconds"])
+        print(f"  {backend} względem expat: drzewo {tree_ratio:.2f}x, strumień {stream_ratio:.2f}x szybciej")
+    return results
+
+# === Zgodność backendów parsera ===
+# Każdy backend musi dać dokładnie to samo co expat: te same rekordy tekstu i te
+# same załączniki (nazwa i zawartość), zarówno z drzewa, jak i strumieniowo.
+
+CONFORMANCE_DOCUMENT = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE Dokument [<!ENTITY firma "Przedsiębiorstwo &amp; Syn">]>
+<?xml-stylesheet type="text/xsl" href="widok.xsl"?>
+<Dokument xmlns="http://example.com/domyslna" xmlns:a="http://example.com/a">
+  <!-- komentarz pomijany przez oba backendy -->
+  <Nadawca>&firma;</Nadawca>
+  <a:Opis>przed <![CDATA[<surowy> & tekst]]> po<?instrukcja dane?> i&#x142;&#322;</a:Opis>
+  <Mieszany>początek<b>pogrubiony</b>ogon</Mieszany>
+  <Pusty/>   <Spacje>   </Spacje>
+  <Zalacznik nazwaPliku="a.txt">{payload}</Zalacznik>
+  <Zalacznik a:Nazwa="b.bin" Nazwa="b.pdf"><Dane>{payload}</Dane></Zalacznik>
+</Dokument>
+'''
+
+def _extraction_digest(records, attachments):
+    result = (list(records), [(a.filename, a.data) for a in attachments])
+    for attachment in attachments:
+        attachment.discard()
+    return result
+
+def conformance_documents(workdir, seed=0):
+    # Dokument z encjami, CDATA, komentarzami i przestrzeniami nazw oraz dwa syntetyczne
+    payload = _base64_text(make_payload('pdf', 3000, random.Random(seed)))
+    paths = [os.path.join(workdir, "zgodnosc.xml")]
+    with open(paths[0], 'w', encoding='utf-8') as f:
+        f.write(CONFORMANCE_DOCUMENT.format(payload=payload))
+    paths.append(generate_file(os.path.join(workdir, "zgodnosc_maly.xml"), seed=seed, **SUITE_PROFILES['maly']))
+    paths.append(generate_file(os.path.join(workdir, "zgodnosc_dlugi.xml"), seed=seed, depth=3, elements=500,
+                               attachments=[('docx', 2_000_000)], signatures=1, long_text=12_000_000))
+    return paths
+
+def check_backend_agreement(paths):
+    others = [name for name in available_parser_backends() if name != "expat"]
+    if not others:
+        print("Dostępny jest tylko backend expat - nie ma czego porównywać (zainstaluj lxml)")
+        return True
+    checked = 0
+    mismatches = []
+    for path in iter_xml_files(paths):
+        expected_tree = _extraction_digest(*extract_all_text_elements(parse_xml_tree(path, "expat")))
+        expected_stream = _extraction_digest(*extract_text_elements_streaming(path, backend="expat"))
+        for backend in others:
+            checked += 1
+            if _extraction_digest(*extract_all_text_elements(parse_xml_tree(path, backend))) != expected_tree:
+                mismatches.append((path, backend, "drzewo"))
+            if _extraction_digest(*extract_text_elements_streaming(path, backend=backend)) != expected_stream:
+                mismatches.append((path, backend, "strumień"))
+    print(f"Sprawdzono {checked} par dokument/backend ({', '.join(others)}), rozbieżności: {len(mismatches)}")
+    for path, backend, mode in mismatches:
+        print(f"  {path}: {backend} ({mode}) różni się od expat")
+    return not mismatches
+
+def machine_info():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(), "cpus": os.cpu_count()}
+
+def run_suite(profiles, workdir, repeat=3, seed=0):
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": machine_info(), "profiles": {}}
+    for name in profiles:
+        params = SUITE_PROFILES[name]
+        path = generate_file(os.path.join(workdir, f"bench_{name}.xml"), seed=seed, **params)
+        print(f"{name}: {os.path.getsize(path) / 1048576:.1f} MB, {params['elements']} pól, "
+              f"głębokość {params['depth']}, {len(params['attachments'])} załączników")
+        report["profiles"][name] = {
+            "params": {**params, "attachments": [list(a) for a in params["attachments"]]},
+            "file_bytes": os.path.getsize(path),
+            "stages": run_stages(path, repeat),
+        }
+        os.remove(path)
+    return report
+
+def compare_reports(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Zwraca listę regresji (profil, etap, metryka, baza, teraz)
+    regressions = []
+    print(f"{'profil':<8} {'etap':<38} {'czas':>8} {'pamięć':>8}")
+    for profile, current in report["profiles"].items():
+        base = baseline.get("profiles", {}).get(profile)
+        if base is None:
+            continue
+        for stage, values in current["stages"].items():
+            old = base["stages"].get(stage)
+            if old is None:
+                continue
+            ratios = []
+            for metric in ("seconds", "peak_bytes"):
+                ratio = values[metric] / old[metric] if old[metric] else 1.0
+                ratios.append(ratio)
+                if ratio > 1 + tolerance and values[metric] >= MIN_COMPARED[metric]:
+                    regressions.append((profile, stage, metric, old[metric], values[metric]))
+            print(f"{profile:<8} {stage:<38} {ratios[0]:>7.2f}x {ratios[1]:>7.2f}x")
+    if baseline.get("machine") != report["machine"]:
+        print("Uwaga: baza pochodzi z innej maszyny lub wersji Pythona")
+    for profile, stage, metric, old, new in regressions:
+        print(f"REGRESJA {profile}/{stage} {metric}: {old:.4g} -> {new:.4g}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pomiary wydajności xmlreader")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    b64 = sub.add_parser("base64", help="detekcja base64: czas i zgodność ze starą implementacją")
+    b64.add_argument("paths", nargs="*", help="pliki lub katalogi XML do sprawdzenia zgodności")
+    b64.add_argument("--sizes", type=int, nargs="+",
+                     default=[1_000, 100_000, 1_000_000, 10_000_000, 50_000_000],
+                     help="rozmiary zdekodowanych ładunków w bajtach")
+
+    sniff = sub.add_parser("sniff", help="rozpoznawanie typu: czas i zgodność ze starą implementacją")
+    sniff.add_argument("paths", nargs="*", help="pliki lub katalogi XML z załącznikami do sprawdzenia zgodności")
+    sniff.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 50_000_000],
+                       help="przybliżone rozmiary załączników w bajtach")
+
+    gen = sub.add_parser("generate", help="zapisz syntetyczny dokument XML")
+    gen.add_argument("output", help="plik wynikowy")
+    gen.add_argument("--depth", type=int, default=6, help="maksymalna głębokość zagnieżdżenia sekcji")
+    gen.add_argument("--elements", type=int, default=10_000, help="liczba pól z tekstem")
+    gen.add_argument("--attachment", action="append", default=[], metavar="RODZAJ:ROZMIAR",
+                     help=f"załącznik, np. pdf:5M (rodzaje: {', '.join(PAYLOAD_KINDS)}); można powtarzać")
+    gen.add_argument("--signatures", type=int, default=1, help="liczba bloków podpisu")
+    gen.add_argument("--long-text", type=parse_size, default=0, metavar="ROZMIAR",
+                     help="dodaj jeden węzeł tekstowy o tej długości, np. 20M")
+    gen.add_argument("--seed", type=int, default=0)
+
+    backends = sub.add_parser("parser", help="zgodność backendów parsera z expat")
+    backends.add_argument("paths", nargs="*",
+                          help="pliki lub katalogi XML (domyślnie wygenerowane dokumenty testowe)")
+    backends.add_argument("--seed", type=int, default=0)
+
+    suite = sub.add_parser("suite", help="czas i pamięć kolejnych etapów na dokumentach syntetycznych")
+    suite.add_argument("--profile", action="append", choices=sorted(SUITE_PROFILES),
+                       help="profil dokumentu (domyślnie wszystkie); można powtarzać")
+    suite.add_argument("--repeat", type=int, default=3, help="powtórzenia pomiaru czasu")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--workdir", help="katalog na wygenerowane dokumenty (domyślnie tymczasowy)")
+    suite.add_argument("-o", "--output", help="zapisz wyniki do pliku JSON")
+    suite.add_argument("--baseline", help="porównaj z wcześniej zapisanym plikiem JSON")
+    suite.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                       help="dopuszczalny względny wzrost czasu lub pamięci (0.15 = 15%%)")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        generate_file(args.output, depth=args.depth, elements=args.elements,
+                      attachments=[parse_attachment_spec(a) for a in args.attachment],
+                      signatures=args.signatures, seed=args.seed, long_text=args.long_text)
+    elif args.command == "parser":
+        if args.paths:
+            agreed = check_backend_agreement(args.paths)
+        else:
+            with tempfile.TemporaryDirectory(prefix="xmlreader_bench_") as workdir:
+                agreed = check_backend_agreement(conformance_documents(workdir, args.seed))
+        if not agreed:
+            return 1
+    elif args.command == "suite":
+        profiles = args.profile or list(SUITE_PROFILES)
+        if args.workdir:
+            os.makedirs(args.workdir, exist_ok=True)
+            report = run_suite(profiles, args.workdir, args.repeat, args.seed)
+        else:
+            with tempfile.TemporaryDirectory(prefix="xmlreader_bench_") as workdir:
+                report = run_suite(profiles, workdir, args.repeat, args.seed)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if compare_reports(report, baseline, args.tolerance):
+                return 1
+    elif args.command == "base64":
+        bench_base64(args.sizes)
+        if args.paths and not check_base64_agreement(args.paths):
+            return 1
+    elif args.command == "sniff":
+        bench_sniff(args.sizes)
+        if args.paths and not check_sniff_agreement(args.paths):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from xmlreader_cli import iter_input_files, pool_results
+from xmlreader_core import KIND_ATTACHMENT, default_cache_dir, extract_text_elements_streaming, file_digest
+
+# === Katalog dokumentów ===
+# Lokalna baza SQLite z tekstem dokumentów (FTS5), parami tag/wartość i metadanymi
+# załączników. Przy ponownym indeksowaniu pomijamy pliki o niezmienionym rozmiarze
+# i czasie modyfikacji, a gdy zmienił się tylko czas - porównujemy SHA-256 treści
+# i nie parsujemy dokumentu, jeśli treść jest ta sama.
+
+CATALOG_FILENAME = "katalog.sqlite"
+CATALOG_COMMIT_EVERY = 200  # dokumentów na transakcję
+CATALOG_GUI_LIMIT = 200  # wyników w oknie katalogu
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_sha256 ON documents(sha256);
+CREATE TABLE IF NOT EXISTS fields (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fields_tag_value ON fields(tag, value);
+CREATE INDEX IF NOT EXISTS fields_document ON fields(document_id);
+CREATE TABLE IF NOT EXISTS attachments (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    ext TEXT,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS attachments_document ON attachments(document_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5(text, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+def default_catalog_path():
+    return os.environ.get("XMLREADER_CATALOG") or os.path.join(default_cache_dir(), CATALOG_FILENAME)
+
+def fts_query(text):
+    # Zwykły tekst -> zapytanie FTS5: każde słowo jako fraza (myślniki, kropki
+    # i cudzysłowy nie są składnią), "*" na końcu słowa oznacza prefiks
+    terms = []
+    for term in text.split():
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def like_pattern(pattern):
+    # Wzorzec nazwy pliku ("*.pdf", "faktura?.xml" albo fragment nazwy) -> LIKE
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if "*" in pattern or "?" in pattern:
+        return escaped.replace("*", "%").replace("?", "_")
+    return f"%{escaped}%"
+
+# === Indeksowanie jednego dokumentu (w procesie roboczym) ===
+
+def catalog_entry(path, known_sha256=None):
+    st = os.stat(path)
+    entry = {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_digest(path),
+             "unchanged": False, "lines": 0, "text": "", "fields": [], "attachments": [], "error": None}
+    if entry["sha256"] == known_sha256:
+        entry["unchanged"] = True
+        return entry
+
+    attachments = []
+    try:
+        records, attachments = extract_text_elements_streaming(path, skip_signature_blocks=True)
+        texts = []
+        for _, kind, tag, text in records.iter_records():
+            if kind == KIND_ATTACHMENT:
+                continue  # sam nagłówek, nazwa pliku jest w następnym rekordzie
+            texts.append(text)
+            entry["fields"].append((tag, text))
+        entry["lines"] = len(records)
+        entry["text"] = "\n".join(texts)
+        for attachment in attachments:
+            try:
+                ext = attachment.ext
+            except Exception:
+                ext = None
+            entry["attachments"].append((attachment.filename, ext, attachment.size))
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        for attachment in attachments:
+            attachment.discard()
+    return entry
+
+# === Baza katalogu ===
+
+class DocumentCatalog:
+    def __init__(self, path=None):
+        self.path = path or default_catalog_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(CATALOG_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def known(self):
+        # ścieżka -> (rozmiar, mtime_ns, sha256) zapisane przy ostatnim indeksowaniu
+        return {path: (size, mtime_ns, sha256) for path, size, mtime_ns, sha256
+                in self.db.execute("SELECT path, size, mtime_ns, sha256 FROM documents")}
+
+    def update(self, entry):
+        now = time.time()
+        if entry["unchanged"]:
+            self.db.execute("UPDATE documents SET size = ?, mtime_ns = ?, indexed_at = ? WHERE path = ?",
+                            (entry["size"], entry["mtime_ns"], now, entry["path"]))
+            return
+        row = self.db.execute("SELECT id FROM documents WHERE path = ?", (entry["path"],)).fetchone()
+        if row is not None:
+            self.remove(row[0])
+        cursor = self.db.execute(
+            "INSERT INTO documents (path, size, mtime_ns, sha256, lines, error, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry["path"], entry["size"], entry["mtime_ns"], entry["sha256"], entry["lines"], entry["error"], now))
+        document_id = cursor.lastrowid
+        self.db.executemany("INSERT INTO fields (document_id, tag, value) VALUES (?, ?, ?)",
+                            [(document_id, tag, value) for tag, value in entry["fields"]])
+        self.db.executemany("INSERT INTO attachments (document_id, filename, ext, size) VALUES (?, ?, ?, ?)",
+                            [(document_id, *attachment) for attachment in entry["attachments"]])
+        self.db.execute("INSERT INTO document_text (rowid, text) VALUES (?, ?)", (document_id, entry["text"]))
+
+    def remove(self, document_id):
+        # FTS5 nie zna kluczy obcych, więc tekst usuwamy osobno
+        self.db.execute("DELETE FROM document_text WHERE rowid = ?", (document_id,))
+        self.db.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    def prune(self):
+        # Usuwa wpisy plików, których już nie ma na dysku
+        missing = [document_id for document_id, path in self.db.execute("SELECT id, path FROM documents")
+                   if not os.path.exists(path)]
+        for document_id in missing:
+            self.remove(document_id)
+        self.db.commit()
+        return len(missing)
+
+    def query(self, text=None, fields=(), attachment=None, limit=50):
+        # Dokumenty spełniające wszystkie warunki: tekst (FTS), pola tag=wartość
+        # ("*" w wartości to dowolny ciąg) i nazwa załącznika (wzorzec lub fragment)
+        match = fts_query(text) if text else ""
+        conditions = []
+        params = []
+        if match:
+            sql = ("SELECT d.id, d.path, snippet(document_text, 0, '[', ']', '…', 12) FROM document_text "
+                   "JOIN documents d ON d.id = document_text.rowid")
+            conditions.append("document_text MATCH ?")
+            params.append(match)
+            order = "bm25(document_text)"
+        else:
+            sql = "SELECT d.id, d.path, '' FROM documents d"
+            order = "d.path"
+        for tag, value in fields:
+            if "*" in value or "?" in value:
+                conditions.append("EXISTS (SELECT 1 FROM fields f WHERE f.document_id = d.id "
+                                  "AND f.tag = ? AND f.value LIKE ? ESCAPE '\\')")
+                params.extend((tag, like_pattern(value)))
+            else:
+                conditions.append("EXISTS (SELECT 1 FROM fields f WHERE f.document_id = d.id AND f.tag = ? AND f.value = ?)")
+                params.extend((tag, value))
+        if attachment:
+            conditions.append("EXISTS (SELECT 1 FROM attachments a WHERE a.document_id = d.id "
+                              "AND a.filename LIKE ? ESCAPE '\\')")
+            params.append(like_pattern(attachment))
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        hits = []
+        for document_id, path, snippet in self.db.execute(sql, params).fetchall():
+            names = [name for name, in self.db.execute(
+                "SELECT filename FROM attachments WHERE document_id = ? ORDER BY rowid", (document_id,))]
+            hits.append({"path": path, "snippet": snippet.replace("\n", " | "), "attachments": names})
+        return hits
+
+    def stats(self):
+        documents, errors = self.db.execute("SELECT COUNT(*), COUNT(error) FROM documents").fetchone()
+        attachments, = self.db.execute("SELECT COUNT(*) FROM attachments").fetchone()
+        return {"documents": documents, "errors": errors, "attachments": attachments}
+
+# === Indeksowanie wsadowe ===
+
+def index_documents(catalog, inputs, jobs=None, prune=True, report=print):
+    known = catalog.known()
+    tasks = []
+    unchanged = 0
+    for path, _ in iter_input_files(inputs):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        old = known.get(path)
+        if old is not None and old[:2] == (st.st_size, st.st_mtime_ns):
+            unchanged += 1
+            continue
+        tasks.append((path, old[2] if old is not None else None))
+
+    start = time.perf_counter()
+    indexed = failed = writes = 0
+
+    def store(entry):
+        nonlocal indexed, failed, unchanged, writes
+        catalog.update(entry)
+        writes += 1
+        if entry["unchanged"]:
+            unchanged += 1
+        elif entry["error"]:
+            failed += 1
+            report(f"BŁĄD {entry['path']}: {entry['error']}")
+        else:
+            indexed += 1
+        if writes >= CATALOG_COMMIT_EVERY:
+            catalog.db.commit()
+            writes = 0
+
+    if jobs == 1 or len(tasks) <= 1:
+        for path, sha256 in tasks:
+            store(catalog_entry(path, sha256))
+    else:
+        # Plik, który wywraca proces roboczy, nie trafia do katalogu - następne indeksowanie go ponowi
+        for (path, _), entry, error in pool_results(catalog_entry, tasks, jobs):
+            if error is None:
+                store(entry)
+            else:
+                failed += 1
+                report(f"BŁĄD {path}: {type(error).__name__}: {error}")
+    catalog.db.commit()
+    removed = catalog.prune() if prune else 0
+    report(f"Zaindeksowano {indexed} plików, bez zmian {unchanged}, usunięto {removed}, błędy {failed} "
+           f"w {time.perf_counter() - start:.2f} s")
+    return {"indexed": indexed, "unchanged": unchanged, "removed": removed, "failed": failed}
+
+def print_hits(hits, report=print):
+    for hit in hits:
+        report(hit["path"])
+        if hit["snippet"]:
+            report(f"    {hit['snippet']}")
+        if hit["attachments"]:
+            report(f"    załączniki: {', '.join(hit['attachments'])}")
+
+def parse_field(text):
+    tag, sep, value = text.partition("=")
+    if not sep or not tag:
+        raise argparse.ArgumentTypeError(f"oczekiwano TAG=WARTOŚĆ, a jest {text!r}")
+    return tag, value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Katalog dokumentów XML z wyszukiwaniem pełnotekstowym")
+    parser.add_argument("-d", "--database", default=None,
+                        help="plik bazy katalogu (domyślnie XMLREADER_CATALOG lub katalog pamięci podręcznej)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index = sub.add_parser("index", help="dodaj lub odśwież dokumenty w katalogu")
+    index.add_argument("inputs", nargs="+", help="pliki, katalogi lub wzorce glob (np. 'archiwum/**/*.xml')")
+    index.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="liczba procesów roboczych")
+    index.add_argument("--no-prune", action="store_true", help="nie usuwaj wpisów plików, których już nie ma")
+
+    search = sub.add_parser("search", help="znajdź dokumenty w katalogu")
+    search.add_argument("query", nargs="*", help="słowa, które musi zawierać tekst dokumentu (\"fakt*\" = prefiks)")
+    search.add_argument("--field", action="append", type=parse_field, default=[], metavar="TAG=WARTOŚĆ",
+                        help="pole o podanej wartości (\"*\" = dowolny ciąg); można powtarzać")
+    search.add_argument("--attachment", help="nazwa załącznika: wzorzec (\"*.pdf\") lub fragment")
+    search.add_argument("--limit", type=int, default=50, help="maksymalna liczba wyników")
+
+    args = parser.parse_args(argv)
+    with DocumentCatalog(args.database) as catalog:
+        if args.command == "index":
+            result = index_documents(catalog, args.inputs, jobs=args.jobs, prune=not args.no_prune)
+            return 1 if result["failed"] else 0
+        if not (args.query or args.field or args.attachment):
+            stats = catalog.stats()
+            print(f"{catalog.path}: {stats['documents']} dokumentów ({stats['errors']} z błędami), "
+                  f"{stats['attachments']} załączników")
+            return 0
+        hits = catalog.query(" ".join(args.query), fields=args.field, attachment=args.attachment, limit=args.limit)
+        print_hits(hits)
+        return 0 if hits else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
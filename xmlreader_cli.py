@@ -0,0 +1,223 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from xmlreader_core import (HTML_LINES_PER_PAGE, SAVE_WORKERS, SkipRule, available_parser_backends,
+                            extract_text_elements_streaming, format_skip_report, save_all_attachments,
+                            write_checksums, write_html_pages)
+
+# === Wejście ===
+
+def iter_input_files(patterns):
+    # Pliki, katalogi (rekurencyjnie *.xml) i wzorce glob; zwraca (ścieżka, ścieżka względna wyjścia)
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            base = os.path.abspath(pattern)
+            for dirpath, dirnames, filenames in os.walk(base):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith('.xml'):
+                        path = os.path.join(dirpath, name)
+                        rel = os.path.join(os.path.basename(base), os.path.relpath(path, base))
+                        if path not in seen:
+                            seen.add(path)
+                            yield path, os.path.splitext(rel)[0]
+            continue
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                yield path, os.path.splitext(os.path.basename(path))[0]
+
+# === Przetwarzanie jednego dokumentu (w procesie roboczym) ===
+
+def process_document(path, out_dir, options):
+    start = time.perf_counter()
+    result = {"path": path, "output": out_dir, "lines": 0, "attachments": 0, "error": None,
+              "attachment_errors": [], "skipped": {}}
+    attachments = []
+    try:
+        lines, attachments = extract_text_elements_streaming(
+            path, skip_signature_blocks=options["skip_signature"], skip_rules=options["skip_rules"],
+            skip_report=result["skipped"], mapped=options.get("mapped", False),
+            backend=options.get("parser"))
+        result["lines"] = len(lines)
+        result["attachments"] = len(attachments)
+        os.makedirs(out_dir, exist_ok=True)
+        stem = os.path.basename(out_dir)
+
+        if options["text"]:
+            with open(os.path.join(out_dir, stem + ".txt"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines))
+
+        if options["html"]:
+            write_html_pages(lines, out_dir, stem, filename=os.path.basename(path),
+                            font=options["font"], font_size=options["font_size"],
+                            lines_per_page=options["html_page_lines"])
+
+        if options["attachments"] and attachments:
+            folder = os.path.join(out_dir, "zalaczniki")
+            os.makedirs(folder, exist_ok=True)
+            saved = save_all_attachments(attachments, folder, move=True, workers=options["save_workers"])
+            write_checksums(folder, saved)
+            result["attachment_errors"] = [(r["filename"], r["error"]) for r in saved if r["error"]]
+            if result["attachment_errors"]:
+                result["error"] = f"nie zapisano {len(result['attachment_errors'])} z {len(saved)} załączników"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        for attachment in attachments:
+            attachment.discard()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+# === Uruchomienie wsadowe ===
+
+def pool_results(func, tasks, jobs=None):
+    # Wykonuje func(*zadanie) w puli procesów; zwraca (zadanie, wynik, wyjątek) w kolejności
+    # ukończenia. W puli jest naraz najwyżej jobs zadań. Gdy proces roboczy padnie (np.
+    # zabity przez OOM), pula jest zepsuta i każde zadanie w toku dostaje BrokenProcessPool:
+    # tworzymy nową pulę dla reszty, a zadania z chwili awarii ponawiamy pojedynczo, więc
+    # błąd zostaje tylko przy dokumencie, który naprawdę wywraca proces.
+    jobs = jobs or os.cpu_count() or 1
+    queue = deque(range(len(tasks)))
+    suspects = deque()
+    while queue or suspects:
+        if suspects:
+            i = suspects.popleft()
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                try:
+                    result = executor.submit(func, *tasks[i]).result()
+                except Exception as e:
+                    yield tasks[i], None, e
+                else:
+                    yield tasks[i], result, None
+            continue
+        futures = {}
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                while queue or futures:
+                    while queue and len(futures) < jobs:
+                        future = executor.submit(func, *tasks[queue[0]])
+                        futures[future] = queue.popleft()
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in done:
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            broken = True
+                            continue
+                        except Exception as e:
+                            yield tasks[futures.pop(future)], None, e
+                        else:
+                            yield tasks[futures.pop(future)], result, None
+                    if broken:
+                        raise BrokenProcessPool()
+        except BrokenProcessPool:
+            suspects.extend(sorted(futures.values()))
+
+def run_batch(inputs, output, options, jobs=None, report=print):
+    tasks = []
+    used = set()
+    for path, rel in iter_input_files(inputs):
+        out_dir = os.path.join(output, rel)
+        while out_dir.lower() in used:
+            out_dir += "_"
+        used.add(out_dir.lower())
+        tasks.append((path, out_dir))
+
+    results = []
+    start = time.perf_counter()
+    if jobs == 1 or len(tasks) <= 1:
+        for path, out_dir in tasks:
+            results.append(process_document(path, out_dir, options))
+            report_result(results[-1], report)
+    else:
+        for (path, out_dir, _), result, error in pool_results(
+                process_document, [(path, out_dir, options) for path, out_dir in tasks], jobs):
+            if error is not None:  # proces roboczy padł przy tym dokumencie
+                result = {"path": path, "output": out_dir, "error": f"{type(error).__name__}: {error}",
+                          "seconds": 0.0}
+            results.append(result)
+            report_result(result, report)
+
+    failed = sum(1 for r in results if r["error"])
+    report(f"Przetworzono {len(results)} plików w {time.perf_counter() - start:.2f} s, błędy: {failed}")
+    return results
+
+def report_result(result, report=print):
+    if result["error"]:
+        report(f"BŁĄD {result['seconds'] * 1000:9.1f} ms  {result['path']}: {result['error']}")
+        for filename, error in result.get("attachment_errors", ()):
+            report(f"       {filename}: {error}")
+    else:
+        report(f"OK   {result['seconds'] * 1000:9.1f} ms  {result['path']} "
+               f"({result['lines']} linii, {result['attachments']} załączników)")
+    if result.get("skipped"):
+        report(f"       pominięto: {format_skip_report(result['skipped'])}")
+
+def skip_rule(text):
+    try:
+        return SkipRule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Wsadowe przetwarzanie dokumentów XML bez interfejsu graficznego")
+    parser.add_argument("inputs", nargs="+", help="pliki, katalogi lub wzorce glob (np. 'archiwum/**/*.xml')")
+    add_processing_arguments(parser)
+    return parser
+
+def add_processing_arguments(parser):
+    # Opcje wspólne dla trybu wsadowego i obserwowania katalogu
+    parser.add_argument("-o", "--output", required=True, help="katalog wyjściowy")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="liczba procesów roboczych")
+    parser.add_argument("--skip-signature", action="store_true", help="pomiń SignatureValue i X509Certificate")
+    parser.add_argument("--skip", action="append", type=skip_rule, default=[], metavar="REGUŁA",
+                        help="pomiń poddrzewo już przy parsowaniu: Tag, {uri}, {uri}Tag albo ścieżka "
+                             "Rodzic/Tag (/Korzeń/Tag od korzenia); można powtarzać")
+    parser.add_argument("--mmap", action="store_true",
+                        help="mapuj plik do pamięci: załączniki dekodowane wprost z pliku, bez plików tymczasowych")
+    parser.add_argument("--parser", choices=["auto"] + available_parser_backends(), default=None,
+                        help="backend parsera XML (domyślnie XMLREADER_PARSER albo auto)")
+    parser.add_argument("--no-text", action="store_true", help="nie zapisuj wersji tekstowej")
+    parser.add_argument("--no-html", action="store_true", help="nie zapisuj wersji HTML do wydruku")
+    parser.add_argument("--no-attachments", action="store_true", help="nie zapisuj załączników")
+    parser.add_argument("--save-workers", type=int, default=SAVE_WORKERS,
+                        help="liczba wątków zapisu załączników w jednym dokumencie")
+    parser.add_argument("--font", default="Arial", help="czcionka w HTML")
+    parser.add_argument("--font-size", default="14", help="rozmiar czcionki w HTML")
+    parser.add_argument("--html-page-lines", type=int, default=HTML_LINES_PER_PAGE,
+                        help="podział HTML na strony po tyle linii (0 = jeden plik)")
+
+def processing_options(args):
+    return {
+        "skip_signature": args.skip_signature,
+        "skip_rules": [rule.text for rule in args.skip],
+        "mapped": args.mmap,
+        "parser": args.parser,
+        "text": not args.no_text,
+        "html": not args.no_html,
+        "attachments": not args.no_attachments,
+        "font": args.font,
+        "font_size": args.font_size,
+        "html_page_lines": args.html_page_lines,
+        "save_workers": args.save_workers,
+    }
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = processing_options(args)
+    results = run_batch(args.inputs, args.output, options, jobs=args.jobs)
+    return 1 if any(r["error"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2166 @@
+# Rdzeń xmlreader bez interfejsu graficznego: detekcja base64, rozpoznawanie typu,
+# załączniki, ekstrakcja tekstu (drzewo i strumień), pamięć podręczna, wyszukiwanie i generator HTML. Moduł nie
+# importuje tkinter; cięższe moduły (tempfile, hashlib, json, tracemalloc,
+# concurrent.futures) ładujemy dopiero w funkcjach, które ich potrzebują, żeby
+# procesy robocze i zadania wsadowe startowały szybko.
+
+import base64
+import bisect
+import binascii
+import functools
+import html
+import io
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from xml.parsers import expat
+
+# === Pomiary etapów ===
+# Opcjonalne przedziały pomiarowe (czas, liczba wywołań, szczyt pamięci z
+# tracemalloc) wokół etapów wczytywania, ekstrakcji i zapisu. Domyślnie wyłączone:
+# wtedy kosztują jedno sprawdzenie flagi. Szczyt pamięci jest liczony dla całego
+# procesu, więc przy równoległych wątkach jest przybliżony.
+
+class SpanStats:
+    __slots__ = ("calls", "seconds", "max_seconds", "peak_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.peak_bytes = 0
+
+    def as_dict(self):
+        return {"calls": self.calls, "seconds": self.seconds,
+                "max_seconds": self.max_seconds, "peak_bytes": self.peak_bytes}
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.spans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, memory=True):
+        import tracemalloc
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.memory = True
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.memory:
+            import tracemalloc
+            tracemalloc.stop()
+            self.memory = False
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+
+    def record(self, name, seconds, peak_bytes=0):
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = SpanStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.peak_bytes = max(stats.peak_bytes, peak_bytes)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        memory = self.memory
+        stack = self._local.__dict__.setdefault("stack", [])
+        if memory:
+            import tracemalloc
+            memory = tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, 0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = 0
+            if memory:
+                # reset_peak w zagnieżdżonym przedziale nie może zgubić szczytu rodzica
+                _, peak = tracemalloc.get_traced_memory()
+                base, child_peak = stack.pop()
+                peak = max(peak, child_peak)
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+                peak_bytes = max(0, peak - base)
+            self.record(name, seconds, peak_bytes)
+
+    def snapshot(self):
+        with self._lock:
+            items = [(name, stats.as_dict()) for name, stats in self.spans.items()]
+        return dict(sorted(items, key=lambda item: -item[1]["seconds"]))
+
+    def summary(self, limit=4):
+        parts = [f"{name} {stats['seconds']:.2f} s" for name, stats in list(self.snapshot().items())[:limit]]
+        return ", ".join(parts)
+
+    def to_json(self, **context):
+        import json
+        import platform
+        report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                  "platform": platform.platform(), "memory_tracing": self.memory,
+                  **context, "spans": self.snapshot()}
+        return json.dumps(report, indent=2, ensure_ascii=False)
+
+INSTRUMENTATION = Instrumentation()
+span = INSTRUMENTATION.span
+
+def instrumented(name, memory=True):
+    # memory=False dla funkcji wołanych setki tysięcy razy: tylko czas i licznik
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION.enabled:
+                return func(*args, **kwargs)
+            if not memory:
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    INSTRUMENTATION.record(name, time.perf_counter() - start)
+            with INSTRUMENTATION.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+if os.environ.get("XMLREADER_INSTRUMENTATION"):
+    INSTRUMENTATION.enable()
+
+# === Pomocnicze ===
+
+def strip_ns(tag):
+    return tag.split('}', 1)[1] if '}' in tag else tag
+
+# Detekcja base64 o stałym koszcie: zamiast dekodować cały ładunek sprawdzamy
+# alfabet pierwszych 100 znaków, poprawność końcówki i długość.
+B64_PREFIX_LEN = 100
+B64_TAIL_SAMPLE = 128
+_B64_PREFIX_RE = re.compile(r'[A-Za-z0-9+/]{%d}' % B64_PREFIX_LEN)
+_B64_TAIL_RE = re.compile(r'[A-Za-z0-9+/]*={0,2}')
+
+@instrumented("base64.detect", memory=False)
+def is_base64_string(s):
+    if len(s) <= B64_PREFIX_LEN or not _B64_PREFIX_RE.match(s):
+        return False
+    tail = "".join(s[-B64_TAIL_SAMPLE:].split())
+    if not _B64_TAIL_RE.fullmatch(tail):
+        return False
+    data_len = len(s)
+    if data_len % 4:
+        # ładunek łamany w wiersze: liczą się tylko znaki danych (bez dekodowania)
+        data_len -= sum(s.count(ws) for ws in " \t\r\n")
+    return data_len % 4 == 0
+
+# Wycinki ładunku base64: każda czwórka znaków to niezależne 3 bajty, więc zakres
+# bajtów da się zdekodować bez dekodowania całości. Base64Span przelicza numer
+# znaku danych na pozycję w tekście łamanym w wiersze; przy regularnym łamaniu
+# (MIME, PEM) jest to arytmetyka, w pozostałych przypadkach liczenie blokami.
+# Tekstem może być str albo bajty w pliku zmapowanym do pamięci (mmap) - wtedy
+# wycinki czytają tylko potrzebne strony pliku.
+B64_WHITESPACE = " \t\r\n"
+B64_LAYOUT_PROBES = 16
+B64_WALK_BLOCK = 64 * 1024
+_B64_WHITESPACE_BYTES = b" \t\r\n"
+_B64_WHITESPACE_UNITS = (b" ", b"\t", b"\r", b"\n")  # mmap.find nie przyjmuje liczb
+
+def _find_whitespace(text, start, stop, units=B64_WHITESPACE):
+    # str.find na pojedynczym znaku jest wielokrotnie szybsze niż wyrażenie regularne
+    found = [pos for pos in (text.find(ws, start, stop) for ws in units) if pos >= 0]
+    return min(found) if found else -1
+
+class Base64Span:
+    __slots__ = ("text", "start", "end", "chars", "_line", "_step", "_ws", "_units")
+
+    def __init__(self, text, start=0, end=None):
+        end = len(text) if end is None else end
+        if isinstance(text, str):
+            self._ws = self._units = B64_WHITESPACE
+        else:
+            self._ws, self._units = _B64_WHITESPACE_BYTES, _B64_WHITESPACE_UNITS
+        # skrajne białe znaki nie należą do danych
+        while start < end and text[start] in self._ws:
+            start += 1
+        while end > start and text[end - 1] in self._ws:
+            end -= 1
+        self.text = text
+        self.start = start
+        self.end = end
+        self._line = self._step = None
+        self.chars = self._detect_layout()
+
+    def _detect_layout(self):
+        text, start, end, ws = self.text, self.start, self.end, self._ws
+        total = end - start
+        first = _find_whitespace(text, start, min(end, start + B64_WALK_BLOCK), self._units)
+        if first < 0:
+            # bez łamania - sprawdzamy próbki rozłożone wzdłuż tekstu
+            probe = B64_WALK_BLOCK // B64_LAYOUT_PROBES
+            for i in range(1, B64_LAYOUT_PROBES + 1):
+                pos = start + total * i // (B64_LAYOUT_PROBES + 1)
+                if _find_whitespace(text, pos, min(end, pos + probe), self._units) >= 0:
+                    return self._count_chars()
+            self._line, self._step = total, total
+            return total
+
+        line = first - start
+        sep_end = first
+        while sep_end < end and text[sep_end] in ws:
+            sep_end += 1
+        sep = text[first:sep_end]
+        step = line + len(sep)
+        full = (total - 1) // step
+        last = total - full * step
+        if not line or last > line:
+            return self._count_chars()
+        probes = {0, full - 1} | {full * i // B64_LAYOUT_PROBES for i in range(1, B64_LAYOUT_PROBES)}
+        for i in probes:
+            if not 0 <= i < full:
+                continue
+            pos = start + i * step + line
+            if (text[pos:pos + len(sep)] != sep or text[pos - 1] in ws
+                    or text[pos + len(sep)] in ws):
+                return self._count_chars()
+        if _find_whitespace(text, end - last, end, self._units) >= 0:
+            return self._count_chars()
+        self._line, self._step = line, step
+        return full * line + last
+
+    def _count_chars(self):
+        # blokami, żeby nie kopiować całego ładunku naraz
+        count = 0
+        for pos in range(self.start, self.end, B64_WALK_BLOCK):
+            block = self.text[pos:min(pos + B64_WALK_BLOCK, self.end)]
+            count += len(block) - sum(block.count(ws) for ws in self._units)
+        return count
+
+    @property
+    def tail(self):
+        # Ostatnie znaki danych (bez białych znaków) jako str
+        tail = self.text[max(self.start, self.end - B64_TAIL_SAMPLE):self.end]
+        if not isinstance(tail, str):
+            tail = tail.decode('latin-1')
+        return "".join(tail.split())
+
+    @property
+    def size(self):
+        padding = self.tail[-2:].count('=')
+        return self.chars // 4 * 3 - padding
+
+    def char_pos(self, k):
+        # Pozycja k-tego znaku danych w tekście (k == chars -> koniec zakresu)
+        if k >= self.chars:
+            return self.end
+        if self._line is not None:
+            return self.start + k // self._line * self._step + k % self._line
+        return self._walk_forward(k) if k <= self.chars - k else self._walk_backward(self.chars - k)
+
+    def _walk_forward(self, left):
+        text, pos = self.text, self.start
+        while True:
+            block = text[pos:pos + B64_WALK_BLOCK]
+            n = len(block) - sum(block.count(ws) for ws in self._units)
+            if n > left:
+                break
+            left -= n
+            pos += len(block)
+        for i, ch in enumerate(block):
+            if ch not in self._ws:
+                if not left:
+                    return pos + i
+                left -= 1
+
+    def _walk_backward(self, left):
+        # left: ile znaków danych od szukanego do końca (włącznie)
+        text, pos = self.text, self.end
+        while True:
+            block = text[max(self.start, pos - B64_WALK_BLOCK):pos]
+            n = len(block) - sum(block.count(ws) for ws in self._units)
+            if n >= left:
+                break
+            left -= n
+            pos -= len(block)
+        for i in range(len(block) - 1, -1, -1):
+            if block[i] not in self._ws:
+                left -= 1
+                if not left:
+                    return pos - len(block) + i
+
+    @instrumented("base64.decode_slice", memory=False)
+    def decode(self, byte_start, byte_end):
+        first = byte_start // 3
+        last = -(-byte_end // 3)
+        data = binascii.a2b_base64(self.text[self.char_pos(first * 4):self.char_pos(last * 4)])
+        return data[byte_start - first * 3:byte_end - first * 3]
+
+# === Rozpoznawanie typu pliku ===
+# Rejestr sygnatur: każdy sniffer dostaje okno z początkiem (head) i końcem (tail)
+# danych oraz ich rozmiar i zwraca rozszerzenie albo None. Nowe typy dodaje się
+# dekoratorem @register_sniffer(priorytet), bez edycji łańcucha warunków.
+# Katalog ZIP czytamy z okna końcowego, więc nie potrzebujemy całego załącznika.
+
+SNIFF_HEAD_SIZE = 64 * 1024
+SNIFF_TAIL_SIZE = 64 * 1024
+UNKNOWN_EXTENSION = '.nieznany'
+
+OLE_MAGIC = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
+ZIP_LOCAL_MAGIC = b'PK\x03\x04'
+
+class SniffWindow:
+    __slots__ = ("head", "tail", "size", "header")
+
+    def __init__(self, head, tail=b"", size=None):
+        self.head = head
+        self.tail = tail
+        self.size = size
+        self.header = head[:100].lstrip()
+
+_SNIFFERS = []
+
+def register_sniffer(priority=100):
+    def decorator(func):
+        _SNIFFERS.append((priority, len(_SNIFFERS), func))
+        _SNIFFERS.sort()
+        return func
+    return decorator
+
+@instrumented("sniff", memory=False)
+def sniff_extension(head, tail=b"", size=None):
+    window = SniffWindow(head, tail, size)
+    for _, _, sniffer in _SNIFFERS:
+        ext = sniffer(window)
+        if ext:
+            return ext
+    return UNKNOWN_EXTENSION
+
+def guess_extension_from_bytes(data_bytes):
+    return sniff_extension(data_bytes[:SNIFF_HEAD_SIZE], data_bytes[-SNIFF_TAIL_SIZE:], len(data_bytes))
+
+def guess_extension_from_file(path):
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_HEAD_SIZE)
+        size = os.fstat(f.fileno()).st_size
+        if size > SNIFF_HEAD_SIZE:
+            f.seek(max(SNIFF_HEAD_SIZE, size - SNIFF_TAIL_SIZE))
+            tail = f.read()
+        else:
+            tail = head
+    return sniff_extension(head, tail, size)
+
+def guess_extension_from_base64(text, start=0, end=None):
+    # Dekoduje tylko okna początku i końca, nie cały ładunek
+    payload = Base64Span(text, start, end)
+    size = payload.size
+    head = payload.decode(0, SNIFF_HEAD_SIZE)
+    tail = payload.decode(max(0, size - SNIFF_TAIL_SIZE), size)
+    return sniff_extension(head, tail, size)
+
+@register_sniffer(10)
+def _sniff_pdf(w):
+    if w.header.startswith(b'%PDF-'): return '.pdf'
+
+@register_sniffer(20)
+def _sniff_image(w):
+    header = w.header
+    if header.startswith(b'\xFF\xD8\xFF'): return '.jpg'
+    elif header.startswith(b'\x89PNG\r\n\x1a\n'): return '.png'
+    elif header.startswith((b'GIF87a', b'GIF89a')): return '.gif'
+    elif header.startswith((b'II*\x00', b'MM\x00*')): return '.tif'
+
+def _zip_central_directory_names(w):
+    # Nazwy z katalogu centralnego, jeśli cały mieści się w oknie końcowym
+    eocd = w.tail.rfind(b'PK\x05\x06')
+    if eocd < 0 or len(w.tail) - eocd < 22 or w.size is None:
+        return None
+    cd_size, cd_offset = struct.unpack_from('<II', w.tail, eocd + 12)
+    pos = cd_offset - (w.size - len(w.tail))
+    if pos < 0 or pos + cd_size > eocd:
+        return None
+    names = []
+    while w.tail.startswith(b'PK\x01\x02', pos) and pos + 46 <= eocd:
+        name_len, extra_len, comment_len = struct.unpack_from('<HHH', w.tail, pos + 28)
+        names.append(w.tail[pos + 46:pos + 46 + name_len])
+        pos += 46 + name_len + extra_len + comment_len
+    return names
+
+def _zip_local_names(w):
+    # Rezerwowo: nagłówki lokalne z okna początkowego
+    names = []
+    pos = 0
+    head = w.head
+    while head.startswith(ZIP_LOCAL_MAGIC, pos) and pos + 30 <= len(head):
+        flags, = struct.unpack_from('<H', head, pos + 6)
+        comp_size, = struct.unpack_from('<I', head, pos + 18)
+        name_len, extra_len = struct.unpack_from('<HH', head, pos + 26)
+        names.append(head[pos + 30:pos + 30 + name_len])
+        if flags & 0x08:
+            break  # rozmiar danych dopiero w deskryptorze za danymi
+        pos += 30 + name_len + extra_len + comp_size
+    return names
+
+@register_sniffer(30)
+def _sniff_zip(w):
+    if not w.header.startswith(ZIP_LOCAL_MAGIC):
+        return None
+    # Kontener ASiC (podpis XAdES/CAdES) zaczyna się od nieskompresowanego pliku mimetype
+    if w.head.startswith(b'mimetype', 30):
+        mimetype = w.head[38:38 + 64]
+        if mimetype.startswith(b'application/vnd.etsi.asic-e+zip'): return '.asice'
+        elif mimetype.startswith(b'application/vnd.etsi.asic-s+zip'): return '.asics'
+    names = _zip_central_directory_names(w)
+    if not names:
+        names = _zip_local_names(w)
+    if names:
+        if any(name.startswith(b'word/') for name in names): return '.docx'
+        elif any(name.startswith(b'xl/') for name in names): return '.xlsx'
+        elif any(name.startswith(b'ppt/') for name in names): return '.pptx'
+        else: return '.zip'
+    # Uszkodzony ZIP: jak dawniej tekst albo typ nieznany
+    try:
+        text_sample = w.head[:2048].decode('utf-8')
+        if not text_sample.lstrip().startswith('<?xml'): return '.txt'
+    except UnicodeDecodeError:
+        pass
+    return 'nieznany'
+
+@register_sniffer(40)
+def _sniff_xml(w):
+    if w.header.startswith(b'<'):
+        # Podpis XAdES (przestrzeń nazw ETSI) w pierwszych kilobajtach dokumentu
+        if b'http://uri.etsi.org/01903/' in w.head[:SNIFF_HEAD_SIZE]: return '.xades'
+        return '.xml'
+
+@register_sniffer(50)
+def _sniff_eml(w):
+    sample = w.head[:200]
+    if w.header.startswith(b'From:') or b'\r\nFrom:' in sample or b'\nFrom:' in sample: return '.eml'
+
+def _ole_has_name(w, name):
+    # Nazwy strumieni OLE2 są w UTF-16LE; dawna heurystyka szukała ich w ASCII
+    wide = name.encode('utf-16-le')
+    if wide in w.head or wide in w.tail:
+        return True
+    return name.lower().encode('latin1') in w.head[512:2048].lower()
+
+@register_sniffer(60)
+def _sniff_ole(w):
+    if not w.head.startswith(OLE_MAGIC):
+        return None
+    sample = w.head[:2048].lower()
+    if b'outlook message' in sample or b'microsoft outlook' in sample or _ole_has_name(w, '__substg1.0_'): return '.msg'
+    elif _ole_has_name(w, 'WordDocument'): return '.doc'
+    elif _ole_has_name(w, 'Workbook'): return '.xls'
+    elif _ole_has_name(w, 'PowerPoint Document'): return '.ppt'
+    return '.ole'
+
+# === Załączniki ===
+# Jeden rekord na załącznik: tekst base64 dekodujemy najwyżej raz, a wynik
+# (bajty, typ, rozmiar) współdzielą lista w GUI, zapis i inne wywołania.
+# Duże załączniki są już zdekodowane do pliku tymczasowego (path) i nie
+# trafiają do pamięci.
+
+SAVE_CHUNK_SIZE = 1024 * 1024  # porcja zapisu (bajty)
+
+class Attachment:
+    __slots__ = ("filename", "source", "start", "end", "path", "xml_path", "xml_offsets", "sha256",
+                 "_data", "_ext", "_size", "_expanded")
+
+    # Źródło danych (jedno z czterech):
+    #   source[start:end] - tekst base64 w pamięci (str) albo w pliku zmapowanym
+    #                       do pamięci (mmap, offsety bajtowe; strony czytane na żądanie),
+    #   path              - plik z już zdekodowaną zawartością (zrzut dużego załącznika),
+    #   xml_path          - tekst base64 w pliku XML, start/end to offsety bajtowe
+    #                       (załącznik odtworzony z pamięci podręcznej na dysku),
+    #   data              - gotowe bajty (np. plik z archiwum ZIP lub część wiadomości EML).
+    def __init__(self, filename, source=None, start=0, end=None, path=None, size=None, sha256=None,
+                 xml_path=None, ext=None, data=None):
+        self.filename = filename
+        self.source = source
+        self.start = start
+        self.end = len(source) if end is None and source is not None else end
+        self.path = path
+        self.xml_path = xml_path
+        # (początek znacznika, koniec tekstu) w bajtach pliku źródłowego i liczba znaków tekstu
+        self.xml_offsets = None
+        self.sha256 = sha256  # hex, znany po zapisie na dysk
+        self._data = data
+        self._ext = ext
+        self._size = size
+        self._expanded = None  # (skip_signature_blocks, reguły) -> wynik expand()
+
+    def __repr__(self):
+        if self.path is not None:
+            return f"Attachment({self.filename!r}, plik {self.path!r})"
+        if self.xml_path is not None:
+            return f"Attachment({self.filename!r}, {self.xml_path!r} [{self.start}:{self.end}])"
+        if self.source is None:
+            return f"Attachment({self.filename!r}, {len(self._data)} bajtów)"
+        return f"Attachment({self.filename!r}, {self.end - self.start} znaków base64)"
+
+    def _read_xml(self):
+        with open(self.xml_path, 'rb') as f:
+            f.seek(self.start)
+            return f.read(self.end - self.start)
+
+    def _map_xml(self):
+        # Rozmiar i typ potrzebują tylko próbek, początku i końca tekstu base64 -
+        # z mapy pliku system wczyta same te strony, nie cały ładunek
+        import mmap
+        with open(self.xml_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.end:
+                raise EOFError(f"Plik {self.xml_path} jest krótszy niż w indeksie załączników")
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    @property
+    def b64text(self):
+        if self.xml_path is not None:
+            return self._read_xml().decode('ascii')
+        return self.source[self.start:self.end]
+
+    @property
+    def data(self):
+        if self.path is not None:
+            # celowo bez cache - duży załącznik nie zostaje w pamięci
+            with open(self.path, 'rb') as f:
+                return f.read()
+        if self.xml_path is not None:
+            with span("base64.decode"):
+                return base64.b64decode(self._read_xml())
+        # b64decode pomija białe znaki, więc nie robimy kopii "".join(text.split())
+        if self._data is None:
+            with span("base64.decode"):
+                self._data = base64.b64decode(self.b64text)
+        return self._data
+
+    def open(self):
+        # Plik binarny do czytania; base64 dekodujemy w locie, bez kopii całości w pamięci
+        if self.path is not None:
+            return open(self.path, 'rb')
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return io.BufferedReader(_ChunkReader(self.iter_chunks()))
+
+    def iter_chunks(self, chunk_size=SAVE_CHUNK_SIZE):
+        # Zawartość porcjami, bez dekodowania całego ładunku naraz
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        elif self._data is not None:
+            for pos in range(0, len(self._data), chunk_size):
+                yield self._data[pos:pos + chunk_size]
+        else:
+            pending = None
+            for piece in self._iter_b64_pieces(chunk_size // 3 * 4):
+                piece = piece[:0].join(piece.split())
+                buf = piece if pending is None else pending + piece
+                cut = len(buf) - len(buf) % 4
+                pending = buf[cut:]
+                if cut:
+                    yield binascii.a2b_base64(buf[:cut])
+            if pending:
+                raise binascii.Error("Incorrect padding")
+
+    def _iter_b64_pieces(self, step):
+        # Tekst base64 porcjami: str z pamięci albo bajty wprost z pliku XML
+        if self.xml_path is not None:
+            with open(self.xml_path, 'rb') as f:
+                f.seek(self.start)
+                left = self.end - self.start
+                while left > 0:
+                    piece = f.read(min(step, left))
+                    if not piece:
+                        raise EOFError(f"Plik {self.xml_path} jest krótszy niż w indeksie załączników")
+                    left -= len(piece)
+                    yield piece
+        else:
+            for pos in range(self.start, self.end, step):
+                yield self.source[pos:min(pos + step, self.end)]
+
+    @property
+    def size(self):
+        if self._size is None:
+            if self.path is not None:
+                self._size = os.path.getsize(self.path)
+            elif self._data is not None:
+                self._size = len(self._data)
+            elif self.xml_path is not None:
+                with self._map_xml() as mapping:
+                    self._size = Base64Span(mapping, self.start, self.end).size
+            else:
+                self._size = Base64Span(self.source, self.start, self.end).size
+        return self._size
+
+    @property
+    def ext(self):
+        if self._ext is None:
+            if self.path is not None:
+                self._ext = guess_extension_from_file(self.path)
+            elif self._data is not None:
+                self._ext = guess_extension_from_bytes(self._data)
+            elif self.xml_path is not None:
+                with self._map_xml() as mapping:
+                    self._ext = guess_extension_from_base64(mapping, self.start, self.end)
+            else:
+                self._ext = guess_extension_from_base64(self.source, self.start, self.end)
+        return self._ext
+
+    @instrumented("attachment.save")
+    def save(self, path, move=False, progress=None, cancel_event=None):
+        # Zapis strumieniowy z SHA-256 liczonym w locie; zwraca skrót (hex)
+        import hashlib
+        if self.path is not None and move and self.sha256 is not None:
+            import shutil
+            # po przeniesieniu rekord wskazuje zapisany plik
+            self.path = shutil.move(self.path, path)
+            if progress:
+                progress(self.size)
+            return self.sha256
+        digest = hashlib.sha256()
+        try:
+            with open(path, 'wb') as f:
+                for chunk in self.iter_chunks():
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise SaveCancelled("Anulowano zapis")
+                    f.write(chunk)
+                    digest.update(chunk)
+                    if progress:
+                        progress(len(chunk))
+        except BaseException:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        self.sha256 = digest.hexdigest()
+        if move and self.path is not None:
+            self._remove_spill()
+            self.path = path
+        return self.sha256
+
+    @property
+    def expandable(self):
+        try:
+            return self.ext in _EXPANDERS
+        except Exception:
+            return False
+
+    def expand(self, skip_signature_blocks=False, skip_rules=None):
+        # Zawartość załącznika-kontenera jako (TextRecords, załączniki, raport pomijania);
+        # wynik zapamiętujemy, a załączniki dzieci można rozwijać dalej
+        key = (bool(skip_signature_blocks), SkipRules(skip_rules or ()).key())
+        if self._expanded is None:
+            self._expanded = {}
+        result = self._expanded.get(key)
+        if result is None:
+            expander = _EXPANDERS.get(self.ext)
+            if expander is None:
+                raise ValueError(f"Załącznika {self.filename} ({self.ext}) nie da się rozwinąć")
+            report = {}
+            with span("attachment.expand"):
+                records, attachments = expander(self, skip_signature_blocks, skip_rules, report)
+            result = self._expanded[key] = (records, attachments, report)
+        return result
+
+    def expanded(self, skip_signature_blocks=False, skip_rules=None):
+        # Wynik wcześniejszego expand() albo None - bez parsowania
+        key = (bool(skip_signature_blocks), SkipRules(skip_rules or ()).key())
+        return self._expanded.get(key) if self._expanded else None
+
+    def _remove_spill(self):
+        if self.path is not None and os.path.basename(self.path).startswith(SPILL_PREFIX):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def discard(self):
+        # Usuwa pliki tymczasowe (także rozwiniętych dzieci); zapisanych plików nie ruszamy
+        self._remove_spill()
+        if self._expanded:
+            for _, attachments, _ in self._expanded.values():
+                for child in attachments:
+                    child.discard()
+            self._expanded = None
+
+class _ChunkReader(io.RawIOBase):
+    # Strumień bajtów z generatora porcji (np. base64 dekodowanego w locie)
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+# Przyrostowy dekoder base64 zapisujący wynik od razu do pliku tymczasowego.
+
+SPILL_THRESHOLD = 8 * 1024 * 1024  # znaków base64
+SPILL_PREFIX = "xmlreader_zal_"
+
+class _Base64Spool:
+    def __init__(self, directory=None):
+        import hashlib
+        import tempfile
+        self.file = tempfile.NamedTemporaryFile(prefix=SPILL_PREFIX, suffix=".bin", dir=directory, delete=False)
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.failed = False
+        self._pending = ""
+        self._tail = ""
+
+    def feed(self, text):
+        self._tail = (self._tail + text)[-B64_TAIL_SAMPLE:]
+        buf = self._pending + "".join(text.split())
+        cut = len(buf) - len(buf) % 4
+        self._pending = buf[cut:]
+        if cut and not self.failed:
+            try:
+                data = binascii.a2b_base64(buf[:cut])
+            except binascii.Error:
+                self.failed = True
+                return
+            self.file.write(data)
+            self.digest.update(data)
+            self.size += len(data)
+
+    def finish(self):
+        # Te same warunki co is_base64_string: poprawna końcówka i pełne czwórki
+        self.file.close()
+        tail = "".join(self._tail.split())
+        if self._pending or not _B64_TAIL_RE.fullmatch(tail):
+            self.failed = True
+        return self.file.name
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.file.name)
+
+# === Zapis załączników ===
+# Pliki zapisujemy równolegle w puli wątków (dekodowanie, SHA-256 i zapis porcjami
+# zwalniają GIL na dużych blokach). Błąd jednego pliku nie przerywa pozostałych -
+# wynikiem jest zestawienie dla każdego pliku osobno.
+
+SAVE_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+CHECKSUM_FILENAME = "sumy_kontrolne.sha256"
+
+class SaveCancelled(Exception):
+    pass
+
+def unique_path(folder, filename, used):
+    # Nazwy z XML nie mogą wyjść poza folder ani nadpisać się nawzajem
+    filename = os.path.basename(filename.replace('\\', '/')) or "zalacznik"
+    stem, ext = os.path.splitext(filename)
+    candidate = filename
+    n = 2
+    while candidate.lower() in used:
+        candidate = f"{stem}_{n}{ext}"
+        n += 1
+    used.add(candidate.lower())
+    return os.path.join(folder, candidate)
+
+@instrumented("save.attachments")
+def save_all_attachments(attachments, folder, move=False, workers=SAVE_WORKERS, progress=None, cancel_event=None):
+    # progress(zapisane_bajty, wszystkie_bajty, gotowe_pliki) - wołane z wątków roboczych
+    used = {CHECKSUM_FILENAME}
+    tasks = [(attachment, unique_path(folder, attachment.filename, used)) for attachment in attachments]
+    results = [None] * len(tasks)
+    total = 0
+    for attachment, _ in tasks:
+        try:
+            total += attachment.size
+        except Exception:
+            pass
+    lock = threading.Lock()
+    state = [0, 0]  # bajty, pliki
+
+    def advance(nbytes=0, files=0):
+        with lock:
+            state[0] += nbytes
+            state[1] += files
+            done = tuple(state)
+        if progress:
+            progress(done[0], total, done[1])
+
+    def save_one(i):
+        attachment, path = tasks[i]
+        result = {"filename": attachment.filename, "path": path, "size": None, "sha256": None, "error": None}
+        try:
+            if cancel_event is not None and cancel_event.is_set():
+                raise SaveCancelled("Anulowano zapis")
+            result["sha256"] = attachment.save(path, move=move, progress=advance, cancel_event=cancel_event)
+            result["size"] = os.path.getsize(path)
+        except Exception as e:
+            result["error"] = str(e) if isinstance(e, SaveCancelled) else f"{type(e).__name__}: {e}"
+        results[i] = result
+        advance(files=1)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(save_one, range(len(tasks))))
+    return results
+
+def write_checksums(folder, results):
+    # Format zgodny z sha256sum -c
+    saved = [r for r in results if not r["error"]]
+    if not saved:
+        return None
+    path = os.path.join(folder, CHECKSUM_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        for r in saved:
+            f.write(f"{r['sha256']}  {os.path.basename(r['path'])}\n")
+    return path
+
+# === Rekordy tekstu ===
+# Ekstrakcja zapisuje kolumny (głębokość, rodzaj, tag, tekst) zamiast gotowych
+# linii; formatowanie odbywa się dopiero w rendererach. TextRecords zachowuje się
+# jak sekwencja linii (len, indeks, wycinek, iteracja), więc widok tekstowy,
+# HTML i eksport korzystają z jednego przebiegu ekstrakcji.
+
+KIND_HEADING = 0  # "## tekst" (element Informacja)
+KIND_FIELD = 1  # "tag: tekst"
+KIND_TEXT = 2  # "tekst" (tekst zawiera już dwukropek)
+KIND_ATTACHMENT = 3  # "tag:" nad nazwą załącznika
+KIND_ATTACHMENT_NAME = 4  # "  Nazwa załącznika: plik"
+
+_INDENTS = ["  " * depth for depth in range(64)]
+
+def _indent(depth):
+    return _INDENTS[depth] if depth < len(_INDENTS) else "  " * depth
+
+def format_record(depth, kind, tag, text):
+    indent = _indent(depth)
+    if kind == KIND_FIELD:
+        return f"{indent}{tag}: {text}"
+    elif kind == KIND_TEXT:
+        return f"{indent}{text}"
+    elif kind == KIND_HEADING:
+        return f"{indent}## {text}"
+    elif kind == KIND_ATTACHMENT:
+        return f"{indent}{tag}:"
+    return f"{indent}  Nazwa załącznika: {text}"
+
+class TextRecords:
+    __slots__ = ("depths", "kinds", "tags", "texts")
+
+    def __init__(self):
+        self.depths = array('H')
+        self.kinds = array('B')
+        self.tags = []
+        self.texts = []
+
+    def append(self, depth, kind, tag, text):
+        self.depths.append(depth)
+        self.kinds.append(kind)
+        self.tags.append(tag)
+        self.texts.append(text)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def record(self, i):
+        return self.depths[i], self.kinds[i], self.tags[i], self.texts[i]
+
+    def iter_records(self):
+        return zip(self.depths, self.kinds, self.tags, self.texts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [format_record(*rec) for rec in zip(self.depths[i], self.kinds[i], self.tags[i], self.texts[i])]
+        return format_record(self.depths[i], self.kinds[i], self.tags[i], self.texts[i])
+
+    def __iter__(self):
+        for rec in self.iter_records():
+            yield format_record(*rec)
+
+# === Reguły pomijania ===
+# Poddrzewa pasujące do reguły odrzucamy już podczas parsowania. Reguła to:
+#   "Tag" albo "prefiks:Tag"   - element o tej nazwie w dowolnej przestrzeni nazw
+#   "{uri}"                    - każdy element z przestrzeni nazw uri
+#   "{uri}Tag"                 - nazwa w konkretnej przestrzeni nazw
+#   "Rodzic/Tag", "/Korzeń/Tag" - ścieżka nazw (końcówka ścieżki albo od korzenia, "*" = dowolny)
+
+SIGNATURE_BLOCK_TAGS = ("SignatureValue", "X509Certificate")
+XMLDSIG_NAMESPACE = "http://www.w3.org/2000/09/xmldsig#"
+
+class SkipRule:
+    __slots__ = ("text", "namespace", "tag", "path", "absolute")
+
+    def __init__(self, text):
+        self.text = text = text.strip()
+        self.namespace = self.tag = self.path = None
+        self.absolute = False
+        if text.startswith("{") and "}" in text:
+            self.namespace, _, tag = text[1:].partition("}")
+            self.tag = tag or None
+        elif "/" in text:
+            self.absolute = text.startswith("/")
+            self.path = tuple(strip_ns(part) for part in text.strip("/").split("/"))
+            if not all(self.path):
+                raise ValueError(f"Pusta część ścieżki w regule pomijania: {text!r}")
+        else:
+            self.tag = text.rpartition(":")[2]
+        if not (self.namespace or self.tag or self.path):
+            raise ValueError(f"Pusta reguła pomijania: {text!r}")
+
+    def __repr__(self):
+        return f"SkipRule({self.text!r})"
+
+    def matches_path(self, ancestors, tag):
+        # ancestors: nazwy elementów nad bieżącym (bez przestrzeni nazw)
+        n = len(self.path)
+        if len(ancestors) + 1 < n or self.absolute and len(ancestors) + 1 != n:
+            return False
+        if self.path[-1] not in ("*", tag):
+            return False
+        tail = ancestors[len(ancestors) - n + 1:] if n > 1 else ()
+        return all(want in ("*", have) for want, have in zip(self.path, tail))
+
+class SkipRules:
+    # Zestaw reguł ze słownikami do sprawdzania nazwy i przestrzeni nazw w O(1);
+    # tylko reguły ścieżkowe sprawdzamy po kolei
+    def __init__(self, rules=()):
+        self.rules = []
+        self._by_tag = {}
+        self._by_namespace = {}
+        self._by_qualified = {}
+        self._paths = []
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        if isinstance(rule, str):
+            rule = SkipRule(rule)
+        if any(existing.text == rule.text for existing in self.rules):
+            return
+        self.rules.append(rule)
+        if rule.path is not None:
+            self._paths.append(rule)
+        elif rule.namespace is not None and rule.tag is not None:
+            self._by_qualified.setdefault((rule.namespace, rule.tag), rule)
+        elif rule.namespace is not None:
+            self._by_namespace.setdefault(rule.namespace, rule)
+        else:
+            self._by_tag.setdefault(rule.tag, rule)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    @property
+    def uses_namespaces(self):
+        return bool(self._by_namespace or self._by_qualified)
+
+    @property
+    def uses_paths(self):
+        return bool(self._paths)
+
+    def match(self, namespace, tag, ancestors=()):
+        # Pierwsza pasująca reguła albo None
+        rule = self._by_tag.get(tag)
+        if rule is None and namespace:
+            rule = self._by_qualified.get((namespace, tag)) or self._by_namespace.get(namespace)
+        if rule is None:
+            for candidate in self._paths:
+                if candidate.matches_path(ancestors, tag):
+                    return candidate
+        return rule
+
+    def key(self):
+        # Stały opis zestawu (np. do klucza pamięci podręcznej)
+        return "\n".join(sorted(rule.text for rule in self.rules))
+
+def parse_skip_rules(spec):
+    # "Signature, {uri}, Faktura/Podpis" (przecinki lub nowe linie) albo lista tekstów
+    if isinstance(spec, str):
+        spec = spec.replace("\n", ",").split(",")
+    return [SkipRule(text) for text in spec if text.strip()]
+
+def format_skip_report(report):
+    # "Signature: 2× 14.1 KB, Uwagi: 1× 120 B" - do paska stanu i raportu wsadowego
+    parts = []
+    for text, (subtrees, size) in report.items():
+        if size >= 1024 * 1024:
+            amount = f"{size / 1048576:.1f} MB"
+        elif size >= 1024:
+            amount = f"{size / 1024:.1f} KB"
+        else:
+            amount = f"{size} B"
+        parts.append(f"{text}: {subtrees}× {amount}")
+    return ", ".join(parts)
+
+def _build_skip_rules(skip_signature_blocks, skip_rules):
+    rules = SkipRules(SIGNATURE_BLOCK_TAGS if skip_signature_blocks else ())
+    for rule in skip_rules or ():
+        rules.add(rule)
+    return rules
+
+def _split_qualified(name):
+    # "{uri}tag" (ElementTree) albo "uri}tag" (expat) -> ("uri", "tag")
+    namespace, sep, _ = name.lstrip("{").rpartition("}")
+    return namespace if sep else "", strip_ns(name)
+
+# === Kluczowa funkcja ===
+
+def _append_attachment_records(records, attachments, tag, depth, attachment):
+    if not os.path.splitext(attachment.filename)[1]:
+        try:
+            attachment.filename += attachment.ext
+        except Exception:
+            attachment.filename += '.bin'
+
+    attachments.append(attachment)
+    records.append(depth, KIND_ATTACHMENT, tag, None)
+    records.append(depth, KIND_ATTACHMENT_NAME, tag, attachment.filename)
+
+def _default_attachment_name(filename, attachments):
+    return filename or f"zalacznik_{len(attachments) + 1}"
+
+def _append_element_records(records, attachments, tag, text, depth, filename):
+    if is_base64_string(text):
+        attachment = Attachment(_default_attachment_name(filename, attachments), text)
+        _append_attachment_records(records, attachments, tag, depth, attachment)
+
+    elif tag == "Informacja":
+        records.append(depth, KIND_HEADING, tag, text)
+    elif ':' in text:
+        records.append(depth, KIND_TEXT, tag, text)
+    else:
+        records.append(depth, KIND_FIELD, tag, text)
+
+@instrumented("extract.tree")
+def extract_all_text_elements(root, skip_signature_blocks=False, skip_rules=None):
+    attachments = []
+    records = TextRecords()
+    rules = _build_skip_rules(skip_signature_blocks, skip_rules)
+    ancestors = []
+    tags = {}  # pełna nazwa -> internowany tag bez przestrzeni nazw
+
+    def recurse(elem, depth=0, parent_filename=None):
+        # każdy odczyt tag/attrib/text z lxml tworzy nowy obiekt, więc czytamy je raz
+        name = elem.tag
+        if not isinstance(name, str):
+            return  # komentarz lub instrukcja przetwarzania (drzewo z lxml)
+        tag = tags.get(name)
+        if tag is None:
+            tag = tags[name] = sys.intern(strip_ns(name))
+        if rules and rules.match(_split_qualified(name)[0], tag, ancestors) is not None:
+            return  # pomijamy cały ten blok
+
+        text = (elem.text or "").strip()
+
+        # Sprawdź atrybut nazwaPliku w elemencie (np. str:Zalacznik)
+        attrib = elem.attrib
+        filename = attrib.get("nazwaPliku") or attrib.get("Nazwa") or parent_filename
+
+        if text:
+            _append_element_records(records, attachments, tag, text, depth, filename)
+
+        ancestors.append(tag)
+        for child in elem:
+            recurse(child, depth + 1, filename)
+        ancestors.pop()
+
+    recurse(root)
+    return records, attachments
+
+# === Wersja strumieniowa ===
+# Parser expat karmiony kawałkami pliku: nie budujemy drzewa, na stosie trzymamy
+# tylko otwarte elementy, więc pamięć zależy od głębokości zagnieżdżenia,
+# a nie od rozmiaru dokumentu.
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+# W trybie mapowanym (mapped=True) plik jest zmapowany do pamięci (mmap), a tekst
+# base64 nie jest zbierany: załącznik to offsety w mapie, z której dekodujemy
+# i zapisujemy dopiero na żądanie. Tekst z encjami lub CDATA odtwarzamy
+# osobnym parserem i przetwarzamy zwykłą drogą.
+_MAPPED = object()  # znacznik wpisu, którego tekst przeczytamy z mapy
+
+class ExtractionCancelled(Exception):
+    pass
+
+class _StreamingExtractor:
+    def __init__(self, skip_signature_blocks=False, spill_threshold=SPILL_THRESHOLD, spill_dir=None, skip_rules=None):
+        self.skip_rules = _build_skip_rules(skip_signature_blocks, skip_rules)
+        self.skip_report = {}  # tekst reguły -> [liczba poddrzew, bajty]
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.records = TextRecords()
+        self.attachments = []
+        self._tags = {}  # pełna nazwa z expat -> internowany tag bez przestrzeni nazw
+        # Każdy wpis: [tag, filename, kawałki tekstu / _Base64Spool / None po pierwszym dziecku,
+        #              liczba zebranych znaków albo None, gdy tekst nie nadaje się do zrzutu,
+        #              offset bajtowy znacznika otwierającego, liczba znaków tekstu z parsera]
+        self._stack = []
+        self._skip_depth = 0
+        self._skip_rule = None
+        self._skip_start = 0
+        self.parser = None  # ustawiany przez _create_expat_parser; daje offsety bajtowe
+        self.mapping = None  # mmap pliku w trybie mapowanym
+        self.encoding = None  # z deklaracji XML, dla ponownego parsowania wycinków mapy
+
+    def _flush(self, entry):
+        # Tekst elementu jest kompletny przy pierwszym dziecku albo przy zamknięciu
+        chunks = entry[2]
+        if chunks is _MAPPED:
+            chunks = self._flush_mapped(entry)
+            if chunks is None:
+                return
+        entry[2] = None
+        depth = len(self._stack) - 1
+        count = len(self.attachments)
+        if isinstance(chunks, _Base64Spool):
+            path = chunks.finish()
+            attachment = Attachment(_default_attachment_name(entry[1], self.attachments),
+                                    path=path, size=chunks.size,
+                                    sha256=None if chunks.failed else chunks.digest.hexdigest())
+            if chunks.failed and not os.path.splitext(attachment.filename)[1]:
+                attachment.filename += '.bin'
+            _append_attachment_records(self.records, self.attachments, entry[0], depth, attachment)
+        elif chunks:
+            text = "".join(chunks).strip()
+            if text:
+                _append_element_records(self.records, self.attachments, entry[0], text, depth, entry[1])
+        if len(self.attachments) > count and entry[4] >= 0:
+            # tekst kończy się tam, gdzie zaczyna się pierwsze dziecko albo znacznik zamykający
+            self.attachments[-1].xml_offsets = (entry[4], self.parser.CurrentByteIndex, entry[5])
+
+    def _flush_mapped(self, entry):
+        # Załącznik wprost z mapy albo (gdy bajty nie są czystym base64) odtworzone kawałki tekstu
+        entry[2] = None
+        text_end = self.parser.CurrentByteIndex
+        payload = _mapped_base64(self.mapping, entry[4], text_end, entry[5])
+        if payload is not None:
+            attachment = Attachment(_default_attachment_name(entry[1], self.attachments), self.mapping,
+                                    payload.start, payload.end, size=payload.size)
+            attachment.xml_offsets = (entry[4], text_end, entry[5])
+            _append_attachment_records(self.records, self.attachments, entry[0], len(self._stack) - 1, attachment)
+            return None
+        entry[2], entry[3] = [], 0
+        for text in _reparse_text(self.mapping, entry[4], text_end, self.encoding):
+            self._collect(entry, text)
+        return entry[2]
+
+    def _maybe_map(self, entry):
+        text = "".join(entry[2]).lstrip()
+        if len(text) <= B64_PREFIX_LEN:
+            entry[2], entry[3] = [text], len(text)
+        elif _B64_PREFIX_RE.match(text):
+            entry[2] = _MAPPED
+        else:
+            entry[2], entry[3] = [text], None
+
+    def _maybe_spill(self, entry):
+        text = "".join(entry[2]).lstrip()
+        if not _B64_PREFIX_RE.match(text):
+            entry[2] = [text]
+            entry[3] = None
+            return
+        spool = _Base64Spool(self.spill_dir)
+        try:
+            spool.feed(text)
+        except BaseException:
+            spool.abort()
+            raise
+        entry[2] = spool
+
+    def close(self):
+        # Sprzątanie po przerwanym parsowaniu
+        for entry in self._stack:
+            if isinstance(entry[2], _Base64Spool):
+                entry[2].abort()
+        self._stack = []
+
+    def start(self, tag, attrib):
+        if self._skip_depth:
+            self._skip_depth += 1
+            return
+        name = tag
+        tag = self._tags.get(name)
+        if tag is None:
+            tag = self._tags[name] = sys.intern(strip_ns(name))
+        parent_filename = None
+        if self._stack:
+            # tekst rodzica kończy się na dziecku, także pomijanym - dalej jest już "tail"
+            parent = self._stack[-1]
+            if parent[2] is not None:
+                self._flush(parent)
+            parent_filename = parent[1]
+        if self.skip_rules:
+            rule = self.skip_rules.match(
+                _split_qualified(name)[0] if self.skip_rules.uses_namespaces else "", tag,
+                [entry[0] for entry in self._stack] if self.skip_rules.uses_paths else ())
+            if rule is not None:
+                self._skip_depth = 1  # pomijamy cały ten blok
+                self._skip_rule = rule
+                self._skip_start = self.parser.CurrentByteIndex if self.parser is not None else 0
+                return
+        filename = attrib.get("nazwaPliku") or attrib.get("Nazwa") or parent_filename
+        offset = self.parser.CurrentByteIndex if self.parser is not None else -1
+        self._stack.append([tag, filename, [], 0, offset, 0])
+
+    def xml_decl(self, version, encoding, standalone):
+        self.encoding = encoding
+
+    def data(self, text):
+        if self._skip_depth or not self._stack:
+            return
+        entry = self._stack[-1]
+        entry[5] += len(text)
+        if entry[2] is not _MAPPED:  # tekst z mapy przeczytamy przy zamknięciu
+            self._collect(entry, text, self.mapping is not None)
+
+    def _collect(self, entry, text, mapped=False):
+        chunks = entry[2]
+        if chunks is None:  # tekst po dziecku to "tail", pomijamy jak w wersji drzewiastej
+            return
+        if isinstance(chunks, _Base64Spool):
+            chunks.feed(text)
+            return
+        chunks.append(text)
+        if entry[3] is not None:
+            entry[3] += len(text)
+            if mapped:
+                if entry[3] > B64_PREFIX_LEN:
+                    self._maybe_map(entry)
+            elif self.spill_threshold is not None and entry[3] > self.spill_threshold:
+                self._maybe_spill(entry)
+
+    def end(self, tag):
+        if self._skip_depth:
+            self._skip_depth -= 1
+            if not self._skip_depth:
+                # bajty od znacznika otwierającego do początku zamykającego
+                stats = self.skip_report.setdefault(self._skip_rule.text, [0, 0])
+                stats[0] += 1
+                if self.parser is not None:
+                    stats[1] += self.parser.CurrentByteIndex - self._skip_start
+            return
+        entry = self._stack[-1]
+        if entry[2] is not None:
+            self._flush(entry)
+        self._stack.pop()
+
+def _create_expat_parser(extractor):
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.buffer_size = STREAM_CHUNK_SIZE
+    parser.StartElementHandler = extractor.start
+    parser.EndElementHandler = extractor.end
+    parser.CharacterDataHandler = extractor.data
+    parser.XmlDeclHandler = extractor.xml_decl
+    extractor.parser = parser
+    return parser
+
+_XML_DECL_ENCODING_RE = re.compile(rb'<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+_ASCII_PROBE = "<>&;=+/09AZaz \n"
+
+def _ascii_compatible(head):
+    # Czy znaki ASCII (base64, znaczniki) zajmują w pliku po jednym bajcie, jak w ASCII.
+    # head: początek pliku. UTF-16/32 poznajemy po BOM albo zerach (bez BOM),
+    # resztę po kodowaniu z deklaracji XML (np. EBCDIC odpada).
+    import codecs
+    if head[:2] in (b'\xff\xfe', b'\xfe\xff') or b'\x00' in head[:4]:
+        return False
+    m = _XML_DECL_ENCODING_RE.match(head)
+    if m is None:
+        return True  # UTF-8 albo BOM UTF-8
+    try:
+        codec = codecs.lookup(m.group(1).decode('ascii'))
+    except LookupError:
+        return False
+    try:
+        return codec.encode(_ASCII_PROBE)[0] == _ASCII_PROBE.encode('ascii')
+    except UnicodeError:
+        return False
+
+def _map_file(f):
+    # mmap tylko do odczytu albo None (pusty plik, strumień bez deskryptora, kodowanie
+    # niezgodne z ASCII - np. UTF-16 - w którym offsety bajtowe nie wskazują tekstu base64)
+    import mmap
+    try:
+        if f.tell():
+            return None
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+    if not _ascii_compatible(mapping[:512].lstrip(b'\xef\xbb\xbf')):
+        mapping.close()
+        return None
+    return mapping
+
+def _iter_mapped(mapping, start, end, chunk_size):
+    # Widoki fragmentów mapy bez kopiowania; każdy zwalniamy, zanim podamy następny
+    with memoryview(mapping) as view:
+        for pos in range(start, end, chunk_size):
+            with view[pos:min(pos + chunk_size, end)] as chunk:
+                yield chunk
+
+def _mapped_base64(mapping, tag_start, text_end, chars=None):
+    # Base64Span na surowych bajtach tekstu elementu albo None, gdy to nie czysty base64
+    text_range = _text_byte_range(mapping, tag_start, text_end, chars)
+    if text_range is None:
+        return None
+    payload = Base64Span(mapping, *text_range)
+    if (payload.end - payload.start <= B64_PREFIX_LEN or payload.chars % 4
+            or not _B64_TAIL_RE.fullmatch(payload.tail)):
+        return None
+    return payload
+
+def _reparse_text(mapping, tag_start, text_end, encoding=None):
+    # Tekst elementu z mapy (z encjami, CDATA) kawałkami; osobny parser bez przestrzeni
+    # nazw, bo prefiksy w znaczniku otwierającym mogą być zadeklarowane wyżej
+    parser = expat.ParserCreate(encoding)
+    parser.buffer_text = True
+    parser.buffer_size = STREAM_CHUNK_SIZE
+    names = []
+    pieces = []
+    parser.StartElementHandler = lambda name, attrib: names.append(name)
+    parser.CharacterDataHandler = pieces.append
+    for chunk in _iter_mapped(mapping, tag_start, text_end, STREAM_CHUNK_SIZE):
+        parser.Parse(chunk, False)
+        yield from pieces
+        pieces.clear()
+    parser.Parse(f"</{names[0]}>".encode(encoding or "utf-8"), True)
+    yield from pieces
+
+@instrumented("extract.stream")
+def extract_text_elements_streaming(source, skip_signature_blocks=False, chunk_size=STREAM_CHUNK_SIZE,
+                                    spill_threshold=SPILL_THRESHOLD, spill_dir=None,
+                                    progress=None, cancel_event=None, skip_rules=None, skip_report=None,
+                                    mapped=False, backend=None, hasher=None):
+    # source: ścieżka albo plik otwarty w trybie binarnym.
+    # Załączniki dłuższe niż spill_threshold znaków trafiają zdekodowane do plików
+    # tymczasowych w spill_dir (None wyłącza zrzut); zwolnij je przez Attachment.discard().
+    # Zwraca (TextRecords, lista Attachment).
+    # progress(bajty_przeczytane, rozmiar_pliku_lub_None, records) jest wołane po każdym
+    # kawałku; ustawienie cancel_event przerywa pracę wyjątkiem ExtractionCancelled.
+    # skip_rules (SkipRule lub teksty reguł) odrzucają poddrzewa już przy parsowaniu;
+    # do słownika skip_report trafia: tekst reguły -> [liczba poddrzew, pominięte bajty].
+    # mapped=True mapuje plik do pamięci: załączniki base64 wskazują wtedy fragmenty mapy
+    # (bez kopii tekstu i bez plików tymczasowych), a mapa żyje tak długo jak one.
+    # backend: nazwa backendu parsera (None = XMLREADER_PARSER albo "auto").
+    # hasher (np. hashlib.sha256()) dostaje każdy przeczytany kawałek - skrót pliku bez
+    # osobnego czytania.
+    backend = get_parser_backend(backend, offsets=mapped, stream=True)
+    extractor = _StreamingExtractor(skip_signature_blocks, spill_threshold, spill_dir, skip_rules)
+    feed, finish = backend.stream(extractor)
+    stage = "parse." + backend.name
+    f = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    mapping = None
+    try:
+        if mapped:
+            mapping = extractor.mapping = _map_file(f)
+        if mapping is not None:
+            total = len(mapping)
+            chunks = _iter_mapped(mapping, 0, total, chunk_size)
+        else:
+            try:
+                total = os.fstat(f.fileno()).st_size
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                total = None
+            chunks = iter(functools.partial(f.read, chunk_size), b"")
+        bytes_read = 0
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ExtractionCancelled()
+            with span(stage):
+                feed(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            bytes_read += len(chunk)
+            if progress is not None:
+                progress(bytes_read, total, extractor.records)
+        with span(stage):
+            finish()
+    except BaseException:
+        extractor.close()
+        for attachment in extractor.attachments:
+            attachment.discard()
+        raise  # mapę zwolni odśmiecanie, gdy zniknie traceback
+    finally:
+        extractor.parser = extractor.mapping = None
+        if f is not source:
+            f.close()
+    if mapping is not None and not any(attachment.source is mapping for attachment in extractor.attachments):
+        mapping.close()
+    if skip_report is not None:
+        skip_report.update(extractor.skip_report)
+    return extractor.records, extractor.attachments
+
+# === Backend parsera ===
+# Drzewo (parse_xml_tree) i strumień (extract_text_elements_streaming) parsuje
+# wybrany backend: "expat" z biblioteki standardowej albo "lxml", jeśli jest
+# zainstalowany (huge_tree - bez limitu 10 MB na węzeł tekstowy). "auto" (domyślnie,
+# chyba że ustawiono XMLREADER_PARSER) bierze pierwszy dostępny: drzewo szybciej
+# buduje lxml, a strumień szybciej idzie z expat, bo lxml woła cel parsera przez
+# dodatkową warstwę. Offsety bajtowe elementów (tryb mapowany, pamięć podręczna)
+# daje tylko expat, więc tam, gdzie są potrzebne, zastępuje on backend bez nich.
+# Oba backendy muszą dawać identyczny wynik: sprawdza to "xmlreader_bench.py parser".
+
+PARSER_AUTO_ORDER = ("lxml", "expat")
+STREAM_AUTO_ORDER = ("expat", "lxml")
+
+_PARSER_BACKENDS = {}
+_PARSER_INSTANCES = {}  # nazwa -> backend albo None, gdy moduł się nie importuje
+
+def register_parser_backend(name):
+    def decorator(cls):
+        _PARSER_BACKENDS[name] = cls
+        return cls
+    return decorator
+
+def _parser_backend(name):
+    if name not in _PARSER_INSTANCES:
+        try:
+            _PARSER_INSTANCES[name] = _PARSER_BACKENDS[name]()
+        except ImportError:
+            _PARSER_INSTANCES[name] = None
+    return _PARSER_INSTANCES[name]
+
+def available_parser_backends():
+    return [name for name in _PARSER_BACKENDS if _parser_backend(name) is not None]
+
+def get_parser_backend(name=None, offsets=False, stream=False):
+    # offsets=True: backend musi podawać offsety bajtowe elementów
+    name = name or os.environ.get("XMLREADER_PARSER") or "auto"
+    if name == "auto":
+        order = STREAM_AUTO_ORDER if stream else PARSER_AUTO_ORDER
+        backend = next(filter(None, map(_parser_backend, order)))
+    elif name in _PARSER_BACKENDS:
+        backend = _parser_backend(name)
+        if backend is None:
+            raise ValueError(f"Backend parsera {name} nie jest dostępny (brak modułu)")
+    else:
+        raise ValueError(f"Nieznany backend parsera: {name}")
+    if offsets and not backend.offsets:
+        return _parser_backend("expat")
+    return backend
+
+def parse_xml_tree(source, backend=None):
+    # Korzeń drzewa dokumentu (bez komentarzy i instrukcji przetwarzania)
+    return get_parser_backend(backend).parse_tree(source)
+
+@register_parser_backend("expat")
+class ExpatBackend:
+    name = "expat"
+    offsets = True
+
+    def parse_tree(self, source):
+        import xml.etree.ElementTree as ET
+        return ET.parse(source).getroot()
+
+    def stream(self, extractor):
+        # (feed(kawałek), finish()) wywołujące extractor.start / data / end
+        parser = _create_expat_parser(extractor)
+        return parser.Parse, lambda: parser.Parse(b"", True)
+
+@register_parser_backend("lxml")
+class LxmlBackend:
+    name = "lxml"
+    offsets = False
+
+    def __init__(self):
+        from lxml import etree
+        self.etree = etree
+        # encje tylko z wewnętrznego DTD, jak w expat; bez plików zewnętrznych i sieci
+        entities = "internal" if etree.LXML_VERSION >= (5,) else False
+        self.options = {"huge_tree": True, "resolve_entities": entities, "load_dtd": False, "no_network": True}
+
+    def parse_tree(self, source):
+        parser = self.etree.XMLParser(remove_comments=True, remove_pis=True, **self.options)
+        return self.etree.parse(source, parser).getroot()
+
+    def stream(self, extractor):
+        parser = self.etree.XMLParser(target=_LxmlTarget(extractor), **self.options)
+        return parser.feed, parser.close
+
+class _LxmlTarget:
+    # Cel parsera lxml: te same wywołania co z expat, tylko bez offsetów bajtowych
+    def __init__(self, extractor):
+        self.start = extractor.start
+        self.end = extractor.end
+        self.data = extractor.data
+
+    def close(self):
+        return None
+
+# === Załączniki zagnieżdżone ===
+# Załącznik, który sam jest dokumentem XML (także podpisem XAdES), archiwum ZIP
+# (także kontenerem podpisu ASiC-E / ASiC-S) albo wiadomością EML,
+# rozwijamy do (TextRecords, załączniki) dopiero na żądanie (Attachment.expand).
+# XML przechodzi przez tę samą ekstrakcję strumieniową co dokument główny.
+# Nowe typy dodaje się dekoratorem @register_expander(rozszerzenie).
+
+_EXPANDERS = {}
+
+def register_expander(*extensions):
+    def decorator(func):
+        for ext in extensions:
+            _EXPANDERS[ext] = func
+        return func
+    return decorator
+
+@register_expander('.xml', '.xades')
+def _expand_xml(attachment, skip_signature_blocks, skip_rules, report):
+    with attachment.open() as f:
+        return extract_text_elements_streaming(f, skip_signature_blocks, skip_rules=skip_rules, skip_report=report)
+
+def _member_attachment(filename, size, open_member):
+    # Małe pliki trzymamy w pamięci, duże od razu w pliku tymczasowym
+    if size <= SPILL_THRESHOLD // 4 * 3:
+        with open_member() as f:
+            return Attachment(filename, data=f.read())
+    import shutil
+    import tempfile
+    with open_member() as src, tempfile.NamedTemporaryFile(prefix=SPILL_PREFIX, delete=False) as dst:
+        try:
+            shutil.copyfileobj(src, dst, SAVE_CHUNK_SIZE)
+        except BaseException:
+            dst.close()
+            os.remove(dst.name)
+            raise
+    return Attachment(filename, path=dst.name, size=size)
+
+@register_expander('.zip', '.asice', '.asics')
+def _expand_zip(attachment, skip_signature_blocks, skip_rules, report):
+    import zipfile
+    records = TextRecords()
+    attachments = []
+    f = open(attachment.path, 'rb') if attachment.path is not None else io.BytesIO(attachment.data)
+    try:
+        with f, zipfile.ZipFile(f) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                member = _member_attachment(info.filename.rpartition("/")[2], info.file_size,
+                                            lambda info=info: archive.open(info))
+                _append_attachment_records(records, attachments, info.filename, 0, member)
+    except BaseException:
+        for member in attachments:
+            member.discard()
+        raise
+    return records, attachments
+
+EML_HEADERS = ("From", "To", "Cc", "Date", "Subject")
+
+@register_expander('.eml')
+def _expand_eml(attachment, skip_signature_blocks, skip_rules, report):
+    import email
+    from email import policy
+    with attachment.open() as f:
+        message = email.message_from_binary_file(f, policy=policy.default)
+    records = TextRecords()
+    attachments = []
+    for header in EML_HEADERS:
+        value = message.get(header)
+        if value:
+            records.append(0, KIND_FIELD, header, str(value))
+    body = message.get_body(preferencelist=("plain",))
+    if body is not None:
+        for line in body.get_content().splitlines():
+            if line.strip():
+                records.append(1, KIND_TEXT, "Treść", line.rstrip())
+    for part in message.iter_attachments():
+        if part.get_content_maintype() == "message":
+            data = part.get_payload(0).as_bytes()  # załączona wiadomość
+        else:
+            data = part.get_payload(decode=True) or b""
+        filename = os.path.basename(part.get_filename() or "") or _default_attachment_name(None, attachments)
+        _append_attachment_records(records, attachments, "Załącznik", 0, Attachment(filename, data=data))
+    return records, attachments
+
+# === Pamięć podręczna na dysku ===
+# Wyniki ekstrakcji zapisujemy pod skrótem SHA-256 treści pliku i ustawieniem
+# pomijania podpisów. Skrót liczy się przy parsowaniu (bez osobnego czytania
+# pliku), a mały wpis-odsyłacz wiąże z nim ścieżkę, rozmiar i czas modyfikacji,
+# więc ten sam plik otwarty ponownie nie jest nawet czytany, a kopia pod inną
+# nazwą po pierwszym parsowaniu trafia na istniejący wpis. Wpis zawiera kolumny TextRecords i indeks
+# załączników (nazwa, typ, rozmiar, SHA-256, offsety tekstu base64 w pliku XML)
+# oraz raport reguł pomijania;
+# dane załączników czytamy później wprost z dokumentu. Format to marshal, więc
+# wpis jest ważny tylko dla tej samej wersji Pythona (jest w kluczu).
+# Nadmiar usuwamy od najdawniej używanych (czas modyfikacji wpisu = ostatnie użycie).
+
+CACHE_FORMAT = 2
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SUFFIX = ".xrc"
+CACHE_ALIAS_SUFFIX = ".xra"  # ścieżka + rozmiar + mtime -> SHA-256
+_START_TAG_END_RE = re.compile(rb'"[^"]*"|\'[^\']*\'|>')
+
+def default_cache_dir():
+    if os.environ.get("XMLREADER_CACHE_DIR"):
+        return os.environ["XMLREADER_CACHE_DIR"]
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "xmlreader")
+
+def file_digest(path, chunk_size=1024 * 1024):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+def _text_byte_range(f, tag_start, text_end, chars=None):
+    # Koniec znacznika otwierającego (">" poza wartościami atrybutów) i kontrola, że
+    # surowe bajty to czysty base64 - encje, CDATA czy komentarze zmieniłyby treść.
+    # chars: liczba znaków tekstu podana przez parser; gdy równa liczbie bajtów, każdy
+    # znak to jeden bajt w pliku (bez encji, CDATA, komentarzy i \r) i nie czytamy tekstu.
+    f.seek(tag_start)
+    head = f.read(min(text_end - tag_start, STREAM_CHUNK_SIZE))
+    for m in _START_TAG_END_RE.finditer(head):
+        if m.group() == b'>':
+            text_start = tag_start + m.end()
+            break
+    else:
+        return None
+    if chars == text_end - text_start:
+        return text_start, text_end
+    f.seek(text_start)
+    left = text_end - text_start
+    while left > 0:
+        block = f.read(min(STREAM_CHUNK_SIZE, left))
+        if not block or b'&' in block or b'<' in block:
+            return None
+        left -= len(block)
+    return text_start, text_end
+
+class ExtractionCache:
+    def __init__(self, directory=None, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, digest, skip_signature_blocks, skip_rules=None):
+        version = f"{sys.version_info[0]}{sys.version_info[1]}"
+        variant = str(int(bool(skip_signature_blocks)))
+        rules = SkipRules(skip_rules or ()).key()
+        if rules:
+            import hashlib
+            variant += "r" + hashlib.sha256(rules.encode("utf-8")).hexdigest()[:16]
+        name = f"{digest}-{variant}-{CACHE_FORMAT}-py{version}{CACHE_SUFFIX}"
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def stat_key(xml_path):
+        st = os.stat(xml_path)
+        return f"{os.path.realpath(xml_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+    def _alias_path(self, key):
+        import hashlib
+        name = hashlib.sha256(key.encode("utf-8", "surrogateescape")).hexdigest()[:32]
+        return os.path.join(self.directory, name + CACHE_ALIAS_SUFFIX)
+
+    def lookup(self, xml_path):
+        # (klucz pliku, SHA-256 albo None) - skrót znany z wcześniejszego parsowania
+        # tego samego pliku, bez czytania jego treści
+        try:
+            key = self.stat_key(xml_path)
+        except OSError:
+            return None, None
+        alias = self._alias_path(key)
+        try:
+            with open(alias, encoding="utf-8", errors="surrogateescape") as f:
+                stored_key, digest = f.read().rsplit("\n", 1)
+            os.utime(alias)
+        except (OSError, ValueError):
+            return key, None
+        return key, digest if stored_key == key else None
+
+    def _remember(self, xml_path, key, digest):
+        # odsyłacz tylko, gdy plik nie zmienił się od początku parsowania
+        try:
+            if key is None or self.stat_key(xml_path) != key:
+                return
+            with open(self._alias_path(key), "w", encoding="utf-8", errors="surrogateescape") as f:
+                f.write(f"{key}\n{digest}")
+        except OSError:
+            pass  # bez odsyłacza wpis nadal działa, plik zostanie tylko raz więcej przeczytany
+
+    @instrumented("cache.load")
+    def load(self, xml_path, digest, skip_signature_blocks, skip_rules=None, skip_report=None):
+        # (TextRecords, załączniki) albo None, gdy wpisu nie ma lub jest uszkodzony
+        import marshal
+        entry = self._entry_path(digest, skip_signature_blocks, skip_rules)
+        try:
+            with open(entry, 'rb') as f:
+                payload = marshal.load(f)
+            if payload[0] != CACHE_FORMAT:
+                return None
+            _, depths, kinds, tags, texts, index, report = payload
+            records = TextRecords()
+            records.depths.frombytes(depths)
+            records.kinds.frombytes(kinds)
+            records.tags = [sys.intern(tag) for tag in tags]
+            records.texts = texts
+            attachments = [Attachment(filename, start=start, end=end, size=size, sha256=sha256,
+                                      xml_path=xml_path, ext=ext)
+                           for filename, ext, size, sha256, start, end in index]
+            os.utime(entry)  # ostatnie użycie dla LRU
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            return None
+        if skip_report is not None:
+            skip_report.update(report)
+        return records, attachments
+
+    @instrumented("cache.store")
+    def store(self, xml_path, digest, skip_signature_blocks, records, attachments, skip_rules=None,
+              skip_report=None, stat_key=None):
+        # False, gdy dokumentu nie da się opisać offsetami (np. encje w base64, UTF-16).
+        # stat_key z lookup() sprzed parsowania: zapisuje też odsyłacz do wpisu.
+        import marshal
+        import tempfile
+        entry = self._entry_path(digest, skip_signature_blocks, skip_rules)
+        if os.path.exists(entry):
+            os.utime(entry)  # ta sama treść pod inną nazwą - wpis już jest
+            self._remember(xml_path, stat_key, digest)
+            return True
+        index = []
+        with open(xml_path, 'rb') as f:
+            if attachments and not _ascii_compatible(f.read(512).lstrip(b'\xef\xbb\xbf')):
+                return False
+            for attachment in attachments:
+                if attachment.xml_offsets is None:
+                    return False
+                text_range = _text_byte_range(f, *attachment.xml_offsets)
+                if text_range is None:
+                    return False
+                try:
+                    ext = attachment.ext
+                except Exception:
+                    ext = None
+                index.append((attachment.filename, ext, attachment.size, attachment.sha256, *text_range))
+        payload = (CACHE_FORMAT, records.depths.tobytes(), records.kinds.tobytes(),
+                   list(records.tags), list(records.texts), index, dict(skip_report or {}))
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".zapis_", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                marshal.dump(payload, f)
+            os.replace(tmp, entry)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._remember(xml_path, stat_key, digest)
+        self.evict()
+        return True
+
+    def entries(self):
+        # [(ostatnie użycie, rozmiar, ścieżka)] od najdawniej używanych
+        found = []
+        try:
+            scan = list(os.scandir(self.directory))
+        except OSError:
+            return found
+        for entry in scan:
+            if entry.name.endswith((CACHE_SUFFIX, CACHE_ALIAS_SUFFIX)):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                found.append((st.st_mtime, st.st_size, entry.path))
+        found.sort()
+        return found
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# === Wyszukiwanie ===
+# Indeks budujemy raz z gotowych linii: słowo (małymi literami) -> rosnąca tablica
+# numerów linii. Zapytanie pasuje do linii, gdy występuje w niej od początku słowa;
+# ostatnie słowo zapytania traktujemy jako prefiks (szukanie w trakcie pisania).
+# Kolejne trafienie znajdujemy przeskokami po listach (bisect), więc koszt zależy
+# od liczby pasujących słów w słowniku, a nie od długości dokumentu. Krótkie prefiksy
+# pasujące do wielu słów scalamy raz do jednej listy i zapamiętujemy.
+
+SEARCH_WORD_RE = re.compile(r"\w+")
+SEARCH_MERGE_LISTS = 32
+
+class SearchIndex:
+    @instrumented("search.index")
+    def __init__(self, lines):
+        postings = {}
+        for number, line in enumerate(lines):
+            for word in set(SEARCH_WORD_RE.findall(line.lower())):
+                numbers = postings.get(word)
+                if numbers is None:
+                    postings[word] = numbers = array('I')
+                numbers.append(number)
+        # Wszystkie listy w jednej tablicy w kolejności słownika: słowo words[i] ma
+        # linie numbers[starts[i]:starts[i + 1]], a prefiks to ciągły zakres tablicy.
+        self.lines = lines
+        self.words = sorted(postings)
+        self.starts = array('I')
+        self.numbers = array('I')
+        for word in self.words:
+            self.starts.append(len(self.numbers))
+            self.numbers.extend(postings.pop(word))
+        self.starts.append(len(self.numbers))
+        self._merged = {}
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _word_range(self, prefix):
+        lo = bisect.bisect_left(self.words, prefix)
+        return lo, bisect.bisect_left(self.words, prefix + "\U0010ffff", lo)
+
+    def needs_merge(self, query):
+        # Czy search(query) będzie scalać listy wielu słów - przy krótkim prefiksie
+        # w dużym dokumencie to za długo na wątek interfejsu
+        for word in SEARCH_WORD_RE.findall(query.strip().lower()):
+            lo, hi = self._word_range(word)
+            if hi - lo > SEARCH_MERGE_LISTS and word not in self._merged:
+                return True
+        return False
+
+    def _prefixed(self, prefix):
+        # Zakresy (tablica, od, do) list słów zaczynających się od prefiksu
+        merged = self._merged.get(prefix)
+        if merged is not None:
+            return [(merged, 0, len(merged))]
+        lo, hi = self._word_range(prefix)
+        if hi - lo > SEARCH_MERGE_LISTS:
+            merged = self._merged[prefix] = array('I', sorted(set(self.numbers[self.starts[lo]:self.starts[hi]])))
+            return [(merged, 0, len(merged))]
+        return [(self.numbers, self.starts[i], self.starts[i + 1]) for i in range(lo, hi)]
+
+    @instrumented("search.query", memory=False)
+    def search(self, query):
+        return SearchMatches(self, query)
+
+class SearchMatches:
+    def __init__(self, index, query):
+        self.index = index
+        self.needle = query.strip().lower()
+        words = SEARCH_WORD_RE.findall(self.needle)
+        self.groups = [index._prefixed(word) for word in words] if words else []
+        if any(not group for group in self.groups):
+            self.groups = []
+        self._at_word_start = bool(self.needle) and SEARCH_WORD_RE.match(self.needle) is not None
+        self.found = array('I')  # trafienia zebrane przez collect(), rosnąco
+        self._scanned = 0  # collect() sprawdził już linie < _scanned
+        self.complete = not self.groups
+
+    def __bool__(self):
+        return bool(self.groups)
+
+    def occurrences(self, line):
+        # Pozycje zapytania w linii (tylko od początku słowa)
+        text = line.lower()
+        positions = []
+        pos = text.find(self.needle)
+        while pos >= 0:
+            if not self._at_word_start or pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] == "_"):
+                positions.append(pos)
+            pos = text.find(self.needle, pos + 1)
+        return positions
+
+    def _candidate_after(self, start):
+        # Najmniejsza linia >= start obecna we wszystkich grupach (lub None)
+        while True:
+            candidate = start
+            for group in self.groups:
+                best = None
+                for numbers, lo, hi in group:
+                    i = bisect.bisect_left(numbers, candidate, lo, hi)
+                    if i < hi and (best is None or numbers[i] < best):
+                        best = numbers[i]
+                        if best == candidate:
+                            break
+                if best is None:
+                    return None
+                candidate = best
+            if candidate == start:
+                return candidate
+            start = candidate
+
+    def _candidate_before(self, start):
+        # Największa linia <= start obecna we wszystkich grupach (lub None)
+        while True:
+            candidate = start
+            for group in self.groups:
+                best = None
+                for numbers, lo, hi in group:
+                    i = bisect.bisect_right(numbers, candidate, lo, hi)
+                    if i > lo and (best is None or numbers[i - 1] > best):
+                        best = numbers[i - 1]
+                        if best == candidate:
+                            break
+                if best is None:
+                    return None
+                candidate = best
+            if candidate == start:
+                return candidate
+            start = candidate
+
+    def next(self, start):
+        # Pierwsza pasująca linia >= start (None, gdy brak)
+        if not self.groups:
+            return None
+        while start < len(self.index):
+            candidate = self._candidate_after(start)
+            if candidate is None:
+                return None
+            if self.occurrences(self.index.lines[candidate]):
+                return candidate
+            start = candidate + 1
+        return None
+
+    def previous(self, start):
+        # Ostatnia pasująca linia <= start (None, gdy brak)
+        if not self.groups:
+            return None
+        while start >= 0:
+            candidate = self._candidate_before(start)
+            if candidate is None:
+                return None
+            if self.occurrences(self.index.lines[candidate]):
+                return candidate
+            start = candidate - 1
+        return None
+
+    def collect(self, limit):
+        # Zbiera do limit kolejnych trafień; pozwala liczyć wyniki porcjami w tle
+        while limit > 0 and not self.complete:
+            number = self.next(self._scanned)
+            if number is None:
+                self.complete = True
+                break
+            self.found.append(number)
+            self._scanned = number + 1
+            limit -= 1
+        return self.complete
+
+    def ordinal(self, number):
+        # Numer trafienia (od 1) wśród zebranych, None, gdy linia nie jest trafieniem
+        i = bisect.bisect_left(self.found, number)
+        if i < len(self.found) and self.found[i] == number:
+            return i + 1
+        return None
+
+# === HTML GENERATOR ===
+# Strona do wydruku jest zapisywana strumieniowo: linie są escapowane, łączone
+# w bloki <pre> po HTML_LINES_PER_BLOCK linii i wysyłane do pliku porcjami.
+# Bardzo duże dokumenty można podzielić na osobne strony (lines_per_page).
+
+HTML_LINES_PER_BLOCK = 200
+HTML_WRITE_CHUNK = 1 << 16
+HTML_LINES_PER_PAGE = 50000
+
+_HTML_HEAD = """<html>
+<head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <style>
+        body {{
+            margin: 0;
+            padding: 10px;
+            font-family: {font};
+            background: #f0f0f0;
+            overflow-y: scroll;
+        }}
+        .mainTxt {{
+            font-size: {font_size}px;
+            line-height: 1.2;
+            margin: 2px 0;
+            white-space: pre-wrap;
+        }}
+        .pages {{
+            margin: 10px 0;
+        }}
+    </style>
+</head>
+<body>
+    <h3>Dokument XML</h3>
+    <h4>Zawartość pliku:</h4>
+    {filename_display}
+    {navigation}
+"""
+
+_HTML_TAIL = """    {navigation}
+    <button onclick="window.print()" style="
+        position: fixed;
+        top: 10px;
+        right: 10px;
+        padding: 8px 16px;
+        font-size: 14px;
+        background-color: #007bff;
+        color: white;
+        border: none;
+        border-radius: 6px;
+        cursor: pointer;
+        z-index: 1000;
+    ">🖨 Wydrukuj dokument</button>
+</body>
+</html>
+"""
+
+def _html_navigation(page_names, current):
+    if len(page_names) < 2:
+        return ""
+    links = []
+    for i, name in enumerate(page_names):
+        if i == current:
+            links.append(f"<b>{i + 1}</b>")
+        else:
+            links.append(f'<a href="{html.escape(name)}">{i + 1}</a>')
+    return f'<div class="pages">Strona: {" ".join(links)}</div>'
+
+def write_html(lines, out, filename=None, font="Arial", font_size="14", navigation=""):
+    # lines: dowolny iterowalny zbiór linii (np. TextRecords), out: plik tekstowy
+    filename_display = f"<p><b>Nazwa pliku:</b> {html.escape(filename)}</p>" if filename else ""
+    out.write(_HTML_HEAD.format(title=html.escape(filename or "Dokument XML"), font=html.escape(font),
+                                font_size=html.escape(str(font_size)), filename_display=filename_display,
+                                navigation=navigation))
+    pending = []
+    pending_size = 0
+    block = []
+
+    def flush_block():
+        nonlocal pending_size
+        text = '<pre class="mainTxt">' + "\n".join(block) + "</pre>\n"
+        pending.append(text)
+        pending_size += len(text)
+        block.clear()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        block.append(html.escape(line, quote=False))
+        if len(block) >= HTML_LINES_PER_BLOCK:
+            flush_block()
+            if pending_size >= HTML_WRITE_CHUNK:
+                out.write("".join(pending))
+                pending.clear()
+                pending_size = 0
+    if block:
+        flush_block()
+    out.write("".join(pending))
+    out.write(_HTML_TAIL.format(navigation=navigation))
+
+def write_html_pages(lines, directory, basename, filename=None, font="Arial", font_size="14",
+                     lines_per_page=HTML_LINES_PER_PAGE):
+    # Zapisuje basename.html (+ basename_2.html, ...) i zwraca listę ścieżek
+    total = len(lines)
+    page_count = max(1, -(-total // lines_per_page)) if lines_per_page else 1
+    page_names = [f"{basename}.html"] + [f"{basename}_{i}.html" for i in range(2, page_count + 1)]
+    paths = []
+    for page, name in enumerate(page_names):
+        if page_count == 1:
+            page_lines = lines
+        else:
+            page_lines = lines[page * lines_per_page:(page + 1) * lines_per_page]
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            write_html(page_lines, f, filename=filename, font=font, font_size=font_size,
+                       navigation=_html_navigation(page_names, page))
+        paths.append(path)
+    return paths
+
+def generate_html_from_text_lines(lines, filename=None, font="Arial", font_size="14"):
+    out = io.StringIO()
+    write_html(lines, out, filename=filename, font=font, font_size=font_size)
+    return out.getvalue()
+
+# Pliki podglądu wydruku trafiają do wspólnego katalogu tymczasowego; przeglądarka
+# otwiera je asynchronicznie, więc usuwamy je dopiero po HTML_TEMP_MAX_AGE sekundach.
+
+HTML_TEMP_DIRNAME = "xmlreader_html"
+HTML_TEMP_MAX_AGE = 3600
+
+def html_temp_dir():
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), HTML_TEMP_DIRNAME)
+
+def cleanup_html_temp(max_age=HTML_TEMP_MAX_AGE):
+    try:
+        entries = list(os.scandir(html_temp_dir()))
+    except OSError:
+        return
+    now = time.time()
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime < max_age:
+                continue
+            if entry.is_dir():
+                import shutil
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def write_html_preview(lines, filename=None, font="Arial", font_size="14", lines_per_page=HTML_LINES_PER_PAGE):
+    import tempfile
+    cleanup_html_temp()
+    os.makedirs(html_temp_dir(), exist_ok=True)
+    directory = tempfile.mkdtemp(prefix="podglad_", dir=html_temp_dir())
+    basename = os.path.splitext(os.path.basename(filename))[0] if filename else "dokument"
+    return write_html_pages(lines, directory, basename, filename=filename, font=font,
+                            font_size=font_size, lines_per_page=lines_per_page)
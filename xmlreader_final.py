@@ -1,164 +1,411 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import xml.etree.ElementTree as ET
-import tempfile
+import tkinter.font as tkfont
 import webbrowser
-import base64
+import hashlib
 import os
-import io
-import zipfile
-
-# === Pomocnicze ===
-
-def strip_ns(tag):
-    return tag.split('}', 1)[1] if '}' in tag else tag
-
-def is_base64_string(s):
-    try:
-        return len(s) > 100 and base64.b64encode(base64.b64decode(s)).decode()[:100] in s[:110]
-    except Exception:
-        return False
-
-def guess_office_extension(file_bytes):
-    try:
-        with zipfile.ZipFile(io.BytesIO(file_bytes)) as z:
-            namelist = z.namelist()
-            if any(name.startswith('word/') for name in namelist): return '.docx'
-            elif any(name.startswith('xl/') for name in namelist): return '.xlsx'
-            elif any(name.startswith('ppt/') for name in namelist): return '.pptx'
-            else: return '.zip'
-    except: pass
-
-    ole_magic = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
-    if file_bytes.startswith(ole_magic):
-        header_sample = file_bytes[512:2048].decode('latin1', errors='ignore').lower()
-        if 'worddocument' in header_sample: return '.doc'
-        elif 'workbook' in header_sample: return '.xls'
-        elif 'powerpoint document' in header_sample: return '.ppt'
-        else: return '.ole'
-    try:
-        text_sample = file_bytes[:2048].decode('utf-8')
-        if not text_sample.lstrip().startswith('<?xml'): return '.txt'
-    except: pass
-    return 'nieznany'
-
-def guess_extension_from_bytes(data_bytes):
-    header = data_bytes[:100].lstrip()
-    if header.startswith(b'%PDF-'): return '.pdf'
-    elif header.startswith(b'\xFF\xD8\xFF'): return '.jpg'
-    elif header.startswith(b'\x89PNG\r\n\x1a\n'): return '.png'
-    elif header.startswith(b'PK\x03\x04'): return guess_office_extension(data_bytes)
-    elif header.startswith(b'<?xml') or header.startswith(b'<'): return '.xml'
-    elif header.startswith(b'From:') or b'\r\nFrom:' in data_bytes[:200] or b'\nFrom:' in data_bytes[:200]: return '.eml'
-    elif data_bytes.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
-        sample = data_bytes[:2048].lower()
-        if b'outlook message' in sample or b'microsoft outlook' in sample: return '.msg'
-        return guess_office_extension(data_bytes)
-    else: return '.nieznany'
-
-# === Kluczowa funkcja ===
-
-def extract_all_text_elements(root, skip_signature_blocks=False):
-    attachments = []
-    lines = []
-
-    def recurse(elem, depth=0, parent_filename=None):
-        tag = strip_ns(elem.tag)
-        if skip_signature_blocks and tag in ("SignatureValue", "X509Certificate"):
-            return  # pomijamy cały ten blok
-
-        text = (elem.text or "").strip()
-
-        # Sprawdź atrybut nazwaPliku w elemencie (np. str:Zalacznik)
-        filename = elem.attrib.get("nazwaPliku") or elem.attrib.get("Nazwa") or parent_filename
-
-        if text and is_base64_string(text):
-            current_filename = filename or f"zalacznik_{len(attachments) + 1}"
-            b64_clean = "".join(text.split())
-            try:
-                decoded_bytes = base64.b64decode(b64_clean)
-                ext = os.path.splitext(current_filename)[1].lower()
-                if not ext:
-                    ext = guess_extension_from_bytes(decoded_bytes)
-                    current_filename += ext
-            except Exception:
-                if not os.path.splitext(current_filename)[1]:
-                    current_filename += '.bin'
-
-            attachments.append((current_filename, text))
-            indent = "  " * depth
-            lines.append(f"{indent}{tag}:")
-            lines.append(f"{indent}  Nazwa załącznika: {current_filename}")
-
-        elif text:
-            indent = "  " * depth
-            if tag == "Informacja":
-                lines.append(f"{indent}## {text}")
-            elif ':' in text:
-                lines.append(f"{indent}{text}")
-            else:
-                lines.append(f"{indent}{tag}: {text}")
-
-        for child in elem:
-            recurse(child, depth + 1, filename)
-
-    recurse(root)
-    return lines, attachments
-
-# === HTML GENERATOR ===
-# Niepotrzebny już, ale zostawiam, bo może przydać się później
-def generate_html_from_text_lines(lines, filename=None, font="Arial", font_size="14"):
-    filtered_lines = [line for line in lines if line.strip()]
-    content_blocks = "\n".join(
-        f"""<div class="mainTxtContainer"><pre class="mainTxt">{line}</pre></div>"""
-        for line in filtered_lines
-    )
-    filename_display = f"<p><b>Nazwa pliku:</b> {filename}</p>" if filename else ""
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <style>
-            body {{
-                margin: 0;
-                padding: 10px;
-                font-family: {font};
-                background: #f0f0f0;
-                overflow-y: scroll;
-            }}
-            .mainTxt {{
-                font-size: {font_size}px;
-                line-height: 1.2;
-                margin: 2px 0;
-                white-space: pre-wrap;
-            }}
-        </style>
-    </head>
-    <body>
-        <h3>Dokument XML</h3>
-        <h4>Zawartość pliku:</h4>
-        {filename_display}
-        {content_blocks}
-        <button onclick="window.print()" style="
-            position: fixed;
-            top: 10px;
-            right: 10px;
-            padding: 8px 16px;
-            font-size: 14px;
-            background-color: #007bff;
-            color: white;
-            border: none;
-            border-radius: 6px;
-            cursor: pointer;
-            z-index: 1000;
-        ">🖨 Wydrukuj dokument</button>
-    </body>
-    </html>
-    """
-    return html
+import queue
+import threading
+import time
+
+from xmlreader_core import (INSTRUMENTATION, ExtractionCache, ExtractionCancelled, SearchIndex,
+                            cleanup_html_temp, extract_text_elements_streaming, format_skip_report,
+                            parse_skip_rules, save_all_attachments, span, write_checksums, write_html_preview)
+
+# === Wczytywanie w tle ===
+# Wątek roboczy tylko parsuje; wszystko, co dotyka Tk, dzieje się w wątku głównym,
+# który odbiera komunikaty z kolejki (progress / done / error / cancelled).
+# Z pamięcią podręczną dokument już raz wczytany trafia od razu jako "done".
+
+class _ExtractionJob:
+    def __init__(self, path, skip, cache=None, skip_rules=(), mapped=False):
+        self.path = path
+        self.skip = skip
+        self.cache = cache
+        self.skip_rules = skip_rules
+        self.mapped = mapped
+        self.skip_report = {}  # reguła pomijania -> [liczba poddrzew, bajty]
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()  # wynik trafia do kolejki albo do zwolnienia, nigdy obok cancel()
+        self.queue = queue.Queue()
+        self.shown_lines = 0
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        sent = 0
+
+        def progress(bytes_read, total, records):
+            nonlocal sent
+            self.queue.put(("progress", bytes_read, total, records[sent:]))
+            sent = len(records)
+
+        stat_key = hasher = None
+        try:
+            if self.cache is not None:
+                # bez czytania pliku: skrót znany z poprzedniego otwarcia; inaczej liczy się przy parsowaniu
+                stat_key, digest = self.cache.lookup(self.path)
+                if digest is not None:
+                    result = self.cache.load(self.path, digest, self.skip, self.skip_rules, self.skip_report)
+                    if result is not None:
+                        self._deliver(result)
+                        return
+                hasher = hashlib.sha256()
+            result = extract_text_elements_streaming(self.path, skip_signature_blocks=self.skip,
+                                                     progress=progress, cancel_event=self.cancel_event,
+                                                     skip_rules=self.skip_rules, skip_report=self.skip_report,
+                                                     mapped=self.mapped, hasher=hasher,
+                                                     # wpis pamięci podręcznej potrzebuje offsetów z expat
+                                                     backend="expat" if hasher is not None else None)
+        except ExtractionCancelled:
+            self.queue.put(("cancelled",))
+        except Exception as e:
+            self.queue.put(("error", e))
+        else:
+            if hasher is not None and not self.cancel_event.is_set():
+                # przed "done" - potem załączniki mogą już być przenoszone przez zapis
+                try:
+                    self.cache.store(self.path, hasher.hexdigest(), self.skip, *result, skip_rules=self.skip_rules,
+                                     skip_report=self.skip_report, stat_key=stat_key)
+                except Exception:
+                    pass  # brak wpisu w pamięci podręcznej nie przeszkadza w pracy
+            self._deliver(result)
+
+    def _deliver(self, result):
+        with self.lock:
+            if not self.cancel_event.is_set():
+                self.queue.put(("done", result))
+                return
+        # anulowano po zakończeniu parsowania - nikt już nie odbierze wyniku
+        for attachment in result[1]:
+            attachment.discard()
+        self.queue.put(("cancelled",))
+
+    def cancel(self):
+        with self.lock:
+            self.cancel_event.set()
+            # wynik mógł już czekać w kolejce
+            while True:
+                try:
+                    msg = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if msg[0] == "done":
+                    for attachment in msg[1][1]:
+                        attachment.discard()
+
+class _SaveJob:
+    def __init__(self, attachments, folder):
+        self.attachments = list(attachments)
+        self.folder = folder
+        self.cancel_event = threading.Event()
+        self.queue = queue.Queue()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        def progress(done, total, files):
+            self.queue.put(("progress", done, total, files))
+
+        results = save_all_attachments(self.attachments, self.folder, progress=progress,
+                                       cancel_event=self.cancel_event)
+        try:
+            checksums = write_checksums(self.folder, results)
+        except OSError:
+            checksums = None
+        self.queue.put(("done", results, checksums))
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.thread.join()
+
+class _SearchIndexJob:
+    # Indeks budujemy w tle raz na wariant dokumentu; linie są już wtedy niezmienne.
+    # Tu też scalamy listy słów dla krótkiego prefiksu - wynik zostaje w indeksie
+    def __init__(self, lines, key, query, index=None):
+        self.lines = lines
+        self.key = key
+        self.query = query
+        self.index = index
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        if self.index is None:
+            self.index = SearchIndex(self.lines)
+        self.index.search(self.query)
+
+class _ExpandJob:
+    # Rozwinięcie załącznika-kontenera w tle; wynik zostaje zapamiętany w załączniku
+    def __init__(self, attachment, skip, skip_rules):
+        self.attachment = attachment
+        self.skip = skip
+        self.skip_rules = skip_rules
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        try:
+            self.attachment.expand(self.skip, self.skip_rules)
+        except Exception as e:
+            self.error = e
+
+# === Widok wirtualny ===
+# Linie dokumentu trzymamy w magazynie (lista), a w widżecie tylko widoczne okno
+# z marginesem. Suwak i skok do linii działają na logicznej liczbie linii, więc
+# koszt wstawiania i pamięć widżetu nie rosną z długością dokumentu.
+# Małe dokumenty (do FULL_RENDER_MAX_LINES) wstawiamy w całości jak dawniej.
+# Trafienia wyszukiwania zaznaczamy tylko w widocznych liniach, po każdym przewinięciu.
+
+FULL_RENDER_MAX_LINES = 20000
+VIRTUAL_MARGIN_LINES = 300
+
+class VirtualTextView:
+    def __init__(self, master, font):
+        self.frame = ctk.CTkFrame(master)
+        self.scrollbar = ctk.CTkScrollbar(self.frame)
+        self.scrollbar.pack(side="right", fill="y", pady=5)
+        self.textbox = ctk.CTkTextbox(self.frame, font=font, activate_scrollbars=False)
+        self.textbox.pack(side="left", fill="both", expand=True, padx=5, pady=5)
+        self.textbox.configure(state="disabled")  # tylko do odczytu
+        self.textbox.bind("<Configure>", self._on_resize, add=True)
+
+        self.lines = []
+        self._owns_lines = True  # False, gdy lines to cudza lista (np. z pamięci podręcznej)
+        self.virtual = False
+        self.top = 0  # pierwsza widoczna linia logiczna
+        self.win_start = 0  # zakres linii wstawionych do widżetu
+        self.win_end = 0
+        self._line_height = 1
+        self._sync_pending = False
+        self.search = None  # SearchMatches bieżącego zapytania
+        self.search_line = None  # linia bieżącego trafienia
+        self._highlight_pending = False
+        self.textbox.tag_config("search_hit", background="#6b5d1a")
+        self.textbox.tag_config("search_current", background="#d08c00", foreground="black")
+        self.set_font(font)
+        self._set_mode(False)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_font(self, font):
+        self.textbox.configure(font=font)
+        self._line_height = max(1, tkfont.Font(family=font[0], size=font[1]).metrics("linespace"))
+        if self.virtual:
+            self._show(self.top, force=True)
+
+    def visible_count(self):
+        return max(1, self.textbox.winfo_height() // self._line_height)
+
+    def __len__(self):
+        return len(self.lines)
+
+    # --- zawartość ---
+
+    def set_lines(self, lines):
+        self.lines = lines
+        self._owns_lines = False
+        self.top = 0
+        self.search = self.search_line = None
+        self._set_mode(len(lines) > FULL_RENDER_MAX_LINES)
+        if self.virtual:
+            self._render(0)
+        else:
+            self._replace_text("\n".join(lines), 0, len(lines))
+
+    def clear(self):
+        self.set_lines([])
+
+    def append(self, new_lines):
+        # Dopisywanie porcji z wątku wczytującego
+        if not new_lines:
+            return
+        if not self._owns_lines:
+            self.lines = list(self.lines)
+            self._owns_lines = True
+        old_count = len(self.lines)
+        self.lines.extend(new_lines)
+        if not self.virtual and len(self.lines) > FULL_RENDER_MAX_LINES:
+            self._set_mode(True)
+            self._render(self.top)
+        elif not self.virtual or self.win_end == old_count and self.win_end - self.top < self.visible_count() + VIRTUAL_MARGIN_LINES:
+            text = "\n".join(new_lines)
+            with span("tk.insert"):
+                self.textbox.configure(state="normal")
+                self.textbox.insert("end", "\n" + text if old_count else text)
+                self.textbox.configure(state="disabled")
+            self.win_end = len(self.lines)
+        self._update_scrollbar()
+
+    def adopt(self, lines):
+        # Ten sam tekst co w widżecie, ale jako docelowa lista (np. z pamięci podręcznej)
+        self.lines = lines
+        self._owns_lines = False
+
+    # --- przewijanie ---
+
+    def goto_line(self, number):
+        if not self.lines:
+            return
+        index = min(max(number - 1, 0), len(self.lines) - 1)
+        self._show(index, force=False)
+        row = self._row_for(index)
+        self.textbox.tag_remove("goto_line", "1.0", "end")
+        self.textbox.tag_add("goto_line", f"{row}.0", f"{row}.end")
+        self.textbox.tag_config("goto_line", background="#44475a")
+
+    # --- wyszukiwanie ---
+
+    def set_search(self, matches):
+        self.search = matches or None
+        self.search_line = None
+        self._schedule_highlight()
+
+    def show_match(self, index):
+        self.search_line = index
+        visible = self.visible_count()
+        first = self.top if self.virtual else self._first_visible()
+        if not first <= index < first + visible:
+            self._show(index - visible // 3)
+        self._schedule_highlight()
+
+    def _first_visible(self):
+        if self.virtual:
+            return self.top
+        return self._line_for_row(int(self.textbox.index("@0,0").split(".")[0]))
+
+    def _schedule_highlight(self):
+        if not self._highlight_pending:
+            self._highlight_pending = True
+            self.textbox.after_idle(self._highlight_visible)
+
+    def _highlight_visible(self):
+        self._highlight_pending = False
+        self.textbox.tag_remove("search_hit", "1.0", "end")
+        self.textbox.tag_remove("search_current", "1.0", "end")
+        if self.search is None or not self.lines:
+            return
+        first = max(self._first_visible(), self.win_start)
+        last = min(first + self.visible_count() + 1, self.win_end)
+        length = len(self.search.needle)
+        row = self._row_for(first)
+        for index in range(first, last):
+            line = self.lines[index]
+            tag = "search_current" if index == self.search_line else "search_hit"
+            for pos in self.search.occurrences(line):
+                hit_row = row + line.count("\n", 0, pos)
+                column = pos - line.rfind("\n", 0, pos) - 1
+                at = f"{hit_row}.{column}"
+                self.textbox.tag_add(tag, at, f"{at}+{length}c")
+            row += line.count("\n") + 1
+        self.textbox.tag_raise("search_current")
+
+    def _set_mode(self, virtual):
+        self.virtual = virtual
+        if virtual:
+            self.scrollbar.configure(command=self._on_scrollbar)
+            self.textbox.configure(yscrollcommand=self._on_text_scroll)
+        else:
+            self.scrollbar.configure(command=self.textbox.yview)
+            self.textbox.configure(yscrollcommand=self._on_plain_scroll)
+
+    def _replace_text(self, text, start, end):
+        with span("tk.insert"):
+            self.textbox.configure(state="normal")
+            self.textbox.delete("1.0", "end")
+            self.textbox.insert("1.0", text)
+            self.textbox.configure(state="disabled")
+        self.win_start, self.win_end = start, end
+        if self.search is not None:
+            self._schedule_highlight()
+
+    def _render(self, top):
+        total = len(self.lines)
+        start = max(0, top - VIRTUAL_MARGIN_LINES)
+        end = min(total, top + self.visible_count() + VIRTUAL_MARGIN_LINES)
+        self._replace_text("\n".join(self.lines[start:end]), start, end)
+        self.top = top
+        self.textbox.yview(f"{self._row_for(top)}.0")
+        self._update_scrollbar()
+
+    def _show(self, top, force=False):
+        total = len(self.lines)
+        visible = self.visible_count()
+        top = min(max(0, top), max(0, total - visible))
+        if not self.virtual:
+            self.textbox.yview(f"{self._row_for(top)}.0")
+            return
+        # Przerysowujemy okno dopiero, gdy widok zbliży się do jego krawędzi
+        slack = VIRTUAL_MARGIN_LINES // 4
+        near_start = top - self.win_start < slack and self.win_start > 0
+        near_end = self.win_end - (top + visible) < slack and self.win_end < total
+        if force or near_start or near_end or not (self.win_start <= top < self.win_end):
+            self._render(top)
+        else:
+            self.top = top
+            self.textbox.yview(f"{self._row_for(top)}.0")
+            self._update_scrollbar()
+
+    # Linia logiczna może zawierać znaki nowej linii (np. długi tekst z podziałami),
+    # dlatego wiersz widżetu liczymy w obrębie okna, a nie z prostej różnicy.
+    def _row_for(self, index):
+        window = self.lines[self.win_start:index]
+        return 1 + len(window) + sum(line.count("\n") for line in window)
+
+    def _line_for_row(self, row):
+        current = 1
+        for index in range(self.win_start, self.win_end):
+            current += self.lines[index].count("\n") + 1
+            if current > row:
+                return index
+        return max(self.win_start, self.win_end - 1)
+
+    def _update_scrollbar(self):
+        if not self.virtual:
+            return
+        total = max(1, len(self.lines))
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_count()) / total))
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._show(int(float(value) * len(self.lines)))
+        elif action == "scroll":
+            step = self.visible_count() if unit == "pages" else 1
+            self._show(self.top + int(value) * step)
+
+    def _on_plain_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.search is not None:
+            self._schedule_highlight()
+
+    def _on_text_scroll(self, first, last):
+        # Natywne przewijanie (kółko, klawisze, zaznaczanie) w obrębie okna
+        if self._sync_pending:
+            return
+        self._sync_pending = True
+        self.textbox.after_idle(self._sync_from_widget)
+
+    def _sync_from_widget(self):
+        self._sync_pending = False
+        if not self.virtual:
+            return
+        top = self._line_for_row(int(self.textbox.index("@0,0").split(".")[0]))
+        if top != self.top:
+            self._show(top)
+        if self.search is not None:
+            self._schedule_highlight()
+
+    def _on_resize(self, _event):
+        if self.virtual:
+            self._show(self.top)
 
 # === APLIKACJA ===
 
+POLL_INTERVAL_MS = 50
+SAVE_SUMMARY_MAX_ERRORS = 10
+SEARCH_DELAY_MS = 150  # zapytanie uruchamiamy po przerwie w pisaniu
+SEARCH_COUNT_BATCH = 2000  # trafienia liczone na jedno wywołanie w tle
+
 class XMLViewerApp:
     def __init__(self, root):
         self.root = root
@@ -188,106 +435,749 @@ class XMLViewerApp:
         self.font_size = ctk.StringVar(value="14")
         self.skip_signature = ctk.BooleanVar(value=True)
 
-        self.font_menu = ctk.CTkOptionMenu(self.controls_frame, values=["Arial", "Courier New", "Times New Roman"], variable=self.font_family, command=self.refresh_text)
+        self.font_menu = ctk.CTkOptionMenu(self.controls_frame, values=["Arial", "Courier New", "Times New Roman"], variable=self.font_family, command=self.apply_font)
         self.font_menu.pack(side="left", padx=5)
 
-        self.size_menu = ctk.CTkOptionMenu(self.controls_frame, values=["12", "14", "16", "18"], variable=self.font_size, command=self.refresh_text)
+        self.size_menu = ctk.CTkOptionMenu(self.controls_frame, values=["12", "14", "16", "18"], variable=self.font_size, command=self.apply_font)
         self.size_menu.pack(side="left", padx=5)
 
         self.skip_checkbox = ctk.CTkCheckBox(self.controls_frame, text="Pomiń SignatureValue i X509Certificate", variable=self.skip_signature, command=self.refresh_text)
         self.skip_checkbox.pack(side="left", padx=5)
 
+        # Dodatkowe reguły pomijania poddrzew przy parsowaniu (np. "Signature, {uri}, Faktura/Zalaczniki")
+        self.skip_rules = []
+        self.skip_rules_entry = ctk.CTkEntry(self.controls_frame, width=200, placeholder_text="Pomiń też: Signature, ...")
+        self.skip_rules_entry.pack(side="left", padx=5)
+        self.skip_rules_entry.bind("<Return>", self.apply_skip_rules)
+        try:
+            self.skip_rules = parse_skip_rules(os.environ.get("XMLREADER_SKIP_RULES", ""))
+        except ValueError:
+            pass
+        if self.skip_rules:
+            self.skip_rules_entry.insert(0, ", ".join(rule.text for rule in self.skip_rules))
+
+        self.goto_entry = ctk.CTkEntry(self.controls_frame, width=90, placeholder_text="Nr linii")
+        self.goto_entry.pack(side="left", padx=5)
+        self.goto_entry.bind("<Return>", self.goto_line)
+
+        self.search_entry = ctk.CTkEntry(self.controls_frame, width=180, placeholder_text="🔍 Szukaj")
+        self.search_entry.pack(side="left", padx=(5, 0))
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+        self.search_entry.bind("<Return>", self.search_next)
+        self.search_entry.bind("<Shift-Return>", self.search_previous)
+        self.search_entry.bind("<Escape>", self.clear_search)
+        self.search_prev_button = ctk.CTkButton(self.controls_frame, text="▲", width=28, command=self.search_previous)
+        self.search_prev_button.pack(side="left", padx=(2, 0))
+        self.search_next_button = ctk.CTkButton(self.controls_frame, text="▼", width=28, command=self.search_next)
+        self.search_next_button.pack(side="left", padx=(2, 0))
+        self.search_label = ctk.CTkLabel(self.controls_frame, text="", width=90, anchor="w")
+        self.search_label.pack(side="left", padx=5)
+        self.root.bind("<Control-f>", lambda _event: self.search_entry.focus_set())
+
+        self.instrumentation_enabled = ctk.BooleanVar(value=INSTRUMENTATION.enabled)
+        self.instrumentation_checkbox = ctk.CTkCheckBox(self.controls_frame, text="Pomiary", variable=self.instrumentation_enabled, command=self.toggle_instrumentation)
+        self.instrumentation_checkbox.pack(side="left", padx=5)
+        self.instrumentation_button = ctk.CTkButton(self.controls_frame, text="📊 Wyniki pomiarów", command=self.show_instrumentation)
+        self.instrumentation_button.pack(side="left", padx=5)
+        self.catalog_button = ctk.CTkButton(self.controls_frame, text="🗂 Katalog", command=self.show_catalog)
+        self.catalog_button.pack(side="left", padx=5)
+
         self.attachments_info_label = ctk.CTkLabel(self.frame, text="", font=("Arial", 14), anchor="w", justify="left", wraplength=1400)
         self.attachments_info_label.pack(fill="x", padx=10, pady=(5, 5))
 
+        # Nawigacja po załącznikach zagnieżdżonych (XML, ZIP, EML)
+        self.nested_frame = ctk.CTkFrame(self.frame)
+
+        # Pasek postępu wczytywania (widoczny tylko w trakcie pracy wątku)
+        self.progress_frame = ctk.CTkFrame(self.frame)
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text="", anchor="w")
+        self.progress_label.pack(side="left", padx=5)
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
+        self.progress_bar.pack(side="left", fill="x", expand=True, padx=5)
+        self.cancel_button = ctk.CTkButton(self.progress_frame, text="✖ Anuluj", width=100, command=self.cancel_loading)
+        self.cancel_button.pack(side="left", padx=5)
+
+        # Pasek postępu zapisu załączników
+        self.save_frame = ctk.CTkFrame(self.frame)
+        self.save_label = ctk.CTkLabel(self.save_frame, text="", anchor="w")
+        self.save_label.pack(side="left", padx=5)
+        self.save_bar = ctk.CTkProgressBar(self.save_frame)
+        self.save_bar.pack(side="left", fill="x", expand=True, padx=5)
+        self.save_cancel_button = ctk.CTkButton(self.save_frame, text="✖ Anuluj", width=100, command=self.cancel_saving)
+        self.save_cancel_button.pack(side="left", padx=5)
+
+        # Pasek stanu z czasami etapów (gdy pomiary są włączone)
+        self.status_label = ctk.CTkLabel(self.frame, text="", anchor="w")
+        self.status_label.pack(side="bottom", fill="x", padx=10)
+        # Raport reguł pomijania bieżącego dokumentu
+        self.skip_report_label = ctk.CTkLabel(self.frame, text="", anchor="w")
+        self.skip_report_label.pack(side="bottom", fill="x", padx=10)
+
         self.text_frame = ctk.CTkFrame(self.frame)
         self.text_frame.pack(fill="both", expand=True)
 
-        self.textbox = ctk.CTkTextbox(self.text_frame, font=(self.font_family.get(), int(self.font_size.get())))
-        self.textbox.pack(fill="both", expand=True, padx=5, pady=5)
-        self.textbox.configure(state="disabled")  # tylko do odczytu
+        self.view = VirtualTextView(self.text_frame, (self.font_family.get(), int(self.font_size.get())))
+        self.view.pack(fill="both", expand=True)
 
         self.attachments = []
-        self.current_xml_root = None
+        self.current_file_path = None
         self.current_filename = ""
+        # Wyniki ekstrakcji bieżącego dokumentu: skip_signature_blocks -> (records, attachments)
+        self.extraction_cache = {}
+        # Wyniki poprzednio otwieranych plików na dysku (XMLREADER_NO_CACHE=1 wyłącza)
+        self.disk_cache = None if os.environ.get("XMLREADER_NO_CACHE") else ExtractionCache()
+        # XMLREADER_MMAP=1: plik zmapowany do pamięci, załączniki czytane z niego dopiero przy zapisie
+        self.mapped = bool(os.environ.get("XMLREADER_MMAP"))
+        # Indeksy wyszukiwania dla wariantów z extraction_cache
+        self.search_indexes = {}
+        self.index_job = None
+        self.skip_reports = {}  # skip_signature_blocks -> raport reguł pomijania
+        # Otwarte załączniki zagnieżdżone, od dokumentu głównego w głąb
+        self.child_chain = []
+        self.expand_job = None
+        self.search_query = ""
+        self.search_matches = None
+        self.search_after = None
+        self.job = None
+        self.save_job = None
+        self.instrumentation_window = None
+        self.catalog_window = None
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def load_xml(self):
         file_path = filedialog.askopenfilename(filetypes=[("Pliki XML", "*.xml")])
-        if not file_path:
-            return
-        try:
-            tree = ET.parse(file_path)
-            self.current_xml_root = tree.getroot()
-            self.current_filename = os.path.basename(file_path)
-            self.refresh_text()
+        if file_path:
+            self.open_document(file_path)
 
-        except Exception as e:
-            messagebox.showerror("Błąd", f"Błąd przetwarzania XML:\n{e}")
+    def open_document(self, file_path):
+        self.stop_loading()
+        self.stop_saving()
+        self.clear_extraction_cache()
+        self.current_file_path = file_path
+        self.current_filename = os.path.basename(file_path)
+        self.refresh_text()
+
+    def get_extraction(self):
+        # None, dopóki wątek nie skończy ekstrakcji dla bieżącego ustawienia
+        skip = self.skip_signature.get()
+        if self.child_chain:
+            result = self.child_chain[-1].expanded(skip, self.skip_rules)
+            return result[:2] if result is not None else None
+        return self.extraction_cache.get(skip)
+
+    def document_key(self):
+        # Bieżący wariant dokumentu (główny albo rozwinięty załącznik) dla indeksów wyszukiwania
+        return id(self.child_chain[-1]) if self.child_chain else None, self.skip_signature.get()
+
+    def clear_extraction_cache(self):
+        for _, attachments in self.extraction_cache.values():
+            for attachment in attachments:
+                attachment.discard()
+        self.extraction_cache = {}
+        self.attachments = []
+        self.search_indexes = {}
+        self.skip_reports = {}
+        self.child_chain = []
+        self.expand_job = None
+        self.index_job = None  # wątek budujący stary indeks kończy się sam, wynik przepada
+        self.search_matches = None
+
+    def apply_font(self, *_):
+        # Zmiana czcionki nie wymaga ponownej ekstrakcji ani wstawiania tekstu
+        self.view.set_font((self.font_family.get(), int(self.font_size.get())))
+
+    def goto_line(self, *_):
+        try:
+            number = int(self.goto_entry.get())
+        except ValueError:
+            return
+        self.view.goto_line(number)
 
     def refresh_text(self, *_):
-        if self.current_xml_root is None:
+        if self.current_file_path is None:
+            return
+
+        self.stop_loading()
+        if self.child_chain and self.get_extraction() is None:
+            self.child_chain = []  # inny wariant ekstrakcji - wracamy do dokumentu głównego
+        extraction = self.get_extraction()
+        if extraction is None:
+            self.start_loading(self.skip_signature.get())
             return
 
-        lines, attachments = extract_all_text_elements(self.current_xml_root, skip_signature_blocks=self.skip_signature.get())
-        text_content = "\n".join(lines)
+        with span("gui.refresh_text"):
+            lines, attachments = extraction
+            self.view.set_lines(lines)
+            self.show_attachments(attachments)
+            self.show_skip_report(self.skip_signature.get())
+        self.run_search()
+
+    def apply_skip_rules(self, *_):
+        try:
+            rules = parse_skip_rules(self.skip_rules_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Błąd", f"Niepoprawna reguła pomijania:\n{e}")
+            return
+        if [rule.text for rule in rules] == [rule.text for rule in self.skip_rules]:
+            return
+        self.skip_rules = rules
+        if self.current_file_path is not None:
+            # inne reguły to inny wynik ekstrakcji - wczytujemy dokument od nowa
+            self.stop_loading()
+            self.stop_saving()
+            self.clear_extraction_cache()
+            self.refresh_text()
 
-        self.textbox.configure(state="normal")
-        self.textbox.delete("1.0", "end")
-        self.textbox.insert("1.0", text_content)
-        self.textbox.configure(state="disabled")
+    def show_skip_report(self, skip):
+        if self.child_chain:
+            result = self.child_chain[-1].expanded(skip, self.skip_rules)
+            report = result[2] if result is not None else None
+        else:
+            report = self.skip_reports.get(skip)
+        self.skip_report_label.configure(text=f"Pominięto przy parsowaniu: {format_skip_report(report)}" if report else "")
 
+    def show_attachments(self, attachments):
         self.attachments = attachments
 
         if attachments:
             self.show_attachments_info()
         else:
             self.attachments_info_label.configure(text="")
+        self.show_nested_controls()
+
+    def start_loading(self, skip):
+        self.view.clear()
+        self.show_attachments([])
+        self.skip_report_label.configure(text="")
+
+        self.job = _ExtractionJob(self.current_file_path, skip, self.disk_cache, self.skip_rules, self.mapped)
+        self.progress_bar.set(0)
+        self.progress_label.configure(text=f"Wczytywanie {self.current_filename}...")
+        self.progress_frame.pack(fill="x", padx=10, pady=(0, 5), before=self.text_frame)
+        self.job.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_loading, self.job)
+
+    def append_lines(self, job, lines):
+        # Kolejne porcje dopisujemy na końcu, żeby pierwszy ekran był widoczny od razu
+        self.view.append(lines)
+        job.shown_lines += len(lines)
+
+    def poll_loading(self, job):
+        if job is not self.job:
+            return  # zadanie zostało zastąpione lub anulowane
+        batch = []
+        final = None
+        progress = None
+        while True:
+            try:
+                msg = job.queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] == "progress":
+                progress = msg
+                batch.extend(msg[3])
+            else:
+                final = msg
+                break
+
+        self.append_lines(job, batch)
+        if progress is not None:
+            _, bytes_read, total, _ = progress
+            if total:
+                self.progress_bar.set(bytes_read / total)
+                self.progress_label.configure(
+                    text=f"Wczytywanie {self.current_filename}: {bytes_read * 100 // total}% "
+                         f"({bytes_read / 1048576:.1f} z {total / 1048576:.1f} MB)")
+
+        if final is None:
+            self.root.after(POLL_INTERVAL_MS, self.poll_loading, job)
+            return
+
+        self.job = None
+        self.progress_frame.pack_forget()
+        if final[0] == "done":
+            lines, attachments = final[1]
+            self.extraction_cache[job.skip] = final[1]
+            self.append_lines(job, lines[job.shown_lines:])
+            self.view.adopt(lines)
+            self.show_attachments(attachments)
+            self.report_timing("gui.load", f"Wczytano {self.current_filename}", job.started)
+            self.skip_reports[job.skip] = job.skip_report
+            self.show_skip_report(job.skip)
+            self.run_search()
+        elif final[0] == "error":
+            self.close_document()
+            messagebox.showerror("Błąd", f"Błąd przetwarzania XML:\n{final[1]}")
+        else:
+            self.restore_after_cancel()
+
+    def stop_loading(self):
+        stopped = False
+        if self.expand_job is not None:
+            self.expand_job = None  # wątek skończy sam, wynik zostanie w załączniku
+            stopped = True
+        job = self.job
+        if job is not None:
+            self.job = None
+            job.cancel()
+            stopped = True
+        if stopped:
+            self.progress_frame.pack_forget()
+        return stopped
+
+    def cancel_loading(self):
+        if self.stop_loading():
+            self.restore_after_cancel()
+
+    def restore_after_cancel(self):
+        # Wracamy do gotowego wariantu, jeśli taki jest, w przeciwnym razie zamykamy dokument
+        if self.extraction_cache:
+            self.skip_signature.set(next(iter(self.extraction_cache)))
+            self.refresh_text()
+        else:
+            self.close_document()
+
+    def close_document(self):
+        self.stop_saving()
+        self.clear_extraction_cache()
+        self.current_file_path = None
+        self.current_filename = ""
+        self.view.clear()
+        self.attachments_info_label.configure(text="")
+        self.search_label.configure(text="")
+        self.skip_report_label.configure(text="")
+        self.show_nested_controls()
+
+    def on_close(self):
+        self.stop_loading()
+        self.stop_saving()
+        self.clear_extraction_cache()
+        cleanup_html_temp()
+        self.root.destroy()
+
+    # === Wyszukiwanie ===
+
+    def schedule_search(self, _event=None):
+        if self.search_entry.get().strip() == self.search_query:
+            return  # Enter, strzałki itp. nie zmieniają zapytania
+        if self.search_after is not None:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.search_after = None
+        self.search_query = self.search_entry.get().strip()
+        self.search_matches = None
+        self.view.set_search(None)
+        if not self.search_query:
+            self.search_label.configure(text="")
+            return
+        key = self.document_key()
+        extraction = self.get_extraction()
+        if extraction is None:
+            self.search_label.configure(text="Wczytywanie..." if self.job else "")
+            return  # po wczytaniu poll_loading wywoła nas ponownie
+        index = self.search_indexes.get(key)
+        if index is None or index.needs_merge(self.search_query):
+            self.start_indexing(extraction[0], key, index)
+            return
+
+        matches = index.search(self.search_query)
+        self.search_matches = matches
+        self.view.set_search(matches)
+        number = matches.next(self.view.top)
+        if number is None:
+            number = matches.next(0)
+        if number is None:
+            self.search_label.configure(text="Brak wyników")
+            return
+        self.view.show_match(number)
+        self.count_matches(matches)
+
+    def start_indexing(self, lines, key, index=None):
+        self.search_label.configure(text="Indeksowanie..." if index is None else "Szukanie...")
+        if self.index_job is not None and self.index_job.key == key:
+            return  # po zakończeniu run_search sprawdzi bieżące zapytanie
+        self.index_job = _SearchIndexJob(lines, key, self.search_query, index)
+        self.index_job.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_indexing, self.index_job)
+
+    def poll_indexing(self, job):
+        if job is not self.index_job:
+            return
+        if job.thread.is_alive():
+            self.root.after(POLL_INTERVAL_MS, self.poll_indexing, job)
+            return
+        self.index_job = None
+        if job.index is not None:
+            self.search_indexes[job.key] = job.index
+        if job.key == self.document_key():
+            self.run_search()
+
+    def count_matches(self, matches):
+        # Liczymy trafienia porcjami, żeby długie listy nie blokowały interfejsu
+        if matches is not self.search_matches:
+            return
+        if not matches.collect(SEARCH_COUNT_BATCH):
+            self.root.after(1, self.count_matches, matches)
+        self.update_search_label()
+
+    def update_search_label(self):
+        matches = self.search_matches
+        if matches is None or self.view.search_line is None:
+            return
+        total = f"{len(matches.found)}{'' if matches.complete else '+'}"
+        ordinal = matches.ordinal(self.view.search_line)
+        self.search_label.configure(text=f"{ordinal or '…'} z {total}")
+
+    def search_next(self, *_):
+        self.step_search(forward=True)
+        return "break"
+
+    def search_previous(self, *_):
+        self.step_search(forward=False)
+        return "break"
+
+    def step_search(self, forward):
+        if self.search_entry.get().strip() != self.search_query or self.search_matches is None:
+            self.run_search()
+            return
+        matches = self.search_matches
+        current = self.view.search_line
+        if forward:
+            number = matches.next(current + 1 if current is not None else self.view.top)
+            if number is None:
+                number = matches.next(0)  # od początku dokumentu
+        else:
+            number = matches.previous(current - 1 if current is not None else self.view.top)
+            if number is None:
+                number = matches.previous(len(self.view) - 1)
+        if number is not None:
+            self.view.show_match(number)
+            self.update_search_label()
+
+    def clear_search(self, *_):
+        self.search_entry.delete(0, "end")
+        self.run_search()
 
     def show_attachments_info(self):
         info_lines = ["📎 Dokument zawiera załączniki:\n"]
-        for i, (filename, b64data) in enumerate(self.attachments, start=1):
+        for i, attachment in enumerate(self.attachments, start=1):
             try:
-                data = base64.b64decode("".join(b64data.split()))
-                ext = guess_extension_from_bytes(data)
-                info_lines.append(f"{i}. {filename} ({ext})")
+                info_lines.append(f"{i}. {attachment.filename} ({attachment.ext})")
             except:
-                info_lines.append(f"{i}. {filename} (nieznany typ)")
+                info_lines.append(f"{i}. {attachment.filename} (nieznany typ)")
         self.attachments_info_label.configure(text="\n".join(info_lines))
 
+    # === Załączniki zagnieżdżone ===
+
+    def current_document_name(self):
+        return " › ".join([self.current_filename] + [attachment.filename for attachment in self.child_chain])
+
+    def show_nested_controls(self):
+        for widget in self.nested_frame.winfo_children():
+            widget.destroy()
+        expandable = [attachment for attachment in self.attachments if attachment.expandable]
+        if not self.child_chain and not expandable:
+            self.nested_frame.pack_forget()
+            return
+        if self.child_chain:
+            ctk.CTkButton(self.nested_frame, text="⬅ Wróć", width=80, command=self.close_child).pack(side="left", padx=5)
+            ctk.CTkLabel(self.nested_frame, text=self.current_document_name(), anchor="w").pack(side="left", padx=5)
+        for attachment in expandable:
+            ctk.CTkButton(self.nested_frame, text=f"🔍 {attachment.filename}",
+                          command=lambda attachment=attachment: self.open_child(attachment)).pack(side="left", padx=5)
+        self.nested_frame.pack(fill="x", padx=10, pady=(0, 5), before=self.text_frame)
+
+    def open_child(self, attachment):
+        # Pierwsze otwarcie parsuje załącznik w tle, kolejne biorą wynik z pamięci załącznika
+        if self.job is not None or self.expand_job is not None:
+            return
+        skip = self.skip_signature.get()
+        if attachment.expanded(skip, self.skip_rules) is not None:
+            self.enter_child(attachment)
+            return
+        self.expand_job = _ExpandJob(attachment, skip, self.skip_rules)
+        self.progress_bar.set(0)
+        self.progress_label.configure(text=f"Rozwijanie {attachment.filename}...")
+        self.progress_frame.pack(fill="x", padx=10, pady=(0, 5), before=self.text_frame)
+        self.expand_job.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_expanding, self.expand_job)
+
+    def poll_expanding(self, job):
+        if job is not self.expand_job:
+            return
+        if job.thread.is_alive():
+            self.root.after(POLL_INTERVAL_MS, self.poll_expanding, job)
+            return
+        self.expand_job = None
+        self.progress_frame.pack_forget()
+        if job.error is not None:
+            messagebox.showerror("Błąd", f"Nie udało się otworzyć załącznika {job.attachment.filename}:\n{job.error}")
+        elif job.skip == self.skip_signature.get():
+            self.enter_child(job.attachment)
+
+    def enter_child(self, attachment):
+        self.child_chain.append(attachment)
+        self.refresh_text()
+
+    def close_child(self):
+        if self.child_chain:
+            self.child_chain.pop()
+            self.refresh_text()
+
     def print_html(self):
-        if not self.current_xml_root:
+        if not self.current_file_path:
             messagebox.showwarning("Brak danych", "Najpierw wczytaj plik XML.")
             return
-        lines, _ = extract_all_text_elements(self.current_xml_root, skip_signature_blocks=self.skip_signature.get())
-        html = generate_html_from_text_lines(lines, filename=self.current_filename,
-                                             font=self.font_family.get(),
-                                             font_size=self.font_size.get())
-        with tempfile.NamedTemporaryFile('w', delete=False, suffix='.html', encoding='utf-8') as f:
-            f.write(html)
-            webbrowser.open(f.name)
+        extraction = self.get_extraction()
+        if extraction is None:
+            messagebox.showwarning("Brak danych", "Poczekaj na zakończenie wczytywania pliku.")
+            return
+        lines, _ = extraction
+        try:
+            pages = write_html_preview(lines, filename=self.current_document_name(),
+                                       font=self.font_family.get(),
+                                       font_size=self.font_size.get())
+        except OSError as e:
+            messagebox.showerror("Błąd", f"Nie udało się przygotować podglądu:\n{e}")
+            return
+        webbrowser.open(pages[0])
 
     def save_attachments(self):
         if not self.attachments:
             messagebox.showinfo("Informacja", "Brak załączników do zapisania.")
             return
+        if self.save_job is not None:
+            messagebox.showinfo("Informacja", "Trwa zapis załączników.")
+            return
 
         folder = filedialog.askdirectory(title="Wybierz folder do zapisu załączników")
         if not folder:
             return  # użytkownik anulował wybór folderu
 
-        saved_files = []
-        for filename, b64data in self.attachments:
+        self.save_job = _SaveJob(self.attachments, folder)
+        self.save_bar.set(0)
+        self.save_label.configure(text=f"Zapisywanie {len(self.attachments)} załączników...")
+        self.save_frame.pack(fill="x", padx=10, pady=(0, 5), before=self.text_frame)
+        self.save_job.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_saving, self.save_job)
+
+    def poll_saving(self, job):
+        if job is not self.save_job:
+            return
+        progress = None
+        final = None
+        while True:
             try:
-                data = base64.b64decode("".join(b64data.split()))
-                path = os.path.join(folder, filename)
-                with open(path, 'wb') as f:
-                    f.write(data)
-                saved_files.append(filename)
-            except Exception as e:
-                messagebox.showerror("Błąd", f"Nie udało się zapisać {filename}:\n{e}")
-                return
+                msg = job.queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg[0] == "progress":
+                progress = msg
+            else:
+                final = msg
+                break
+
+        if progress is not None:
+            _, done, total, files = progress
+            if total:
+                self.save_bar.set(min(1, done / total))
+            self.save_label.configure(
+                text=f"Zapisywanie: {files} z {len(job.attachments)} plików "
+                     f"({done / 1048576:.1f} z {total / 1048576:.1f} MB)")
+
+        if final is None:
+            self.root.after(POLL_INTERVAL_MS, self.poll_saving, job)
+            return
+
+        self.save_job = None
+        self.save_frame.pack_forget()
+        self.report_timing("gui.save", "Zapisano załączniki", job.started)
+        self.show_save_summary(job.folder, final[1], final[2])
+
+    def stop_saving(self):
+        job = self.save_job
+        if job is None:
+            return False
+        self.save_job = None
+        job.cancel()
+        self.save_frame.pack_forget()
+        return True
+
+    def cancel_saving(self):
+        job = self.save_job
+        if self.stop_saving():
+            # wątek już zakończony - pokazujemy, co zdążyło się zapisać
+            msg = job.queue.get()
+            while msg[0] != "done":
+                msg = job.queue.get()
+            self.show_save_summary(job.folder, msg[1], msg[2])
+
+    def show_save_summary(self, folder, results, checksums):
+        failed = [r for r in results if r["error"]]
+        lines = [f"Zapisano {len(results) - len(failed)} z {len(results)} załączników w:\n{folder}"]
+        if checksums:
+            lines.append(f"Sumy SHA-256: {os.path.basename(checksums)}")
+        if failed:
+            lines.append("\nNie zapisano:")
+            lines.extend(f"{r['filename']}: {r['error']}" for r in failed[:SAVE_SUMMARY_MAX_ERRORS])
+            if len(failed) > SAVE_SUMMARY_MAX_ERRORS:
+                lines.append(f"... i {len(failed) - SAVE_SUMMARY_MAX_ERRORS} innych")
+            messagebox.showwarning("Zapis załączników", "\n".join(lines))
+        else:
+            messagebox.showinfo("Zapisano", "\n".join(lines))
 
-        messagebox.showinfo("Zapisano", f"Zapisano {len(saved_files)} załączników w:\n{folder}")
+    # --- pomiary ---
+
+    def toggle_instrumentation(self):
+        if self.instrumentation_enabled.get():
+            INSTRUMENTATION.enable()
+        else:
+            INSTRUMENTATION.disable()
+            self.status_label.configure(text="")
+
+    def report_timing(self, name, label, started):
+        if not INSTRUMENTATION.enabled:
+            return
+        elapsed = time.perf_counter() - started
+        INSTRUMENTATION.record(name, elapsed)
+        self.status_label.configure(text=f"{label} w {elapsed:.2f} s  |  {INSTRUMENTATION.summary()}")
+        if self.instrumentation_window is not None:
+            self.refresh_instrumentation()
+
+    def show_instrumentation(self):
+        if self.instrumentation_window is not None:
+            self.instrumentation_window.focus()
+            self.refresh_instrumentation()
+            return
+        window = ctk.CTkToplevel(self.root)
+        window.title("Pomiary etapów")
+        window.geometry("800x400")
+        buttons = ctk.CTkFrame(window)
+        buttons.pack(fill="x", padx=5, pady=5)
+        ctk.CTkButton(buttons, text="Odśwież", command=self.refresh_instrumentation).pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Wyzeruj", command=self.reset_instrumentation).pack(side="left", padx=5)
+        ctk.CTkButton(buttons, text="Eksportuj JSON", command=self.export_instrumentation).pack(side="left", padx=5)
+        self.instrumentation_text = ctk.CTkTextbox(window, font=("Courier New", 13))
+        self.instrumentation_text.pack(fill="both", expand=True, padx=5, pady=5)
+        window.protocol("WM_DELETE_WINDOW", self.close_instrumentation)
+        self.instrumentation_window = window
+        self.refresh_instrumentation()
+
+    def close_instrumentation(self):
+        self.instrumentation_window.destroy()
+        self.instrumentation_window = None
+
+    def refresh_instrumentation(self):
+        if not INSTRUMENTATION.enabled and not INSTRUMENTATION.spans:
+            text = "Pomiary są wyłączone - zaznacz \"Pomiary\" i wczytaj dokument."
+        else:
+            rows = [f"{'etap':<24} {'wywołania':>10} {'razem [s]':>10} {'max [ms]':>10} {'pamięć [MB]':>12}"]
+            for name, stats in INSTRUMENTATION.snapshot().items():
+                rows.append(f"{name:<24} {stats['calls']:>10} {stats['seconds']:>10.3f} "
+                            f"{stats['max_seconds'] * 1000:>10.1f} {stats['peak_bytes'] / 1048576:>12.1f}")
+            text = "\n".join(rows)
+        self.instrumentation_text.configure(state="normal")
+        self.instrumentation_text.delete("1.0", "end")
+        self.instrumentation_text.insert("1.0", text)
+        self.instrumentation_text.configure(state="disabled")
+
+    def reset_instrumentation(self):
+        INSTRUMENTATION.reset()
+        self.status_label.configure(text="")
+        self.refresh_instrumentation()
+
+    def export_instrumentation(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")],
+                                            initialfile="pomiary_xmlreader.json")
+        if not path:
+            return
+        document = None
+        if self.current_file_path:
+            try:
+                document = {"name": self.current_filename, "bytes": os.path.getsize(self.current_file_path)}
+            except OSError:
+                document = {"name": self.current_filename}
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(INSTRUMENTATION.to_json(document=document,
+                                                skip_signature=self.skip_signature.get()))
+        except OSError as e:
+            messagebox.showerror("Błąd", f"Nie udało się zapisać pomiarów:\n{e}")
+
+    # === Katalog dokumentów ===
+
+    def show_catalog(self):
+        if self.catalog_window is not None:
+            self.catalog_window.focus()
+            return
+        from xmlreader_catalog import default_catalog_path
+        path = default_catalog_path()
+        if not os.path.exists(path):
+            messagebox.showinfo("Katalog", "Katalog dokumentów jeszcze nie istnieje. Zbuduj go poleceniem:\n"
+                                           "python xmlreader_catalog.py index <folder z dokumentami>\n\n"
+                                           f"Baza: {path}")
+            return
+        window = ctk.CTkToplevel(self.root)
+        window.title("Katalog dokumentów")
+        window.geometry("1000x600")
+        form = ctk.CTkFrame(window)
+        form.pack(fill="x", padx=5, pady=5)
+        self.catalog_text = ctk.CTkEntry(form, width=320, placeholder_text="Tekst (np. NIP, \"fakt*\")")
+        self.catalog_text.pack(side="left", padx=5)
+        self.catalog_field = ctk.CTkEntry(form, width=200, placeholder_text="Pole: TAG=wartość")
+        self.catalog_field.pack(side="left", padx=5)
+        self.catalog_attachment = ctk.CTkEntry(form, width=200, placeholder_text="Załącznik: *.pdf")
+        self.catalog_attachment.pack(side="left", padx=5)
+        ctk.CTkButton(form, text="Szukaj", width=80, command=self.search_catalog).pack(side="left", padx=5)
+        for entry in (self.catalog_text, self.catalog_field, self.catalog_attachment):
+            entry.bind("<Return>", self.search_catalog)
+        self.catalog_status = ctk.CTkLabel(window, text="", anchor="w")
+        self.catalog_status.pack(fill="x", padx=10)
+        self.catalog_results = ctk.CTkScrollableFrame(window)
+        self.catalog_results.pack(fill="both", expand=True, padx=5, pady=5)
+        window.protocol("WM_DELETE_WINDOW", self.close_catalog)
+        self.catalog_window = window
+        self.catalog_text.focus_set()
+
+    def close_catalog(self):
+        self.catalog_window.destroy()
+        self.catalog_window = None
+
+    def search_catalog(self, *_):
+        from xmlreader_catalog import CATALOG_GUI_LIMIT, DocumentCatalog
+        fields = []
+        field = self.catalog_field.get().strip()
+        if field:
+            tag, sep, value = field.partition("=")
+            if not sep or not tag.strip():
+                self.catalog_status.configure(text="Pole wpisz jako TAG=wartość")
+                return
+            fields.append((tag.strip(), value.strip()))
+        started = time.perf_counter()
+        try:
+            with DocumentCatalog() as catalog:
+                hits = catalog.query(self.catalog_text.get().strip(), fields=fields,
+                                     attachment=self.catalog_attachment.get().strip(), limit=CATALOG_GUI_LIMIT)
+        except Exception as e:
+            self.catalog_status.configure(text=f"Błąd katalogu: {e}")
+            return
+        for widget in self.catalog_results.winfo_children():
+            widget.destroy()
+        for hit in hits:
+            text = hit["path"]
+            if hit["snippet"]:
+                text += "\n" + hit["snippet"]
+            if hit["attachments"]:
+                text += "\n📎 " + ", ".join(hit["attachments"])
+            ctk.CTkButton(self.catalog_results, text=text, anchor="w", fg_color="transparent", border_width=1,
+                          command=lambda path=hit["path"]: self.open_document(path)).pack(fill="x", padx=5, pady=2)
+        more = " (pokazano pierwsze)" if len(hits) == CATALOG_GUI_LIMIT else ""
+        self.catalog_status.configure(
+            text=f"Wyniki: {len(hits)}{more}, {time.perf_counter() - started:.2f} s")
+        return "break"
 
 # === Start ===
 if __name__ == "__main__":
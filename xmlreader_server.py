@@ -0,0 +1,514 @@
+import argparse
+import functools
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from xml.parsers import expat
+
+from xmlreader_core import (INSTRUMENTATION, KIND_ATTACHMENT, KIND_ATTACHMENT_NAME, KIND_FIELD, KIND_HEADING,
+                            KIND_TEXT, SPILL_PREFIX, Attachment, SkipRule, extract_text_elements_streaming,
+                            format_record)
+
+# === Usługa HTTP ===
+# Ekstrakcja dla innych procesów bez GUI, tylko na bibliotece standardowej. Dokument
+# przysłany w treści żądania albo wskazany ścieżką (w dozwolonych katalogach) parsuje
+# proces z puli; odpowiedź to JSON z liniami, rekordami i listą załączników, które
+# pobiera się osobno po identyfikatorze. Plik dokumentu zostaje na dysku, dopóki
+# dokument jest w magazynie, bo dane załączników czytamy wprost z niego.
+#
+#   POST   /extract                          dokument w treści (albo ?path=...)
+#   GET    /documents/<id>                   ponownie wynik ekstrakcji
+#   GET    /documents/<id>/attachments/<n>   zawartość załącznika
+#   DELETE /documents/<id>                   zwolnienie dokumentu
+#   GET    /health, /metrics
+
+SERVER_PORT = 8765
+SERVER_MAX_BODY = 256 * 1024 * 1024
+SERVER_MAX_DOCUMENTS = 100
+SERVER_TTL = 15 * 60  # sekund od ostatniego użycia
+SERVER_READ_CHUNK = 1024 * 1024
+UPLOAD_PREFIX = "xmlreader_srv_"
+KIND_NAMES = {KIND_HEADING: "heading", KIND_FIELD: "field", KIND_TEXT: "text",
+              KIND_ATTACHMENT: "attachment", KIND_ATTACHMENT_NAME: "attachment_name"}
+
+class RequestError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class ExtractionTimeout(RequestError):
+    # Żądanie przestało czekać, ale ekstrakcja trwa dalej w procesie roboczym:
+    # jej miejsce w limicie zwalnia dopiero koniec ekstrakcji
+    def __init__(self):
+        super().__init__(504, "Przekroczono czas ekstrakcji")
+
+# === Ekstrakcja (w procesie roboczym) ===
+
+def extract_document(path, skip_signature_blocks=False, skip_rules=()):
+    # (TextRecords, indeks załączników, raport pomijania). Załącznik to offsety bajtowe
+    # tekstu base64 w pliku dokumentu albo plik tymczasowy ze zdekodowaną zawartością.
+    report = {}
+    records, attachments = extract_text_elements_streaming(path, skip_signature_blocks=skip_signature_blocks,
+                                                           skip_rules=skip_rules, skip_report=report, mapped=True)
+    index = []
+    try:
+        for attachment in attachments:
+            ext = _attachment_ext(attachment)
+            if attachment.path is None and isinstance(attachment.source, str):
+                # plik nie dał się zmapować (np. UTF-16) - zawartość zrzucamy do pliku
+                fd, spill = tempfile.mkstemp(prefix=SPILL_PREFIX, suffix=".bin")
+                os.close(fd)
+                attachment.save(spill)
+                attachment.path = spill
+            if attachment.path is not None:
+                index.append((attachment.filename, ext, attachment.size, None, None, attachment.path))
+            else:
+                index.append((attachment.filename, ext, attachment.size, attachment.start, attachment.end, None))
+    except BaseException:
+        for attachment in attachments:
+            attachment.discard()
+        raise
+    return records, index, report
+
+def _discard_late_result(future):
+    # Wynik ekstrakcji, na który żądanie przestało czekać
+    if not future.cancelled() and future.exception() is None:
+        for attachment in attachments_from_index(None, future.result()[1]):
+            attachment.discard()
+
+def attachments_from_index(path, index):
+    return [Attachment(filename, path=spill, size=size, ext=ext) if spill is not None
+            else Attachment(filename, start=start, end=end, size=size, xml_path=path, ext=ext)
+            for filename, ext, size, start, end, spill in index]
+
+def _attachment_ext(attachment):
+    try:
+        return attachment.ext
+    except Exception:
+        return None
+
+# === Magazyn dokumentów ===
+
+class StoredDocument:
+    def __init__(self, path, owned, filename, records, attachments, report):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.owned = owned  # plik przysłany w żądaniu - usuwamy go razem z dokumentem
+        self.filename = filename
+        self.records = records
+        self.attachments = attachments
+        self.report = report
+        self.used = time.monotonic()
+
+    def as_json(self, text=True):
+        result = {
+            "id": self.id,
+            "filename": self.filename,
+            "line_count": len(self.records),
+            "skipped": {rule: {"subtrees": count, "bytes": size} for rule, (count, size) in self.report.items()},
+            "attachments": [{"id": i, "filename": attachment.filename, "ext": _attachment_ext(attachment),
+                             "size": attachment.size, "url": f"/documents/{self.id}/attachments/{i}"}
+                            for i, attachment in enumerate(self.attachments)],
+        }
+        if text:
+            records = list(self.records.iter_records())
+            result["lines"] = [format_record(*record) for record in records]
+            result["records"] = [{"depth": depth, "kind": KIND_NAMES[kind], "tag": tag, "text": value}
+                                 for depth, kind, tag, value in records]
+        return result
+
+    def discard(self):
+        for attachment in self.attachments:
+            attachment.discard()
+        if self.owned:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+class DocumentStore:
+    # Ostatnio używane dokumenty; nadmiar i przeterminowane zwalniamy od najdawniej użytych
+    def __init__(self, max_documents=SERVER_MAX_DOCUMENTS, ttl=SERVER_TTL):
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, document):
+        with self._lock:
+            self._documents[document.id] = document
+            dropped = self._expire()
+        for old in dropped:
+            old.discard()
+
+    def get(self, document_id):
+        with self._lock:
+            document = self._documents.get(document_id)
+            if document is not None:
+                document.used = time.monotonic()
+                self._documents.move_to_end(document_id)
+        return document
+
+    def remove(self, document_id):
+        with self._lock:
+            document = self._documents.pop(document_id, None)
+        if document is not None:
+            document.discard()
+        return document is not None
+
+    def expire(self):
+        with self._lock:
+            dropped = self._expire()
+        for document in dropped:
+            document.discard()
+
+    def _expire(self):
+        now = time.monotonic()
+        dropped = []
+        while self._documents:
+            oldest = next(iter(self._documents.values()))
+            if len(self._documents) <= self.max_documents and now - oldest.used < self.ttl:
+                break
+            dropped.append(self._documents.popitem(last=False)[1])
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            dropped = list(self._documents.values())
+            self._documents.clear()
+        for document in dropped:
+            document.discard()
+
+class ServiceStats:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.active = 0  # ekstrakcje w toku
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def begin(self):
+        with self._lock:
+            self.active += 1
+
+    def end(self):
+        with self._lock:
+            self.active -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(sorted(self.counters.items()))
+
+# === Serwer ===
+
+class ExtractionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, max_body=SERVER_MAX_BODY, max_concurrent=None,
+                 max_documents=SERVER_MAX_DOCUMENTS, ttl=SERVER_TTL, roots=(), timeout=None, spool_dir=None,
+                 quiet=False):
+        # workers=0: ekstrakcja w wątku żądania, bez puli procesów
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+        self.max_body = max_body
+        self.max_concurrent = max_concurrent or max(1, self.workers) * 2
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.store = DocumentStore(max_documents, ttl)
+        self.stats = ServiceStats()
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.extract_timeout = timeout
+        self.spool_dir = spool_dir
+        self.quiet = quiet
+        super().__init__(address, ExtractionRequestHandler)
+
+    def run_extraction(self, path, skip_signature_blocks, skip_rules, owned=False):
+        # Przy ExtractionTimeout miejsce w limicie (slots, stats.active) i przysłany plik
+        # (owned) przechodzą na ekstrakcję w tle - zwolni je _late_result
+        if self.executor is None:
+            return extract_document(path, skip_signature_blocks, skip_rules)
+        future = self.executor.submit(extract_document, path, skip_signature_blocks, skip_rules)
+        try:
+            return future.result(timeout=self.extract_timeout)
+        except FutureTimeout:
+            self.stats.add("timeouts")
+            future.add_done_callback(functools.partial(self._late_result, path if owned else None))
+            raise ExtractionTimeout()
+
+    def _late_result(self, upload, future):
+        try:
+            _discard_late_result(future)
+            if upload is not None:
+                os.remove(upload)
+        except Exception:
+            pass  # np. błąd ekstrakcji - nikt już nie czeka na wynik
+        finally:
+            self.stats.end()
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.store.clear()
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    server_version = "xmlreader"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_response(self, code, message=None):
+        self.server.stats.add(f"responses.{code}")
+        super().send_response(code, message)
+
+    def dispatch(self, method):
+        self.server.stats.add("requests")
+        self.server.store.expire()
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        self.body_read = False
+        try:
+            if method == "GET" and parts == ["health"]:
+                self.send_json(self.health())
+            elif method == "GET" and parts == ["metrics"]:
+                self.send_json(self.metrics())
+            elif method == "POST" and parts == ["extract"]:
+                self.extract(query)
+            elif parts[:1] == ["documents"] and len(parts) in (2, 4):
+                self.document(method, parts[1:], query)
+            else:
+                raise RequestError(404, "Nie ma takiego zasobu")
+        except RequestError as e:
+            self.send_json({"error": str(e)}, e.status, e.headers)
+        except Exception as e:
+            self.send_json({"error": f"{type(e).__name__}: {e}"}, 500)
+        finally:
+            if method == "POST" and not self.body_read and self.headers.get("Content-Length", "0") != "0":
+                self.close_connection = True  # nieprzeczytana treść zepsułaby kolejne żądanie
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def health(self):
+        return {"status": "ok", "workers": self.server.workers, "active": self.server.stats.active,
+                "max_concurrent": self.server.max_concurrent, "documents": len(self.server.store)}
+
+    def metrics(self):
+        stats = self.server.stats
+        result = {"uptime": time.time() - stats.started, "active": stats.active,
+                  "documents": len(self.server.store), "counters": stats.snapshot()}
+        if INSTRUMENTATION.enabled:
+            result["spans"] = INSTRUMENTATION.snapshot()  # tylko ten proces, bez procesów roboczych
+        return result
+
+    # === Ekstrakcja ===
+
+    def extract(self, query):
+        skip = query.get("skip_signature", ["0"])[-1] not in ("0", "", "false")
+        try:
+            skip_rules = [SkipRule(text).text for text in query.get("skip", [])]
+        except ValueError as e:
+            raise RequestError(400, f"Niepoprawna reguła pomijania: {e}")
+        path = query.get("path", [None])[-1]
+        if not self.server.slots.acquire(blocking=False):
+            self.server.stats.add("rejected_busy")
+            raise RequestError(503, "Serwer jest zajęty, spróbuj ponownie później", {"Retry-After": "1"})
+        self.server.stats.begin()
+        start = time.perf_counter()
+        held = True  # miejsce w limicie zwalnia to żądanie (przy ExtractionTimeout - ekstrakcja)
+        try:
+            if path:
+                path, owned, filename = self.resolve_path(path), False, os.path.basename(path)
+            else:
+                path, owned = self.receive_upload(), True
+                filename = query.get("name", ["dokument.xml"])[-1]
+            try:
+                records, index, report = self.server.run_extraction(path, skip, skip_rules, owned)
+            except ExtractionTimeout:
+                held = False
+                raise
+            except BaseException:
+                if owned:
+                    os.remove(path)
+                raise
+        except expat.ExpatError as e:
+            self.server.stats.add("extraction_errors")
+            raise RequestError(422, f"Niepoprawny dokument XML: {e}")
+        except RequestError:
+            raise
+        except Exception:
+            self.server.stats.add("extraction_errors")
+            raise
+        finally:
+            if held:
+                self.server.stats.end()
+                self.server.slots.release()
+        self.server.stats.add("extractions")
+        self.server.stats.add("extract_seconds", time.perf_counter() - start)
+        document = StoredDocument(path, owned, filename, records, attachments_from_index(path, index), report)
+        self.server.store.add(document)
+        text = query.get("text", ["1"])[-1] not in ("0", "false")
+        self.send_json(document.as_json(text), 201, {"Location": f"/documents/{document.id}"})
+
+    def resolve_path(self, path):
+        if not self.server.roots:
+            raise RequestError(403, "Odczyt plików po ścieżce jest wyłączony (uruchom z --root)")
+        real = os.path.realpath(path)
+        try:
+            allowed = any(os.path.commonpath([real, root]) == root for root in self.server.roots)
+        except ValueError:  # inny dysk w Windows
+            allowed = False
+        if not allowed:
+            raise RequestError(403, "Ścieżka jest poza dozwolonymi katalogami")
+        if not os.path.isfile(real):
+            raise RequestError(404, f"Nie ma pliku {path}")
+        if os.path.getsize(real) > self.server.max_body:
+            self.server.stats.add("rejected_size")
+            raise RequestError(413, f"Dokument jest większy niż {self.server.max_body} bajtów")
+        return real
+
+    def receive_upload(self):
+        # Treść żądania prosto do pliku tymczasowego, bez trzymania jej w pamięci
+        if self.headers.get("Transfer-Encoding"):
+            raise RequestError(411, "Wymagany jest nagłówek Content-Length")
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            raise RequestError(411, "Wymagany jest nagłówek Content-Length")
+        if length <= 0:
+            raise RequestError(400, "Brak dokumentu w treści żądania")
+        if length > self.server.max_body:
+            self.server.stats.add("rejected_size")
+            raise RequestError(413, f"Dokument jest większy niż {self.server.max_body} bajtów")
+        fd, path = tempfile.mkstemp(prefix=UPLOAD_PREFIX, suffix=".xml", dir=self.server.spool_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                left = length
+                while left:
+                    chunk = self.rfile.read(min(SERVER_READ_CHUNK, left))
+                    if not chunk:
+                        raise RequestError(400, "Treść żądania jest niepełna")
+                    f.write(chunk)
+                    left -= len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        self.body_read = True
+        self.server.stats.add("bytes_received", length)
+        return path
+
+    # === Dokumenty i załączniki ===
+
+    def document(self, method, parts, query):
+        if method == "DELETE" and len(parts) == 1:
+            if not self.server.store.remove(parts[0]):
+                raise RequestError(404, "Nie ma takiego dokumentu")
+            self.send_json({"deleted": parts[0]})
+            return
+        if method != "GET" or (len(parts) == 3 and parts[1] != "attachments"):
+            raise RequestError(404, "Nie ma takiego zasobu")
+        document = self.server.store.get(parts[0])
+        if document is None:
+            raise RequestError(404, "Nie ma takiego dokumentu (mógł wygasnąć)")
+        if len(parts) == 1:
+            self.send_json(document.as_json(query.get("text", ["1"])[-1] not in ("0", "false")))
+            return
+        try:
+            attachment = document.attachments[int(parts[2])]
+        except (ValueError, IndexError):
+            raise RequestError(404, "Nie ma takiego załącznika")
+        self.send_attachment(attachment)
+
+    def send_attachment(self, attachment):
+        content_type = mimetypes.guess_type(attachment.filename)[0] or "application/octet-stream"
+        size = attachment.size
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(size))
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(attachment.filename)}")
+        self.end_headers()
+        sent = 0
+        try:
+            for chunk in attachment.iter_chunks():
+                self.wfile.write(chunk)
+                sent += len(chunk)
+        except Exception as e:
+            # nagłówki już wysłane - zrywamy połączenie, klient zobaczy za krótką treść
+            self.close_connection = True
+            self.log_error("Błąd wysyłania %s: %s", attachment.filename, e)
+        self.server.stats.add("attachments_served")
+        self.server.stats.add("bytes_served", sent)
+
+# === Uruchomienie ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Usługa HTTP ekstrakcji dokumentów XML")
+    parser.add_argument("--host", default="127.0.0.1", help="adres nasłuchu (domyślnie tylko lokalnie)")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port (0 = dowolny wolny)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="liczba procesów roboczych (0 = ekstrakcja w wątku żądania)")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="ile ekstrakcji naraz, łącznie z czekającymi (domyślnie 2 × procesy); "
+                             "ponad limit serwer odpowiada 503")
+    parser.add_argument("--max-body", type=int, default=SERVER_MAX_BODY // (1024 * 1024), metavar="MB",
+                        help="największy przyjmowany dokument")
+    parser.add_argument("--max-documents", type=int, default=SERVER_MAX_DOCUMENTS,
+                        help="ile wyników trzymać do pobierania załączników")
+    parser.add_argument("--ttl", type=int, default=SERVER_TTL, help="po ilu sekundach bez użycia zwolnić dokument")
+    parser.add_argument("--timeout", type=float, default=None, help="limit czasu jednej ekstrakcji w sekundach")
+    parser.add_argument("--root", action="append", default=[],
+                        help="katalog, z którego wolno czytać dokumenty po ścieżce (?path=); można powtarzać")
+    parser.add_argument("--spool-dir", default=None, help="katalog na przysłane dokumenty")
+    parser.add_argument("-q", "--quiet", action="store_true", help="nie wypisuj dziennika żądań")
+    args = parser.parse_args(argv)
+
+    server = ExtractionServer((args.host, args.port), workers=args.workers, max_body=args.max_body * 1024 * 1024,
+                              max_concurrent=args.max_concurrent, max_documents=args.max_documents, ttl=args.ttl,
+                              roots=args.root, timeout=args.timeout, spool_dir=args.spool_dir, quiet=args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Nasłuchiwanie na http://{host}:{port}/ (procesy robocze: {server.workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
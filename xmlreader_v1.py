@@ -1,80 +1,12 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkhtmlview import HTMLLabel
-import xml.etree.ElementTree as ET
 import tempfile
 import webbrowser
 import base64
 import os
-import io
-import zipfile
-
-def strip_ns(tag):
-    return tag.split('}', 1)[1] if '}' in tag else tag
-
-def is_base64_string(s):
-    try:
-        return len(s) > 100 and base64.b64encode(base64.b64decode(s)).decode()[:100] in s[:110]
-    except Exception:
-        return False
-
-def guess_office_extension(file_bytes):
-    try:
-        with zipfile.ZipFile(io.BytesIO(file_bytes)) as z:
-            namelist = z.namelist()
-            if any(name.startswith('word/') for name in namelist):
-                return '.docx'
-            elif any(name.startswith('xl/') for name in namelist):
-                return '.xlsx'
-            elif any(name.startswith('ppt/') for name in namelist):
-                return '.pptx'
-            else:
-                return '.zip'
-    except Exception:
-        pass
-
-    ole_magic = b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'
-    if file_bytes.startswith(ole_magic):
-        header_sample = file_bytes[512:2048].decode('latin1', errors='ignore').lower()
-        if 'worddocument' in header_sample:
-            return '.doc'
-        elif 'workbook' in header_sample:
-            return '.xls'
-        elif 'powerpoint document' in header_sample:
-            return '.ppt'
-        else:
-            return '.ole'
-
-    try:
-        text_sample = file_bytes[:2048].decode('utf-8')
-        if not text_sample.lstrip().startswith('<?xml'):
-            return '.txt'
-    except Exception:
-        pass
-
-    return 'nieznany'
-
-def guess_extension_from_bytes(data_bytes):
-    header = data_bytes[:100].lstrip()
-    if header.startswith(b'%PDF-'):
-        return '.pdf'
-    elif header.startswith(b'\xFF\xD8\xFF'):
-        return '.jpg'
-    elif header.startswith(b'\x89PNG\r\n\x1a\n'):
-        return '.png'
-    elif header.startswith(b'PK\x03\x04'):
-        return guess_office_extension(data_bytes)
-    elif header.startswith(b'<?xml') or header.startswith(b'<'):
-        return '.xml'
-    elif header.startswith(b'From:') or b'\r\nFrom:' in data_bytes[:200] or b'\nFrom:' in data_bytes[:200]:
-        return '.eml'
-    elif data_bytes.startswith(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'):
-        sample = data_bytes[:2048].lower()
-        if b'outlook message' in sample or b'microsoft outlook' in sample:
-            return '.msg'
-        return guess_office_extension(data_bytes)
-    else:
-        return '.nieznany'
+
+from xmlreader_core import guess_extension_from_bytes, is_base64_string, parse_xml_tree, strip_ns
 
 def extract_all_text_elements(root):
     attachments = []
@@ -174,8 +106,7 @@ class XMLViewerApp:
             return
 
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
+            root = parse_xml_tree(file_path)
             lines, attachments = extract_all_text_elements(root)
             filename = os.path.basename(file_path)
             html = generate_html_from_text_lines(lines, filename=filename)
@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from xmlreader_cli import add_processing_arguments, iter_input_files, process_document, processing_options, report_result
+from xmlreader_core import file_digest
+
+# === Obserwowanie katalogu ===
+# Demon odpytujący katalogi co kilka sekund (bez zależności od systemowych
+# powiadomień, więc działa też na udziałach sieciowych). Plik trafia do obróbki,
+# gdy jego rozmiar i czas modyfikacji nie zmieniły się przez --settle sekund -
+# wcześniej może być jeszcze dopisywany. Dokument o treści (SHA-256) już raz
+# przetworzonej pomijamy. Każdy wynik dopisujemy do dziennika JSON Lines, więc po
+# restarcie pliki o tym samym rozmiarze i czasie modyfikacji nie są nawet czytane.
+
+WATCH_INTERVAL = 2.0  # sekund między przeglądami katalogów
+WATCH_SETTLE = 3.0  # tyle sekund plik musi być niezmieniony
+JOURNAL_FILENAME = ".xmlreader_watch.jsonl"
+
+# === Dziennik stanu ===
+
+class WatchJournal:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # ścieżka -> ostatni wpis
+        self.digests = {}  # SHA-256 -> katalog wyjściowy pierwszego udanego przetworzenia
+        self._first_ok = {}  # SHA-256 -> wpis, z którego pochodzi digests
+        self.outputs = set()
+        self.lines = 0
+        self._load()
+        if self.lines > 2 * len(self.entries) + 100:
+            self.compact()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        try:
+            f = open(self.path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # urwany ostatni wiersz po awarii
+                self._apply(entry)
+                self.lines += 1
+
+    def _apply(self, entry):
+        self.entries[entry["path"]] = entry
+        if entry.get("output"):
+            self.outputs.add(entry["output"])
+        if entry["status"] == "ok" and entry["sha256"] not in self.digests:
+            self.digests[entry["sha256"]] = entry["output"]
+            self._first_ok[entry["sha256"]] = entry
+
+    def known(self, path, size, mtime_ns):
+        # "crashed" to awaria procesu roboczego, nie wada pliku - po restarcie ponawiamy
+        entry = self.entries.get(path)
+        return (entry is not None and entry["status"] != "crashed" and entry["size"] == size
+                and entry["mtime_ns"] == mtime_ns)
+
+    def record(self, entry):
+        entry["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._apply(entry)
+        self.lines += 1
+
+    def compact(self):
+        # Ostatni wpis dla każdej ścieżki, a przed nimi starsze wpisy, które są jedynym
+        # śladem przetworzonej treści (plik zmieniono później); podmiana atomowa
+        tmp = self.path + ".tmp"
+        current = {id(entry) for entry in self.entries.values()}
+        older = [entry for entry in self._first_ok.values() if id(entry) not in current]
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for entry in older + list(self.entries.values()):
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self.lines = len(older) + len(self.entries)
+
+    def close(self):
+        self._file.close()
+
+# === Demon ===
+
+class FolderWatcher:
+    def __init__(self, inputs, output, options, journal, jobs=None, settle=WATCH_SETTLE, report=print):
+        self.inputs = inputs
+        self.output = output
+        self.options = options
+        self.journal = journal
+        self.jobs = jobs or os.cpu_count() or 1
+        self.settle = settle
+        self.report = report
+        self._output_real = os.path.realpath(output)
+        self.pending = {}  # ścieżka -> [(rozmiar, mtime_ns), od kiedy niezmieniony, ścieżka względna]
+        self.ready = deque()  # (ścieżka, ścieżka względna, (rozmiar, mtime_ns))
+        self.busy = set()  # ścieżki w obróbce
+        # future -> (etap "hash"/"process", ścieżka, ścieżka względna, klucz, skrót, katalog wyjściowy)
+        self.futures = {}
+        self.in_flight = {}  # SHA-256 w obróbce -> [(ścieżka, ścieżka względna, klucz)] kopii czekających na wynik
+        self.outputs_in_flight = set()  # katalogi wyjściowe dokumentów w obróbce
+        self.suspects = deque()  # (ścieżka, ścieżka względna, klucz) w toku przy awarii puli
+        self.isolated = None  # podejrzany, który jest teraz w puli sam
+        self.crashed = {}  # ścieżka -> klucz wersji, która wywraca proces roboczy; do restartu jej nie ruszamy
+        self.executor = None
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    @property
+    def idle(self):
+        return not (self.pending or self.ready or self.futures or self.suspects)
+
+    def scan(self, now=None):
+        # Nowe i zmienione pliki; gotowe do obróbki po okresie spokoju
+        now = time.time() if now is None else now
+        seen = set()
+        for path, rel in iter_input_files(self.inputs):
+            if os.path.basename(path).startswith(".") or self._in_output(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # plik zniknął w trakcie przeglądu
+            seen.add(path)
+            key = (st.st_size, st.st_mtime_ns)
+            if path in self.busy or self.crashed.get(path) == key or self.journal.known(path, *key):
+                continue
+            state = self.pending.get(path)
+            if state is None or state[0] != key:
+                # stary plik (np. po restarcie) nie musi czekać na kolejny przegląd
+                self.pending[path] = state = [key, min(now, st.st_mtime) if state is None else now, rel]
+            if now - state[1] >= self.settle:
+                del self.pending[path]
+                self.busy.add(path)
+                self.ready.append((path, rel, key))
+        for path in [path for path in self.pending if path not in seen]:
+            del self.pending[path]
+
+    def _in_output(self, path):
+        real = os.path.realpath(path)
+        return real == self._output_real or real.startswith(self._output_real + os.sep)
+
+    def dispatch(self):
+        # Najwyżej dwa zadania na proces, reszta czeka w kolejce - stała pamięć przy zalewie plików.
+        # Podejrzanych o wywrócenie procesu wpuszczamy pojedynczo, gdy pula jest pusta
+        if self.suspects and not self.futures:
+            path, rel, key = self.suspects.popleft()
+            self.isolated = path
+            self._submit(("hash", path, rel, key, None, None), file_digest, path)
+        while self.ready and not self.suspects and self.isolated is None and len(self.futures) < 2 * self.jobs:
+            path, rel, key = self.ready.popleft()
+            self._submit(("hash", path, rel, key, None, None), file_digest, path)
+
+    def _submit(self, entry, func, *args):
+        try:
+            future = self.executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._pool_broken([entry])
+            return
+        self.futures[future] = entry
+
+    def collect(self, timeout):
+        if not self.futures:
+            time.sleep(timeout)
+            return
+        done, _ = wait(list(self.futures), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = []
+        for future in done:
+            entry = self.futures.pop(future, None)
+            if entry is None:
+                continue  # już ponowione po awarii puli
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken.append(entry)
+            elif entry[0] == "hash":
+                self._hashed(future, *entry[1:4])
+            else:
+                self._processed(future, *entry[1:])
+        if broken:
+            self._pool_broken(broken)
+        if self.isolated is not None and all(entry[1] != self.isolated for entry in self.futures.values()):
+            self.isolated = None
+
+    def _pool_broken(self, entries):
+        # Proces roboczy padł (np. zabity przez OOM), a wtedy każde zadanie w toku dostaje
+        # BrokenProcessPool. Tworzymy nową pulę i ponawiamy te zadania pojedynczo, więc błąd
+        # zostaje tylko przy dokumencie, który wywraca proces także sam
+        entries = entries + list(self.futures.values())
+        self.futures.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+        for copies in self.in_flight.values():
+            self.ready.extend(copies)
+        self.in_flight.clear()
+        self.outputs_in_flight.clear()
+        for stage, path, rel, key, digest, out_dir in entries:
+            if path == self.isolated:
+                self._crashed(path, key, digest, "proces roboczy przerwany (BrokenProcessPool)")
+            else:
+                self.suspects.append((path, rel, key))
+        self.isolated = None
+
+    def _hashed(self, future, path, rel, key):
+        try:
+            digest = future.result()
+            st = os.stat(path)
+        except OSError:
+            self.busy.discard(path)  # zniknął - jeśli wróci, przegląd go znajdzie
+            return
+        if (st.st_size, st.st_mtime_ns) != key:
+            self.busy.discard(path)  # zmienił się w trakcie - poczeka na kolejny okres spokoju
+            return
+        if digest in self.journal.digests:
+            self._duplicate(path, key, digest, self.journal.digests[digest])
+            return
+        if digest in self.in_flight:
+            # ta sama treść właśnie się przetwarza - rozstrzygnie ją wynik pierwszej kopii
+            self.in_flight[digest].append((path, rel, key))
+            return
+        self.in_flight[digest] = []
+        out_dir = os.path.join(self.output, rel)
+        if out_dir in self.journal.outputs or out_dir in self.outputs_in_flight:
+            # nowa wersja pliku obok poprzedniej albo ta sama nazwa z innego katalogu wejściowego
+            out_dir += "_" + digest[:8]
+        self.outputs_in_flight.add(out_dir)
+        self._submit(("process", path, rel, key, digest, out_dir), process_document, path, out_dir, self.options)
+
+    def _duplicate(self, path, key, digest, output):
+        self.journal.record({"path": path, "size": key[0], "mtime_ns": key[1], "sha256": digest,
+                             "status": "duplicate", "output": output})
+        self.busy.discard(path)
+        self.report(f"DUPL {path}: ta sama treść co {output}")
+
+    def _crashed(self, path, key, digest, error):
+        self.crashed[path] = key
+        self.busy.discard(path)
+        self.journal.record({"path": path, "size": key[0], "mtime_ns": key[1], "sha256": digest,
+                             "status": "crashed", "output": None, "error": error})
+        self.report(f"BŁĄD {path}: {error}")
+
+    def _processed(self, future, path, rel, key, digest, out_dir):
+        self.outputs_in_flight.discard(out_dir)
+        try:
+            result = future.result()
+        except Exception as e:  # awaria po stronie puli, nie dokumentu - błędy dokumentu są w wyniku
+            error = f"{type(e).__name__}: {e}"
+            self._crashed(path, key, digest, error)
+            for copy_path, _, copy_key in self.in_flight.pop(digest, ()):
+                self._crashed(copy_path, copy_key, digest, f"ta sama treść co {path}: {error}")
+            return
+        self.busy.discard(path)
+        self.journal.record({"path": path, "size": key[0], "mtime_ns": key[1], "sha256": digest,
+                             "status": "error" if result["error"] else "ok", "output": result["output"],
+                             "error": result["error"]})
+        report_result(result, self.report)
+        for copy_path, _, copy_key in self.in_flight.pop(digest, ()):
+            if not result["error"]:
+                self._duplicate(copy_path, copy_key, digest, result["output"])
+                continue
+            error = f"ta sama treść co {path}, której nie udało się przetworzyć"
+            self.journal.record({"path": copy_path, "size": copy_key[0], "mtime_ns": copy_key[1],
+                                 "sha256": digest, "status": "error", "output": None, "error": error})
+            self.busy.discard(copy_path)
+            self.report(f"BŁĄD {copy_path}: {error}")
+
+    def run(self, interval=WATCH_INTERVAL, once=False):
+        # once=True: przetwarza to, co jest w katalogach, i kończy pracę
+        # Katalogi przeglądamy co interval; między przeglądami tylko zbieramy wyniki
+        # i dokładamy zadania, więc zalew plików nie mnoży przeglądów
+        self.start()
+        next_scan = 0.0
+        try:
+            while True:
+                if time.monotonic() >= next_scan:
+                    self.scan()
+                    next_scan = time.monotonic() + interval
+                self.dispatch()
+                if once and self.idle:
+                    return
+                self.collect(max(0.0, next_scan - time.monotonic()))
+        finally:
+            self.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Obserwowanie katalogów i przetwarzanie nowych dokumentów XML")
+    parser.add_argument("inputs", nargs="+", help="obserwowane katalogi (rekurencyjnie *.xml) lub wzorce glob")
+    add_processing_arguments(parser)
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="sekundy między przeglądami")
+    parser.add_argument("--settle", type=float, default=WATCH_SETTLE,
+                        help="tyle sekund plik musi być niezmieniony, zanim go przetworzymy")
+    parser.add_argument("--journal", default=None,
+                        help=f"dziennik stanu (domyślnie {JOURNAL_FILENAME} w katalogu wyjściowym)")
+    parser.add_argument("--once", action="store_true", help="przetwórz bieżącą zawartość i zakończ")
+    args = parser.parse_args(argv)
+
+    journal = WatchJournal(args.journal or os.path.join(args.output, JOURNAL_FILENAME))
+    watcher = FolderWatcher(args.inputs, args.output, processing_options(args), journal, jobs=args.jobs,
+                            settle=args.settle)
+    if not args.once:
+        print(f"Obserwowanie: {', '.join(args.inputs)} -> {args.output} (Ctrl+C kończy)")
+    try:
+        watcher.run(args.interval, once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        journal.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())